@@ -1,18 +1,32 @@
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+import asyncio
 from contextlib import asynccontextmanager
 import src.config as config
 import src.SQL as SQL
-from src.SQL.data_insert import insert_data
+from src.NoSQL.redis_connection import redis_pool
+from src.NoSQL.connection import create_indexes as create_mongo_indexes
+from src.SQL.migrations import check_schema_version
 import src.router as router
+from src.Service import Auth
+from src.Service.CollectionDocuments import preview
+from src.Service.Chat.message_bus import chat_message_bus
 
 
 @asynccontextmanager
 async def app_lifespan(app: FastAPI):
-    SQL.Tables.create_table()
-    await insert_data()
+    await check_schema_version()
+    await create_mongo_indexes()
+    token_invalidation_listener = asyncio.create_task(
+        Auth.listen_for_invalidated_tokens()
+    )
+    chat_message_listener = asyncio.create_task(chat_message_bus.listen())
     yield
+    token_invalidation_listener.cancel()
+    chat_message_listener.cancel()
+    preview.shutdown_executor()
+    await redis_pool.disconnect()
 
 
 app = FastAPI(
@@ -30,6 +44,7 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 app.include_router(
@@ -88,6 +103,12 @@ app.include_router(
     tags=["chat"],
 )
 
+app.include_router(
+    router.metrics_router,
+    prefix=f"{config.API_PREFIX}/metrics",
+    tags=["metrics"],
+)
+
 if __name__ == "__main__":
     uvicorn.run(
         app,
@@ -0,0 +1,12 @@
+from .blob_store import BlobStore, BlobNotFound, BlobTooLarge  # noqa: F401
+from .local_blob_store import LocalBlobStore  # noqa: F401
+import src.config as config
+
+
+def create_blob_store(backend: str = config.BLOB_STORE_BACKEND) -> BlobStore:
+    if backend == "local":
+        return LocalBlobStore(config.BLOB_STORE_PATH)
+    raise ValueError(f"Unknown blob store backend: {backend}")
+
+
+blob_store = create_blob_store()
@@ -0,0 +1,74 @@
+import hashlib
+from abc import ABC, abstractmethod
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+class BlobTooLarge(Exception):
+    pass
+
+
+class BlobStore(ABC):
+    """
+    Stores immutable blobs addressed by the SHA-256 of their content.
+    Storing the same content again keeps the single existing copy.
+    Implementations only move bytes, e.g. to the local filesystem or an S3-compatible bucket.
+    """
+
+    @staticmethod
+    def content_hash(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
+
+    async def put(self, data: bytes) -> str:
+        """Store the blob and return its content hash"""
+        content_hash = self.content_hash(data)
+        if await self.exists(content_hash):
+            # Marks the blob as recently used, so garbage collection keeps it until the new reference is committed
+            await self._touch(content_hash)
+        else:
+            await self._write(content_hash, data)
+        return content_hash
+
+    @abstractmethod
+    async def put_stream(
+        self, chunks: AsyncIterator[bytes], max_size: int | None = None
+    ) -> tuple[str, int]:
+        """
+        Store the blob as its chunks arrive and return its content hash and size.
+        Raises BlobTooLarge and stores nothing if there is more than max_size bytes.
+        """
+
+    @abstractmethod
+    async def exists(self, content_hash: str) -> bool: ...
+
+    @abstractmethod
+    async def get(self, content_hash: str) -> bytes:
+        """Content of the blob, raises BlobNotFound if there is none"""
+
+    @abstractmethod
+    def stream(
+        self, content_hash: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        """Content of the blob from start up to end (exclusive) in chunks, raises BlobNotFound if there is none"""
+
+    def local_path(self, content_hash: str) -> Path | None:
+        """File of the blob other processes can open by themselves, None if the store does not keep blobs in files"""
+        return None
+
+    @abstractmethod
+    async def delete(self, content_hash: str) -> None: ...
+
+    @abstractmethod
+    def list_blobs(self) -> AsyncIterator[tuple[str, datetime]]:
+        """Hashes of all stored blobs with the time they were last stored"""
+
+    @abstractmethod
+    async def _write(self, content_hash: str, data: bytes) -> None: ...
+
+    @abstractmethod
+    async def _touch(self, content_hash: str) -> None: ...
@@ -0,0 +1,38 @@
+import asyncio
+from datetime import datetime, timedelta
+from fastapi import logger
+import src.config as config
+from src.SQL import session_scope
+from src.repository import collection_documents_repository
+from . import blob_store
+
+
+async def collect_garbage(
+    grace_period: float = config.BLOB_GC_GRACE_PERIOD,
+) -> list[str]:
+    """
+    Delete blobs which no document refers to and return their hashes.
+    Blobs stored within the grace period are kept, the document referring to them may not be committed yet.
+    """
+    async with session_scope() as session:
+        referenced_hashes = await collection_documents_repository.get_content_hashes(
+            session
+        )
+
+    stored_before = datetime.now() - timedelta(seconds=grace_period)
+    deleted_hashes = []
+    async for content_hash, stored_at in blob_store.list_blobs():
+        if content_hash not in referenced_hashes and stored_at < stored_before:
+            await blob_store.delete(content_hash)
+            deleted_hashes.append(content_hash)
+
+    return deleted_hashes
+
+
+async def main() -> None:
+    if deleted_hashes := await collect_garbage():
+        logger.logger.warning(f"Deleted unreferenced blobs: {deleted_hashes}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
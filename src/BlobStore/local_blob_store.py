@@ -0,0 +1,130 @@
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import AsyncIterator
+from .blob_store import BlobStore, BlobNotFound, BlobTooLarge
+
+CONTENT_HASH_PATTERN = re.compile(r"[0-9a-f]{64}")
+CHUNK_SIZE = 64 * 1024
+
+
+class LocalBlobStore(BlobStore):
+    """
+    Blobs kept as files in a directory tree fanned out by the first bytes of the hash, e.g. ab/cd/abcd...
+    File operations run in threads, so they do not block the event loop.
+    """
+
+    def __init__(self, root: str):
+        self.root = Path(root)
+
+    def path(self, content_hash: str) -> Path:
+        if not CONTENT_HASH_PATTERN.fullmatch(content_hash):
+            raise BlobNotFound(content_hash)
+        return self.root / content_hash[:2] / content_hash[2:4] / content_hash
+
+    async def put_stream(
+        self, chunks: AsyncIterator[bytes], max_size: int | None = None
+    ) -> tuple[str, int]:
+        upload_directory = self.root / "uploads"
+        await asyncio.to_thread(upload_directory.mkdir, parents=True, exist_ok=True)
+        temporary_path = upload_directory / f"{uuid.uuid4().hex}.tmp"
+        content_hash = hashlib.sha256()
+        size = 0
+
+        def write_chunk(chunk: bytes) -> None:
+            # hashlib releases the GIL for large chunks, so hashing runs in the thread together with the write
+            content_hash.update(chunk)
+            file.write(chunk)
+
+        file = await asyncio.to_thread(open, temporary_path, "wb")
+        try:
+            try:
+                async for chunk in chunks:
+                    size += len(chunk)
+                    if max_size is not None and size > max_size:
+                        raise BlobTooLarge(max_size)
+                    await asyncio.to_thread(write_chunk, chunk)
+            finally:
+                await asyncio.to_thread(file.close)
+
+            blob_hash = content_hash.hexdigest()
+            if await self.exists(blob_hash):
+                await self._touch(blob_hash)
+            else:
+                path = self.path(blob_hash)
+                await asyncio.to_thread(path.parent.mkdir, parents=True, exist_ok=True)
+                await asyncio.to_thread(os.replace, temporary_path, path)
+        finally:
+            await asyncio.to_thread(temporary_path.unlink, missing_ok=True)
+
+        return blob_hash, size
+
+    async def exists(self, content_hash: str) -> bool:
+        return await asyncio.to_thread(self.path(content_hash).is_file)
+
+    async def get(self, content_hash: str) -> bytes:
+        try:
+            return await asyncio.to_thread(self.path(content_hash).read_bytes)
+        except FileNotFoundError:
+            raise BlobNotFound(content_hash)
+
+    async def stream(
+        self, content_hash: str, start: int = 0, end: int | None = None
+    ) -> AsyncIterator[bytes]:
+        try:
+            file = await asyncio.to_thread(open, self.path(content_hash), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(content_hash)
+
+        try:
+            await asyncio.to_thread(file.seek, start)
+            remaining = None if end is None else end - start
+            while remaining is None or remaining > 0:
+                chunk = await asyncio.to_thread(
+                    file.read, CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                )
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            await asyncio.to_thread(file.close)
+
+    def local_path(self, content_hash: str) -> Path | None:
+        return self.path(content_hash)
+
+    async def delete(self, content_hash: str) -> None:
+        await asyncio.to_thread(self.path(content_hash).unlink, missing_ok=True)
+
+    async def list_blobs(self) -> AsyncIterator[tuple[str, datetime]]:
+        def list_files() -> list[tuple[str, datetime]]:
+            return [
+                (path.name, datetime.fromtimestamp(path.stat().st_mtime))
+                for path in self.root.glob("*/*/*")
+                if CONTENT_HASH_PATTERN.fullmatch(path.name)
+            ]
+
+        for blob in await asyncio.to_thread(list_files):
+            yield blob
+
+    async def _write(self, content_hash: str, data: bytes) -> None:
+        def write_file() -> None:
+            path = self.path(content_hash)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            # Written under a temporary name and renamed, so readers never see a partial blob
+            temporary_path = path.with_name(f"{content_hash}.{uuid.uuid4().hex}.tmp")
+            try:
+                temporary_path.write_bytes(data)
+                os.replace(temporary_path, path)
+            finally:
+                temporary_path.unlink(missing_ok=True)
+
+        await asyncio.to_thread(write_file)
+
+    async def _touch(self, content_hash: str) -> None:
+        await asyncio.to_thread(os.utime, self.path(content_hash))
@@ -1,3 +1,4 @@
+import base64
 from datetime import datetime
 
 from pydantic import BaseModel
@@ -18,3 +19,17 @@ class BankAccountOperation(BaseModel):
 class BankAccountBalance(BaseModel):
     account_id: int
     balance: float
+
+
+class OperationsCursor(BaseModel):
+    """Position in the account history after which the next page starts, passed to clients as an opaque string"""
+
+    operation_date: datetime
+    operation_id: int
+
+    def encode(self) -> str:
+        return base64.urlsafe_b64encode(self.model_dump_json().encode()).decode()
+
+    @classmethod
+    def decode(cls, cursor: str) -> "OperationsCursor":
+        return cls.model_validate_json(base64.urlsafe_b64decode(cursor.encode()))
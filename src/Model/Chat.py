@@ -17,7 +17,8 @@ class Message(BaseModel):
     message_type: MessageType = MessageType.TEXT
     file_url: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
-    read_by: List[int] = []
+    # Position in the conversation, assigned when the message is saved
+    seq: Optional[int] = None
 
 
 class Conversation(BaseModel):
@@ -26,6 +27,18 @@ class Conversation(BaseModel):
     title: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     last_message_at: Optional[datetime] = None
+    # Sequence number of the last message, incremented by MongoDB for every message saved
+    message_count: int = 0
+
+
+class ReadCursor(BaseModel):
+    """
+    Sequence number of the last message of the conversation the user has read,
+    every message up to it counts as read. Own messages of the user are never unread.
+    """
+    conversation_id: str
+    user_id: int
+    last_read_seq: int
 
 
 class CreateConversation(BaseModel):
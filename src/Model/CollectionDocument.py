@@ -6,7 +6,7 @@ class CollectionDocument(BaseModel):
     collection_id: int
     document_name: str
     file_type: str
-    file_data: bytes
+    file_data: Optional[bytes] = None  # content is replaced only if it is given
 
 class CreateCollectionDocument(BaseModel):
     collection_id: int
@@ -24,4 +24,6 @@ class CollectionDocumentMetadata(BaseModel):
     document_id: Optional[int] = None
     collection_id: int
     document_name: str
-    file_type: str
\ No newline at end of file
+    file_type: str
+    content_hash: Optional[str] = None  # changes with the content, downloads by hash can be cached forever
+    preview_hash: Optional[str] = None
\ No newline at end of file
@@ -59,3 +59,14 @@ class CollectionChildrenList(BaseModel):
     requester_surname: Optional[str] = None
     operation: Optional[int] = None
     operation_date: Optional[date] = None
+
+
+class PayForChildren(BaseModel):
+    child_ids: list[int]
+
+
+class ChildPaymentResult(BaseModel):
+    child_id: int
+    paid: bool
+    payment_id: Optional[int] = None
+    detail: Optional[str] = None
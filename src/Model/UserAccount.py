@@ -1,17 +1,8 @@
 from pydantic import BaseModel, Field
-import bcrypt
 from src.Model.UserAccountStatusEnum import UserAccountStatusEnum
 from src.Model.UserAccountPrivilegeEnum import UserAccountPrivilegeEnum
 from src.SQL.Enum.AccountStatus import ENABLED
 from src.SQL.Enum.Privilege import STANDARD_USER
-from src.config import PASSWORD_HASH_SALT
-
-
-def hash_password(password: str) -> str:
-    return bcrypt.hashpw(
-        password.encode(),
-        PASSWORD_HASH_SALT.encode(),
-    ).decode()
 
 
 class User(BaseModel):
@@ -26,10 +17,6 @@ class Login(BaseModel):
     username: str
     password: str
 
-    def __init__(self, **data):
-        super().__init__(**data)
-        self.password = hash_password(self.password)
-
 
 class RegisterUser(Login):
     pass
@@ -39,11 +26,6 @@ class ChangePassword(BaseModel):
     old_password: str
     new_password: str
 
-    def __init__(self, **data):
-        super().__init__(**data)
-        self.old_password = hash_password(self.old_password)
-        self.new_password = hash_password(self.new_password)
-
     def is_password_same(self) -> bool:
         return self.old_password == self.new_password
 
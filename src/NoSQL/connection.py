@@ -1,4 +1,5 @@
 import motor.motor_asyncio
+from pymongo import ASCENDING, IndexModel
 from src.config import MONGODB_URL, MONGODB_DB_NAME
 
 client = motor.motor_asyncio.AsyncIOMotorClient(MONGODB_URL)
@@ -7,3 +8,49 @@ db = client[MONGODB_DB_NAME]
 # Collections
 messages_collection = db.messages
 conversations_collection = db.conversations
+read_cursors_collection = db.read_cursors
+
+# Indexes every query of the chat repository relies on
+INDEXES = [
+    (
+        messages_collection,
+        [
+            # History is paged backwards by seq, unread messages are a range after the read cursor,
+            # sender_id lets them be counted from the index alone
+            IndexModel(
+                [("conversation_id", ASCENDING), ("seq", ASCENDING), ("sender_id", ASCENDING)],
+                name="conversation_messages_by_seq",
+            ),
+        ],
+    ),
+    (
+        conversations_collection,
+        [IndexModel([("participants", ASCENDING)], name="participants")],
+    ),
+    (
+        read_cursors_collection,
+        [
+            IndexModel(
+                [("conversation_id", ASCENDING), ("user_id", ASCENDING)],
+                name="conversation_user",
+                unique=True,
+            )
+        ],
+    ),
+]
+
+
+# Replaced by other indexes, they are dropped so MongoDB does not keep them up to date on every write
+OBSOLETE_INDEXES = [
+    (messages_collection, "conversation_messages_by_id"),
+    (messages_collection, "conversation_history"),
+]
+
+
+async def create_indexes() -> None:
+    """Create missing indexes, the ones which already exist are left as they are"""
+    for collection, indexes in INDEXES:
+        await collection.create_indexes(indexes)
+    for collection, name in OBSOLETE_INDEXES:
+        if name in await collection.index_information():
+            await collection.drop_index(name)
@@ -0,0 +1,129 @@
+"""
+Moves chat data written before sequence numbers and read cursors to them:
+    python -m src.NoSQL.read_cursors
+Messages are numbered, read receipts and read cursors pointing at message ids become cursors at sequence numbers.
+It is safe to run again, only data in the old format is touched.
+"""
+
+import asyncio
+from bson import ObjectId
+from fastapi import logger
+from pymongo import DeleteOne, ReturnDocument, UpdateOne
+from .connection import conversations_collection, messages_collection, read_cursors_collection
+
+BATCH_SIZE = 1000
+
+
+async def write_in_batches(collection, operations) -> int:
+    """Bulk write the operations BATCH_SIZE at a time, returns how many there were"""
+    written = 0
+    batch = []
+    async for operation in operations:
+        batch.append(operation)
+        if len(batch) == BATCH_SIZE:
+            await collection.bulk_write(batch, ordered=False)
+            written += len(batch)
+            batch.clear()
+    if batch:
+        await collection.bulk_write(batch, ordered=False)
+        written += len(batch)
+    return written
+
+
+async def number_conversation_messages(conversation_id: str) -> int:
+    """Sequence numbers of messages without them, in the order they were written"""
+    message_ids = [
+        doc["_id"]
+        async for doc in messages_collection.find(
+            {"conversation_id": conversation_id, "seq": {"$exists": False}}, {"_id": 1}
+        ).sort([("created_at", 1), ("_id", 1)])
+    ]
+    if not message_ids:
+        return 0
+    # The numbers are reserved like by save_message, so they never repeat numbers given out meanwhile
+    conversation = await conversations_collection.find_one_and_update(
+        {"_id": ObjectId(conversation_id)},
+        {"$inc": {"message_count": len(message_ids)}},
+        projection={"message_count": 1},
+        return_document=ReturnDocument.AFTER,
+    )
+    if conversation is None:
+        # Left behind by a deleted conversation, they are never shown
+        return 0
+    first_seq = conversation["message_count"] - len(message_ids) + 1
+
+    async def numbering():
+        for seq, message_id in enumerate(message_ids, start=first_seq):
+            yield UpdateOne({"_id": message_id}, {"$set": {"seq": seq}})
+
+    return await write_in_batches(messages_collection, numbering())
+
+
+async def number_messages() -> int:
+    numbered = 0
+    for conversation_id in await messages_collection.distinct(
+        "conversation_id", {"seq": {"$exists": False}}
+    ):
+        if not ObjectId.is_valid(conversation_id):
+            continue
+        numbered += await number_conversation_messages(conversation_id)
+    return numbered
+
+
+async def backfill_from_read_receipts() -> int:
+    """Read cursor of every reader is set to the newest message of others they have read"""
+    pipeline = [
+        {"$match": {"read_by": {"$exists": True}}},
+        {"$unwind": "$read_by"},
+        {"$match": {"$expr": {"$ne": ["$read_by", "$sender_id"]}}},
+        {
+            "$group": {
+                "_id": {"conversation_id": "$conversation_id", "user_id": "$read_by"},
+                "last_read_seq": {"$max": "$seq"},
+            }
+        },
+    ]
+
+    async def cursors():
+        async for cursor in messages_collection.aggregate(pipeline, allowDiskUse=True):
+            yield UpdateOne(
+                cursor["_id"], {"$max": {"last_read_seq": cursor["last_read_seq"]}}, upsert=True
+            )
+
+    backfilled = await write_in_batches(read_cursors_collection, cursors())
+    await messages_collection.update_many(
+        {"read_by": {"$exists": True}}, {"$unset": {"read_by": ""}}
+    )
+    return backfilled
+
+
+async def convert_message_id_cursors() -> int:
+    """Read cursors at message ids are moved to sequence numbers of those messages, cursors at deleted ones are removed"""
+
+    async def conversions():
+        async for cursor in read_cursors_collection.find({"last_read_message_id": {"$exists": True}}):
+            message = await messages_collection.find_one(
+                {"_id": cursor["last_read_message_id"]}, {"seq": 1}
+            )
+            if message is None:
+                yield DeleteOne({"_id": cursor["_id"]})
+            else:
+                yield UpdateOne(
+                    {"_id": cursor["_id"]},
+                    {"$max": {"last_read_seq": message["seq"]}, "$unset": {"last_read_message_id": ""}},
+                )
+
+    return await write_in_batches(read_cursors_collection, conversions())
+
+
+async def main() -> None:
+    numbered = await number_messages()
+    backfilled = await backfill_from_read_receipts()
+    converted = await convert_message_id_cursors()
+    logger.logger.info(
+        f"Numbered {numbered} messages, backfilled {backfilled} and converted {converted} read cursors"
+    )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
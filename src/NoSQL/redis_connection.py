@@ -0,0 +1,18 @@
+from redis.asyncio import BlockingConnectionPool, Redis
+import src.config as config
+
+# Shared by the whole worker. When all connections are busy, callers wait up to REDIS_POOL_TIMEOUT for a free one
+redis_pool = BlockingConnectionPool(
+    host=config.REDIS_HOST,
+    port=config.REDIS_PORT,
+    db=config.REDIS_DB,
+    decode_responses=True,
+    max_connections=config.REDIS_POOL_SIZE,
+    timeout=config.REDIS_POOL_TIMEOUT,
+    socket_timeout=config.REDIS_SOCKET_TIMEOUT,
+    socket_connect_timeout=config.REDIS_CONNECT_TIMEOUT,
+)
+
+
+def get_redis() -> Redis:
+    return Redis(connection_pool=redis_pool)
@@ -1,3 +1,4 @@
+from sqlalchemy import Index
 from sqlmodel import SQLModel, Field
 from datetime import date
 import src.SQL.Enum.CollectionStatus as CollectionStatus
@@ -13,7 +14,7 @@ class Collection(SQLModel, table=True):
 
     __tablename__ = "collection"
     id: int = Field(primary_key=True)
-    logo_path: str = Field(nullable=True)
+    logo_path: str | None = Field(nullable=True)
     name: str
     description: str
     start_date: date = Field(default=date.today())
@@ -26,6 +27,10 @@ class Collection(SQLModel, table=True):
     withdrawn_money: float = Field(
         default=0
     )  # amount of money withdrawn from the collection bank account by cashier
+    # Bumped by database triggers whenever operations of the collection or children of its class change,
+    # so a cached financial report is valid as long as the collection row is the same (see migration 6).
+    # Internal to the cache, it is left out of responses.
+    report_version: int = Field(default=0, exclude=True)
 
 
 class CollectionDocuments(SQLModel, table=True):
@@ -38,7 +43,9 @@ class CollectionDocuments(SQLModel, table=True):
     collection_id: int = Field(foreign_key="collection.id")
     document_name: str
     file_type: str  # Przechowuje rozszerzenie/typ pliku
-    file_data: bytes  # Przechowuje dane binarne pliku
+    content_hash: str = Field(index=True, max_length=64)  # SHA-256 of the content kept in src.BlobStore
+    file_size: int
+    preview_hash: str | None = Field(default=None, max_length=64)  # small JPEG rendered from the content
 
 
 class CollectionOperation(SQLModel, table=True):
@@ -52,6 +59,16 @@ class CollectionOperation(SQLModel, table=True):
     """
 
     __tablename__ = "collection_operation"
+    __table_args__ = (
+        # Primary key starts with child_id, so operations of a collection need their own index.
+        # Children and payments are included, so status counts and refunds do not touch the table.
+        Index(
+            "ix_collection_operation_collection_type",
+            "collection_id",
+            "operation_type",
+            postgresql_include=["child_id", "payment_id"],
+        ),
+    )
     child_id: int = Field(primary_key=True, foreign_key="child.id")
     collection_id: int = Field(primary_key=True, foreign_key="collection.id")
     operation_date: date = Field(default=date.today())
@@ -1,4 +1,7 @@
-from sqlmodel import SQLModel, Field, select, func
+from collections import defaultdict
+from sqlalchemy import Index, event
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import SQLModel, Field, select
 from sqlmodel.ext.asyncio.session import AsyncSession
 from datetime import datetime
 
@@ -14,16 +17,11 @@ class BankAccount(SQLModel, table=True):
     is_locked: bool = Field(default=False)
 
     async def get_balance(self, session: AsyncSession) -> float:
-        incoming_query = select(func.sum(BankAccountOperation.amount)).filter(
-            BankAccountOperation.destination_account_id == self.id
-        )
-        outgoing_query = select(func.sum(BankAccountOperation.amount)).filter(
-            BankAccountOperation.source_account_id == self.id
+        query = select(BankAccountBalance.balance).filter(
+            BankAccountBalance.bank_account_id == self.id
         )
 
-        return ((await session.exec(incoming_query)).first() or 0.0) - (
-            (await session.exec(outgoing_query)).first() or 0.0
-        )
+        return (await session.exec(query)).first() or 0.0
 
 
 class BankAccountOperation(SQLModel, table=True):
@@ -33,6 +31,24 @@ class BankAccountOperation(SQLModel, table=True):
     """
 
     __tablename__ = "bank_account_operation"
+    __table_args__ = (
+        # Account history is read newest first from both sides, keyset paginated on (operation_date, operation_id).
+        # Included columns let the sums of withdrawals and the ledger be computed from the index alone.
+        Index(
+            "ix_bank_account_operation_source_history",
+            "source_account_id",
+            "operation_date",
+            "operation_id",
+            postgresql_include=["destination_account_id", "amount"],
+        ),
+        Index(
+            "ix_bank_account_operation_destination_history",
+            "destination_account_id",
+            "operation_date",
+            "operation_id",
+            postgresql_include=["amount"],
+        ),
+    )
     operation_id: int = Field(primary_key=True)
     operation_date: datetime = Field(default_factory=datetime.now)
     amount: float
@@ -40,3 +56,62 @@ class BankAccountOperation(SQLModel, table=True):
     description: str
     source_account_id: int | None = Field(foreign_key="bank_account.id")
     destination_account_id: int | None = Field(foreign_key="bank_account.id")
+
+
+class BankAccountBalance(SQLModel, table=True):
+    """
+    Materialized balance of the bank account, so reading it does not depend on the length of the history.
+    It is updated in the same transaction as every BankAccountOperation insert
+    and can be rebuilt from the ledger with src.SQL.balance_reconciliation.
+    """
+
+    __tablename__ = "bank_account_balance"
+    bank_account_id: int = Field(primary_key=True, foreign_key="bank_account.id")
+    balance: float = Field(default=0.0)
+
+
+def get_balance_deltas(
+    operations: list[BankAccountOperation],
+) -> dict[int, float]:
+    """Sum up how the given operations change the balance of each involved account"""
+    deltas: dict[int, float] = defaultdict(float)
+    for operation in operations:
+        if operation.source_account_id is not None:
+            deltas[operation.source_account_id] -= operation.amount
+        if operation.destination_account_id is not None:
+            deltas[operation.destination_account_id] += operation.amount
+    return deltas
+
+
+def update_balances_query(deltas: dict[int, float]):
+    """
+    Upsert which adds deltas to the materialized balances.
+    Rows are sorted by account id, so concurrent transactions lock them in the same order.
+    """
+    query = insert(BankAccountBalance).values(
+        [
+            {"bank_account_id": account_id, "balance": delta}
+            for account_id, delta in sorted(deltas.items())
+        ]
+    )
+    return query.on_conflict_do_update(
+        index_elements=[BankAccountBalance.bank_account_id],
+        set_={"balance": BankAccountBalance.balance + query.excluded.balance},
+    )
+
+
+@event.listens_for(BankAccount, "after_insert")
+def _create_balance_after_account_insert(mapper, connection, target) -> None:
+    # Every account has a balance row from the start, so it can always be locked before money is moved
+    connection.execute(
+        insert(BankAccountBalance)
+        .values(bank_account_id=target.id, balance=0.0)
+        .on_conflict_do_nothing()
+    )
+
+
+@event.listens_for(BankAccountOperation, "after_insert")
+def _update_balances_after_operation_insert(mapper, connection, target) -> None:
+    # Runs inside the flush, so the balance change is committed or rolled back together with the operation
+    if deltas := get_balance_deltas([target]):
+        connection.execute(update_balances_query(deltas))
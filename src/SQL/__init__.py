@@ -1,6 +1,8 @@
-from .connection import async_session_generator, get_async_session  # noqa: F401
+from .connection import get_async_session, session_scope, pool_metrics  # noqa: F401
 from sqlmodel.ext.asyncio.session import AsyncSession  # noqa: F401
-from sqlmodel import select  # noqa: F401
+from sqlmodel import select, update  # noqa: F401
 from .Enum import AccountStatus, Privilege, ParentRole, CollectionOperationType  # noqa: F401
 import src.SQL.Tables as Tables  # noqa: F401
 from sqlalchemy.orm import aliased  # noqa: F401
+from .json_aggregation import json_list, json_object  # noqa: F401
+from .transactions import run_with_retry, transaction_metrics  # noqa: F401
@@ -0,0 +1,108 @@
+import asyncio
+from sqlalchemy import text, union_all, exists
+from sqlalchemy.dialects.postgresql import insert
+from sqlmodel import select, func
+from fastapi import logger
+
+from .connection import session_scope
+from sqlmodel.ext.asyncio.session import AsyncSession
+from .Tables.Financial import BankAccount, BankAccountOperation, BankAccountBalance
+
+
+def ledger_balances_query():
+    """Balance of every bank account computed from the whole operations history"""
+    movements = union_all(
+        select(
+            BankAccountOperation.destination_account_id.label("account_id"),
+            BankAccountOperation.amount.label("amount"),
+        ).where(BankAccountOperation.destination_account_id.is_not(None)),
+        select(
+            BankAccountOperation.source_account_id.label("account_id"),
+            (-BankAccountOperation.amount).label("amount"),
+        ).where(BankAccountOperation.source_account_id.is_not(None)),
+    ).subquery("movements")
+
+    return (
+        select(
+            BankAccount.id.label("bank_account_id"),
+            func.coalesce(func.sum(movements.c.amount), 0.0).label("balance"),
+        )
+        .outerjoin(movements, movements.c.account_id == BankAccount.id)
+        .group_by(BankAccount.id)
+    )
+
+
+async def lock_ledger(session: AsyncSession) -> None:
+    # Blocks new operations until the transaction ends, so the ledger does not change while it is summed up
+    await session.exec(text("LOCK TABLE bank_account_operation IN SHARE MODE"))
+
+
+async def find_drifted_balances(session: AsyncSession) -> list[int]:
+    """Get ids of bank accounts whose materialized balance differs from the ledger"""
+    ledger = ledger_balances_query().subquery("ledger")
+    query = (
+        select(ledger.c.bank_account_id)
+        .outerjoin(
+            BankAccountBalance,
+            BankAccountBalance.bank_account_id == ledger.c.bank_account_id,
+        )
+        .where(
+            func.abs(
+                func.coalesce(BankAccountBalance.balance, 0.0) - ledger.c.balance
+            )
+            > 0.001
+        )
+    )
+
+    return list((await session.exec(query)).all())
+
+
+async def rebuild_balances(session: AsyncSession) -> list[int]:
+    """
+    Recalculate all materialized balances from the ledger.
+    Returns ids of bank accounts which had an incorrect balance.
+    """
+    await lock_ledger(session)
+    drifted_account_ids = await find_drifted_balances(session)
+
+    query = insert(BankAccountBalance).from_select(
+        ["bank_account_id", "balance"], ledger_balances_query()
+    )
+    await session.exec(
+        query.on_conflict_do_update(
+            index_elements=[BankAccountBalance.bank_account_id],
+            set_={"balance": query.excluded.balance},
+        )
+    )
+    await session.commit()
+
+    return drifted_account_ids
+
+
+async def backfill_missing_balances(session: AsyncSession) -> None:
+    """Create materialized balances for bank accounts which do not have one yet, e.g. after upgrade"""
+    await lock_ledger(session)
+
+    ledger = ledger_balances_query().where(
+        ~exists().where(BankAccountBalance.bank_account_id == BankAccount.id)
+    )
+    await session.exec(
+        insert(BankAccountBalance)
+        .from_select(["bank_account_id", "balance"], ledger)
+        .on_conflict_do_nothing()
+    )
+    await session.commit()
+
+
+async def reconcile() -> None:
+    async with session_scope() as session:
+        drifted_account_ids = await rebuild_balances(session)
+
+    if drifted_account_ids:
+        logger.logger.warning(
+            f"Corrected balance of bank accounts: {drifted_account_ids}"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(reconcile())
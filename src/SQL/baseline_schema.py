@@ -0,0 +1,159 @@
+"""
+Schema of the database as it was when versioned migrations were introduced, created by migration 1.
+It is a frozen snapshot, changes of src.SQL.Tables belong to new migrations and never here.
+IF NOT EXISTS lets it adopt databases which were created before migrations existed.
+"""
+
+BASELINE_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS bank_account (
+        id SERIAL NOT NULL,
+        account_number VARCHAR(26) NOT NULL,
+        is_locked BOOLEAN NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (account_number)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS class_group (
+        id SERIAL NOT NULL,
+        name VARCHAR NOT NULL,
+        description VARCHAR NOT NULL,
+        access_code VARCHAR,
+        PRIMARY KEY (id),
+        UNIQUE (name),
+        UNIQUE (access_code)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS user_account (
+        id SERIAL NOT NULL,
+        username VARCHAR NOT NULL,
+        email VARCHAR,
+        privilege INTEGER NOT NULL,
+        status INTEGER NOT NULL,
+        password VARCHAR NOT NULL,
+        PRIMARY KEY (id)
+    )
+    """,
+    "CREATE UNIQUE INDEX IF NOT EXISTS ix_user_account_username ON user_account (username)",
+    """
+    CREATE TABLE IF NOT EXISTS bank_account_balance (
+        bank_account_id INTEGER NOT NULL,
+        balance FLOAT NOT NULL,
+        PRIMARY KEY (bank_account_id),
+        FOREIGN KEY(bank_account_id) REFERENCES bank_account (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS bank_account_operation (
+        operation_id SERIAL NOT NULL,
+        operation_date TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+        amount FLOAT NOT NULL,
+        title VARCHAR NOT NULL,
+        description VARCHAR NOT NULL,
+        source_account_id INTEGER,
+        destination_account_id INTEGER,
+        PRIMARY KEY (operation_id),
+        FOREIGN KEY(source_account_id) REFERENCES bank_account (id),
+        FOREIGN KEY(destination_account_id) REFERENCES bank_account (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_bank_account_operation_destination_account ON bank_account_operation (destination_account_id, operation_id) INCLUDE (amount)",
+    "CREATE INDEX IF NOT EXISTS ix_bank_account_operation_source_account ON bank_account_operation (source_account_id, operation_id) INCLUDE (destination_account_id, amount)",
+    """
+    CREATE TABLE IF NOT EXISTS child (
+        id SERIAL NOT NULL,
+        name VARCHAR NOT NULL,
+        surname VARCHAR NOT NULL,
+        birth_date DATE NOT NULL,
+        group_id INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(group_id) REFERENCES class_group (id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_child_group_id ON child (group_id)",
+    """
+    CREATE TABLE IF NOT EXISTS parent (
+        name VARCHAR NOT NULL,
+        surname VARCHAR NOT NULL,
+        phone VARCHAR NOT NULL,
+        city VARCHAR NOT NULL,
+        street VARCHAR NOT NULL,
+        house_number VARCHAR NOT NULL,
+        id SERIAL NOT NULL,
+        account_id INTEGER NOT NULL,
+        bank_account_id INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        UNIQUE (account_id),
+        FOREIGN KEY(account_id) REFERENCES user_account (id),
+        FOREIGN KEY(bank_account_id) REFERENCES bank_account (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS collection (
+        id SERIAL NOT NULL,
+        logo_path VARCHAR,
+        name VARCHAR NOT NULL,
+        description VARCHAR NOT NULL,
+        start_date DATE NOT NULL,
+        end_date DATE,
+        status INTEGER NOT NULL,
+        price FLOAT NOT NULL,
+        class_group_id INTEGER NOT NULL,
+        bank_account_id INTEGER NOT NULL,
+        owner_id INTEGER NOT NULL,
+        withdrawn_money FLOAT NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(class_group_id) REFERENCES class_group (id),
+        FOREIGN KEY(bank_account_id) REFERENCES bank_account (id),
+        FOREIGN KEY(owner_id) REFERENCES parent (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS parent_group_role (
+        class_group_id INTEGER NOT NULL,
+        parent_id INTEGER NOT NULL,
+        role INTEGER NOT NULL,
+        PRIMARY KEY (class_group_id, parent_id),
+        FOREIGN KEY(class_group_id) REFERENCES class_group (id),
+        FOREIGN KEY(parent_id) REFERENCES parent (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS parenthood (
+        parent_id INTEGER NOT NULL,
+        child_id INTEGER NOT NULL,
+        PRIMARY KEY (parent_id, child_id),
+        FOREIGN KEY(parent_id) REFERENCES parent (id),
+        FOREIGN KEY(child_id) REFERENCES child (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS collection_documents (
+        document_id SERIAL NOT NULL,
+        collection_id INTEGER NOT NULL,
+        document_name VARCHAR NOT NULL,
+        file_type VARCHAR NOT NULL,
+        file_data BYTEA NOT NULL,
+        PRIMARY KEY (document_id),
+        FOREIGN KEY(collection_id) REFERENCES collection (id)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS collection_operation (
+        child_id INTEGER NOT NULL,
+        collection_id INTEGER NOT NULL,
+        operation_date DATE NOT NULL,
+        requester_id INTEGER NOT NULL,
+        payment_id INTEGER,
+        operation_type INTEGER NOT NULL,
+        PRIMARY KEY (child_id, collection_id),
+        FOREIGN KEY(child_id) REFERENCES child (id),
+        FOREIGN KEY(collection_id) REFERENCES collection (id),
+        FOREIGN KEY(requester_id) REFERENCES parent (id),
+        FOREIGN KEY(payment_id) REFERENCES bank_account_operation (operation_id)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS ix_collection_operation_collection_type ON collection_operation (collection_id, operation_type) INCLUDE (child_id, payment_id)",
+]
@@ -1,9 +1,11 @@
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+from sqlalchemy import event
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel.ext.asyncio.session import AsyncSession
 import src.config as config
 
-PG_CONNECTION_STRING = "postgresql://{user}:{password}@{address}:{port}/{db_name}"
 PG_ASYNC_CONNECTION_STRING = (
     "postgresql+asyncpg://{user}:{password}@{address}:{port}/{db_name}"
 )
@@ -31,10 +33,62 @@ async_session_maker = sessionmaker(
 )
 
 
-async def async_session_generator():
+class PoolMetrics:
+    """
+    Tracks connections taken from and returned to the pool of the engine.
+    checkouts - checkins is the number of connections currently held by sessions,
+    it has to go back to zero when the application is idle.
+    """
+
+    def __init__(self, engine):
+        self.pool = engine.pool
+        self.checkouts = 0
+        self.checkins = 0
+        self.peak_checked_out = 0
+        event.listen(engine.sync_engine, "checkout", self.__on_checkout)
+        event.listen(engine.sync_engine, "checkin", self.__on_checkin)
+
+    def __on_checkout(self, dbapi_connection, connection_record, connection_proxy) -> None:
+        self.checkouts += 1
+        self.peak_checked_out = max(
+            self.peak_checked_out, self.checkouts - self.checkins
+        )
+
+    def __on_checkin(self, dbapi_connection, connection_record) -> None:
+        self.checkins += 1
+
+    def stats(self) -> dict:
+        return {
+            "pool_size": self.pool.size(),
+            "checked_out": self.pool.checkedout(),
+            "checked_in": self.pool.checkedin(),
+            "overflow": self.pool.overflow(),
+            "peak_checked_out": self.peak_checked_out,
+            "checkouts": self.checkouts,
+            "checkins": self.checkins,
+        }
+
+
+pool_metrics = PoolMetrics(async_engine)
+
+
+@asynccontextmanager
+async def session_scope() -> AsyncIterator[AsyncSession]:
+    """
+    Session which is committed when the block succeeds, rolled back when it raises
+    and always closed, so its connection returns to the pool.
+    """
     async with async_session_maker() as session:
-        yield session
+        try:
+            yield session
+            await session.commit()
+        except Exception:
+            await session.rollback()
+            raise
 
 
-async def get_async_session():
-    return async_session_maker()
+async def get_async_session() -> AsyncIterator[AsyncSession]:
+    """Request scoped session dependency"""
+    async with session_scope() as session:
+        yield session
+
@@ -2,22 +2,22 @@ from typing import List
 
 from src.config import DEFAULT_ADMIN_USERNAME, DEFAULT_ADMIN_PASSWORD
 from src.Model.UserAccount import RegisterUser
-from .connection import get_async_session
+from .connection import session_scope
 from sqlmodel.ext.asyncio.session import AsyncSession
 from sqlmodel import select
 from .Enum import AccountStatus, Privilege
 from .Tables.People import UserAccount, Parent
 from ..Model.PeopleModel import ParentModel
 from ..Service.IBAN_generator.iban_db_service import create_bank_account
+from ..Service.Auth.password_hashing import hash_password
 
 
 async def insert_data() -> None:
     """
     Insert default data into database.
     """
-    session: AsyncSession = await get_async_session()
-    await insert_users(session)
-    await session.close()
+    async with session_scope() as session:
+        await insert_users(session)
 
 
 
@@ -30,6 +30,7 @@ async def insert_users(session: AsyncSession) -> None:
                     username=DEFAULT_ADMIN_USERNAME,
                     password=DEFAULT_ADMIN_PASSWORD,
                 ).model_dump(),
+                "password": await hash_password(DEFAULT_ADMIN_PASSWORD),
                 "status": AccountStatus.ENABLED,
                 "privilege": Privilege.ADMIN_USER,
             }
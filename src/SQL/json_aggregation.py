@@ -0,0 +1,38 @@
+from typing import Sequence
+from sqlalchemy import JSON, literal_column
+from sqlalchemy.dialects.postgresql import aggregate_order_by
+from sqlalchemy.sql.selectable import Select, ScalarSelect
+from sqlmodel import select, func
+
+
+def json_list(
+    query: Select, null_if_empty: bool = False, order_by: Sequence[str] = ()
+) -> ScalarSelect:
+    """
+    Scalar subquery aggregating rows of the query into a JSON array of objects keyed by column labels,
+    so one-to-many data can be fetched in the same round trip as its parent row.
+    Order of the array is given by labels in order_by, ordering of the query itself is not kept.
+    A label prefixed with "-" orders descending.
+    """
+    rows = query.subquery()
+    aggregated_rows = rows.table_valued()
+    if order_by:
+        aggregated_rows = aggregate_order_by(
+            aggregated_rows,
+            *(
+                rows.c[label[1:]].desc() if label.startswith("-") else rows.c[label]
+                for label in order_by
+            ),
+        )
+    aggregated = func.json_agg(aggregated_rows, type_=JSON)
+    if not null_if_empty:
+        aggregated = func.coalesce(aggregated, literal_column("'[]'::json"), type_=JSON)
+
+    return select(aggregated).select_from(rows).scalar_subquery()
+
+
+def json_object(query: Select) -> ScalarSelect:
+    """Scalar subquery returning the first row of the query as JSON object, or NULL if there is none"""
+    rows = query.limit(1).subquery()
+
+    return select(func.row_to_json(rows.table_valued(), type_=JSON)).select_from(rows).scalar_subquery()
@@ -0,0 +1,312 @@
+"""
+Versioned schema migrations.
+They are run once per deploy, before the application starts:
+    python -m src.SQL.migrations
+The application itself only checks that the database is at SCHEMA_VERSION.
+"""
+
+import asyncio
+from datetime import datetime
+from typing import Awaitable, Callable, NamedTuple
+from fastapi import logger
+from sqlalchemy import Column, DateTime, Integer, MetaData, String, Table, text
+from sqlalchemy.exc import ProgrammingError
+from sqlmodel import SQLModel, select, func
+from sqlmodel.ext.asyncio.session import AsyncSession
+import src.config as config
+import src.SQL.Tables  # noqa: F401
+from .connection import async_engine, session_scope
+from .balance_reconciliation import backfill_missing_balances
+from .data_insert import insert_data
+from .baseline_schema import BASELINE_SCHEMA
+from src.BlobStore import blob_store
+
+schema_version_table = Table(
+    "schema_version",
+    MetaData(),
+    Column("version", Integer, primary_key=True),
+    Column("description", String, nullable=False),
+    Column("applied_at", DateTime, nullable=False, default=datetime.now),
+)
+
+# Any number, it only has to be the same for every process running migrations
+MIGRATION_LOCK_ID = 7_301_245
+
+
+class Migration(NamedTuple):
+    version: int
+    description: str
+    upgrade: Callable[[AsyncSession], Awaitable[None]]
+
+
+async def create_initial_schema(session: AsyncSession) -> None:
+    for statement in BASELINE_SCHEMA:
+        await session.exec(text(statement))
+
+
+async def index_account_history_by_date(session: AsyncSession) -> None:
+    await session.exec(text("DROP INDEX IF EXISTS ix_bank_account_operation_source_account"))
+    await session.exec(
+        text("DROP INDEX IF EXISTS ix_bank_account_operation_destination_account")
+    )
+    await session.exec(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_bank_account_operation_source_history "
+            "ON bank_account_operation (source_account_id, operation_date, operation_id) "
+            "INCLUDE (destination_account_id, amount)"
+        )
+    )
+    await session.exec(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_bank_account_operation_destination_history "
+            "ON bank_account_operation (destination_account_id, operation_date, operation_id) "
+            "INCLUDE (amount)"
+        )
+    )
+
+
+async def move_documents_to_blob_store(session: AsyncSession) -> None:
+    await session.exec(
+        text(
+            "ALTER TABLE collection_documents "
+            "ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64), "
+            "ADD COLUMN IF NOT EXISTS file_size INTEGER"
+        )
+    )
+
+    has_file_data = (
+        await session.exec(
+            text(
+                "SELECT EXISTS (SELECT 1 FROM information_schema.columns "
+                "WHERE table_name = 'collection_documents' AND column_name = 'file_data')"
+            )
+        )
+    ).scalar_one()
+    if has_file_data:
+        document_ids = (
+            await session.exec(
+                text("SELECT document_id FROM collection_documents WHERE content_hash IS NULL")
+            )
+        ).scalars().all()
+        # One document at a time, so only a single file is held in memory
+        for document_id in document_ids:
+            file_data = (
+                await session.exec(
+                    text(
+                        "SELECT file_data FROM collection_documents WHERE document_id = :document_id"
+                    ).bindparams(document_id=document_id)
+                )
+            ).scalar_one()
+            await session.exec(
+                text(
+                    "UPDATE collection_documents "
+                    "SET content_hash = :content_hash, file_size = :file_size "
+                    "WHERE document_id = :document_id"
+                ).bindparams(
+                    content_hash=await blob_store.put(file_data),
+                    file_size=len(file_data),
+                    document_id=document_id,
+                )
+            )
+        await session.exec(text("ALTER TABLE collection_documents DROP COLUMN file_data"))
+
+    await session.exec(
+        text(
+            "ALTER TABLE collection_documents "
+            "ALTER COLUMN content_hash SET NOT NULL, "
+            "ALTER COLUMN file_size SET NOT NULL"
+        )
+    )
+    await session.exec(
+        text(
+            "CREATE INDEX IF NOT EXISTS ix_collection_documents_content_hash "
+            "ON collection_documents (content_hash)"
+        )
+    )
+
+
+async def add_document_previews(session: AsyncSession) -> None:
+    await session.exec(
+        text(
+            "ALTER TABLE collection_documents ADD COLUMN IF NOT EXISTS preview_hash VARCHAR(64)"
+        )
+    )
+
+
+async def version_financial_reports(session: AsyncSession) -> None:
+    await session.exec(
+        text(
+            "ALTER TABLE collection ADD COLUMN IF NOT EXISTS report_version INTEGER NOT NULL DEFAULT 0"
+        )
+    )
+    # Statement triggers, so a batch of payments or refunds bumps each collection once instead of once per row.
+    # Transition tables are available only to triggers of a single event, hence a trigger for each of them.
+    await session.exec(
+        text(
+            """
+            CREATE OR REPLACE FUNCTION bump_collection_report_version() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE collection SET report_version = report_version + 1
+                    WHERE id IN (SELECT DISTINCT collection_id FROM new_rows);
+                ELSIF TG_OP = 'DELETE' THEN
+                    UPDATE collection SET report_version = report_version + 1
+                    WHERE id IN (SELECT DISTINCT collection_id FROM old_rows);
+                ELSE
+                    UPDATE collection SET report_version = report_version + 1
+                    WHERE id IN (
+                        SELECT collection_id FROM new_rows UNION SELECT collection_id FROM old_rows
+                    );
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+            """
+        )
+    )
+    # Only names and classes of children are in reports, a child moved to another class changes both of them
+    await session.exec(
+        text(
+            """
+            CREATE OR REPLACE FUNCTION bump_class_report_versions() RETURNS trigger AS $$
+            BEGIN
+                IF TG_OP = 'INSERT' THEN
+                    UPDATE collection SET report_version = report_version + 1
+                    WHERE class_group_id IN (SELECT DISTINCT group_id FROM new_rows);
+                ELSIF TG_OP = 'DELETE' THEN
+                    UPDATE collection SET report_version = report_version + 1
+                    WHERE class_group_id IN (SELECT DISTINCT group_id FROM old_rows);
+                ELSE
+                    UPDATE collection SET report_version = report_version + 1
+                    WHERE class_group_id IN (
+                        SELECT unnest(ARRAY[new_rows.group_id, old_rows.group_id])
+                        FROM new_rows JOIN old_rows USING (id)
+                        WHERE (new_rows.name, new_rows.surname, new_rows.group_id)
+                            IS DISTINCT FROM (old_rows.name, old_rows.surname, old_rows.group_id)
+                    );
+                END IF;
+                RETURN NULL;
+            END
+            $$ LANGUAGE plpgsql
+            """
+        )
+    )
+    for table, function in (
+        ("collection_operation", "bump_collection_report_version"),
+        ("child", "bump_class_report_versions"),
+    ):
+        for event, transition_tables in (
+            ("INSERT", "NEW TABLE AS new_rows"),
+            ("UPDATE", "NEW TABLE AS new_rows OLD TABLE AS old_rows"),
+            ("DELETE", "OLD TABLE AS old_rows"),
+        ):
+            await session.exec(
+                text(
+                    f"CREATE OR REPLACE TRIGGER {table}_{event.lower()}_report_version "
+                    f"AFTER {event} ON {table} REFERENCING {transition_tables} "
+                    f"FOR EACH STATEMENT EXECUTE FUNCTION {function}()"
+                )
+            )
+
+
+# Append only, a released migration must never be changed.
+# Migrations are written as explicit DDL, never derived from src.SQL.Tables, so they do the same on every database.
+# Changes of src.SQL.Tables need a new migration, create_initial_schema only builds the frozen baseline.
+MIGRATIONS = [
+    Migration(1, "Initial schema", create_initial_schema),
+    Migration(2, "Backfill materialized balances", backfill_missing_balances),
+    Migration(3, "Index account history by date", index_account_history_by_date),
+    Migration(4, "Move document content to the blob store", move_documents_to_blob_store),
+    Migration(5, "Add document previews", add_document_previews),
+    Migration(6, "Version collection financial reports", version_financial_reports),
+]
+SCHEMA_VERSION = MIGRATIONS[-1].version
+
+
+async def get_schema_version(session: AsyncSession) -> int | None:
+    """Version of the database schema, None if migrations have never been run"""
+    try:
+        return (
+            await session.exec(select(func.max(schema_version_table.c.version)))
+        ).one()
+    except ProgrammingError:
+        await session.rollback()
+        return None
+
+
+async def check_schema_version() -> None:
+    """Fail startup if the database is not at the version the application expects"""
+    async with session_scope() as session:
+        version = await get_schema_version(session)
+
+    if version != SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema is at version {version}, expected {SCHEMA_VERSION}. "
+            "Run migrations with: python -m src.SQL.migrations"
+        )
+
+
+async def drop_existing_tables(session: AsyncSession) -> None:
+    def drop_all(sync_session) -> None:
+        connection = sync_session.connection()
+        SQLModel.metadata.drop_all(connection)
+        schema_version_table.drop(connection, checkfirst=True)
+
+    await session.run_sync(drop_all)
+    await session.commit()
+
+
+async def migrate(drop_existing: str = config.DB_DROP_EXISTING_TABLES) -> None:
+    # Session bound to one connection, so the advisory lock is held across the commits of all migrations
+    async with async_engine.connect() as connection, AsyncSession(
+        bind=connection, expire_on_commit=False
+    ) as session:
+        # Concurrent deploys wait here and then find the migrations already applied
+        await session.exec(
+            text("SELECT pg_advisory_lock(:lock_id)").bindparams(
+                lock_id=MIGRATION_LOCK_ID
+            )
+        )
+        await session.commit()
+        try:
+            if drop_existing.upper() == "TRUE":
+                await drop_existing_tables(session)
+
+            await session.run_sync(
+                lambda sync_session: schema_version_table.create(
+                    sync_session.connection(), checkfirst=True
+                )
+            )
+            await session.commit()
+
+            current_version = await get_schema_version(session) or 0
+            for migration in MIGRATIONS:
+                if migration.version <= current_version:
+                    continue
+
+                logger.logger.info(
+                    f"Applying migration {migration.version}: {migration.description}"
+                )
+                await migration.upgrade(session)
+                await session.exec(
+                    schema_version_table.insert().values(
+                        version=migration.version,
+                        description=migration.description,
+                    )
+                )
+                await session.commit()
+        finally:
+            # Unlocking needs a usable transaction, everything applied so far is already committed
+            await session.rollback()
+            await session.exec(
+                text("SELECT pg_advisory_unlock(:lock_id)").bindparams(
+                    lock_id=MIGRATION_LOCK_ID
+                )
+            )
+            await session.commit()
+
+    await insert_data()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
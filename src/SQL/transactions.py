@@ -0,0 +1,93 @@
+import asyncio
+import random
+from collections import Counter
+from typing import Awaitable, Callable, TypeVar
+from fastapi import logger
+from sqlalchemy.exc import DBAPIError
+from sqlmodel.ext.asyncio.session import AsyncSession
+import src.config as config
+
+T = TypeVar("T")
+
+# Errors after which the whole transaction can be safely run again
+RETRYABLE_ERRORS = {
+    "40001": "serialization_failure",
+    "40P01": "deadlock_detected",
+    "55P03": "lock_not_available",
+}
+
+
+class TransactionMetrics:
+    """Contention of transactions which move money between bank accounts"""
+
+    def __init__(self):
+        self.transactions = 0
+        self.retries: Counter[str] = Counter()
+        self.gave_up = 0
+        self.lock_acquisitions = 0
+        self.lock_waits = 0
+        self.lock_wait_time = 0.0
+        self.max_lock_wait_time = 0.0
+
+    def record_lock_acquisition(self, elapsed_time: float) -> None:
+        """Every lock is counted, only the ones which took longer than LOCK_WAIT_THRESHOLD count as waits"""
+        self.lock_acquisitions += 1
+        if elapsed_time <= config.LOCK_WAIT_THRESHOLD:
+            return
+        self.lock_waits += 1
+        self.lock_wait_time += elapsed_time
+        self.max_lock_wait_time = max(self.max_lock_wait_time, elapsed_time)
+
+    def stats(self) -> dict:
+        return {
+            "transactions": self.transactions,
+            "retries": dict(self.retries),
+            "gave_up": self.gave_up,
+            "lock_acquisitions": self.lock_acquisitions,
+            "lock_waits": self.lock_waits,
+            "average_lock_wait_time": (
+                self.lock_wait_time / self.lock_waits if self.lock_waits else 0.0
+            ),
+            "max_lock_wait_time": self.max_lock_wait_time,
+        }
+
+
+transaction_metrics = TransactionMetrics()
+
+
+def get_retryable_error(error: DBAPIError) -> str | None:
+    return RETRYABLE_ERRORS.get(getattr(error.orig, "pgcode", None))
+
+
+async def run_with_retry(
+    session: AsyncSession, transaction: Callable[[], Awaitable[T]]
+) -> T:
+    """
+    Run the transaction, which has to end with a commit, and run it again with jittered exponential backoff
+    if it failed on a deadlock, lock timeout or serialization failure.
+    The session is rolled back after every failure, so the transaction cannot rely on objects loaded before it.
+    """
+    transaction_metrics.transactions += 1
+    for attempt in range(1, config.TRANSACTION_MAX_ATTEMPTS + 1):
+        try:
+            return await transaction()
+        except DBAPIError as error:
+            await session.rollback()
+            if (reason := get_retryable_error(error)) is None:
+                raise
+            if attempt == config.TRANSACTION_MAX_ATTEMPTS:
+                transaction_metrics.gave_up += 1
+                logger.logger.warning(
+                    f"Transaction failed after {attempt} attempts: {reason}"
+                )
+                raise
+
+            transaction_metrics.retries[reason] += 1
+            await asyncio.sleep(
+                config.TRANSACTION_RETRY_BACKOFF
+                * 2 ** (attempt - 1)
+                * random.uniform(0.5, 1.5)
+            )
+        except BaseException:
+            await session.rollback()
+            raise
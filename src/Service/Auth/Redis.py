@@ -1,9 +1,14 @@
 from pydantic import BaseModel
-from redis import Redis
 import datetime
 from typing import ClassVar
 import src.config as config
 import src.Service.Auth.Models as AuthModels
+from src.NoSQL.redis_connection import get_redis
+from .token_cache import (
+    access_token_cache,
+    get_token_hash,
+    INVALIDATED_ACCESS_TOKENS_CHANNEL,
+)
 
 
 class RedisSingleton(type):
@@ -49,19 +54,73 @@ class UserAccessTokenDetails(BaseModel):
         )
 
 
+# Both scripts get the set name templates as arguments, so the naming stays defined in RedisAuth only.
+# The sorted sets are cleaned up from expired tokens on the way.
+# Invalidated access token hash is published, so every worker can drop it from its cache.
+INVALIDATE_ACCESS_TOKEN_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return 0
+end
+
+local fields = {}
+for field in string.gmatch(value, '[^:]+') do
+    table.insert(fields, field)
+end
+if fields[1] ~= ARGV[2] then
+    return -1
+end
+
+local user_id = fields[2]
+local refresh_token = fields[5]
+local access_set_name = string.gsub(ARGV[3], '{user_id}', user_id)
+local refresh_set_name = string.gsub(ARGV[4], '{user_id}', user_id)
+
+redis.call('DEL', KEYS[1], refresh_token)
+redis.call('ZREM', access_set_name, KEYS[1])
+redis.call('ZREMRANGEBYSCORE', access_set_name, 0, ARGV[1])
+redis.call('ZREM', refresh_set_name, refresh_token)
+redis.call('ZREMRANGEBYSCORE', refresh_set_name, 0, ARGV[1])
+redis.call('PUBLISH', ARGV[5], ARGV[6])
+return 1
+"""
+
+CONSUME_REFRESH_TOKEN_SCRIPT = """
+local value = redis.call('GET', KEYS[1])
+if not value then
+    return 0
+end
+
+local token_type, user_id = string.match(value, '([^:]+):([^:]+)')
+if token_type ~= ARGV[2] then
+    return -1
+end
+
+local refresh_set_name = string.gsub(ARGV[3], '{user_id}', user_id)
+
+redis.call('DEL', KEYS[1])
+redis.call('ZREM', refresh_set_name, KEYS[1])
+redis.call('ZREMRANGEBYSCORE', refresh_set_name, 0, ARGV[1])
+return tonumber(user_id)
+"""
+
+
 class RedisAuth(metaclass=RedisSingleton):
     access_token_type: ClassVar[str] = "access_token"
     refresh_token_type: ClassVar[str] = "refresh_token"
+    user_tokens_set_name: ClassVar[str] = "user_{user_id}_tokens"
+    user_refresh_tokens_set_name: ClassVar[str] = "user_{user_id}_refresh_tokens"
 
     def __init__(self):
-        self.redis = Redis(
-            host=config.REDIS_HOST,
-            port=config.REDIS_PORT,
-            db=config.REDIS_DB,
-            decode_responses=True,
+        self.redis = get_redis()
+        self.__invalidate_access_token_script = self.redis.register_script(
+            INVALIDATE_ACCESS_TOKEN_SCRIPT
+        )
+        self.__consume_refresh_token_script = self.redis.register_script(
+            CONSUME_REFRESH_TOKEN_SCRIPT
         )
 
-    def register_token(
+    async def register_token(
         self,
         access_token: str,
         token_data: AuthModels.AccessTokenData,
@@ -77,31 +136,41 @@ class RedisAuth(metaclass=RedisSingleton):
             refresh_token=refresh_token,
         )
 
-        # Register token in Redis
-        self.redis.set(access_token, access_token_details.to_redis_value())
-        self.redis.expire(access_token, config.ACCESS_TOKEN_EXPIRATION_PERIOD)
-
         access_token_set_name = self.__get_user_tokens_set_name(user_id)
-        self.__cleanup_sorted_set(access_token_set_name)
-        # Register token in user's token in sorted set - for future token invalidation
-        self.redis.zadd(
-            access_token_set_name,
-            {access_token: (current_time + config.ACCESS_TOKEN_EXPIRATION_PERIOD)},
-        )
-
         refresh_token_set_name = self.__get_user_refresh_tokens_set_name(user_id)
-        self.__cleanup_sorted_set(refresh_token_set_name)
-        # Register refresh token in Redis sorted set
-        self.redis.set(refresh_token, f"{self.refresh_token_type}:{user_id}")
-        self.redis.expire(refresh_token, config.REFRESH_TOKEN_EXPIRATION_PERIOD)
-
-        self.redis.zadd(
-            refresh_token_set_name,
-            {refresh_token: (current_time + config.REFRESH_TOKEN_EXPIRATION_PERIOD)},
-        )
 
-    def get_refresh_token_owner(self, token: str) -> int | None:
-        if (redis_value := self.redis.get(token)) is None:
+        # All commands are sent in a single round trip and applied atomically
+        async with self.redis.pipeline(transaction=True) as pipeline:
+            # Register token in Redis
+            pipeline.set(
+                access_token,
+                access_token_details.to_redis_value(),
+                ex=config.ACCESS_TOKEN_EXPIRATION_PERIOD,
+            )
+
+            # Register token in user's token in sorted set - for future token invalidation
+            pipeline.zremrangebyscore(access_token_set_name, 0, current_time)
+            pipeline.zadd(
+                access_token_set_name,
+                {access_token: (current_time + config.ACCESS_TOKEN_EXPIRATION_PERIOD)},
+            )
+
+            # Register refresh token in Redis sorted set
+            pipeline.set(
+                refresh_token,
+                f"{self.refresh_token_type}:{user_id}",
+                ex=config.REFRESH_TOKEN_EXPIRATION_PERIOD,
+            )
+            pipeline.zremrangebyscore(refresh_token_set_name, 0, current_time)
+            pipeline.zadd(
+                refresh_token_set_name,
+                {refresh_token: (current_time + config.REFRESH_TOKEN_EXPIRATION_PERIOD)},
+            )
+
+            await pipeline.execute()
+
+    async def get_refresh_token_owner(self, token: str) -> int | None:
+        if (redis_value := await self.redis.get(token)) is None:
             return
 
         token_type, user_id = redis_value.split(":")
@@ -110,51 +179,66 @@ class RedisAuth(metaclass=RedisSingleton):
 
         return int(user_id)
 
-    def get_owner_details(self, token: str) -> UserAccessTokenDetails:
-        if (redis_value := self.redis.get(token)) is None:
-            raise ValueError("Token not found")
-
-        return UserAccessTokenDetails.create_from_redis_value(redis_value)
-
-    def invalidate_access_token(self, token: str) -> None:
-        # Get user_id from token - if token is not in Redis, it is already invalidated
-        token_details = self.get_owner_details(token)
+    async def get_owner_details(self, token: str) -> UserAccessTokenDetails:
+        token_hash = get_token_hash(token)
+        if (token_details := access_token_cache.get(token_hash)) is not None:
+            return token_details
 
-        access_set_name = self.__get_user_tokens_set_name(token_details.user_id)
-
-        self.redis.delete(token)
-        self.redis.zrem(access_set_name, token)
-        self.__cleanup_sorted_set(access_set_name)
+        if (redis_value := await self.redis.get(token)) is None:
+            raise ValueError("Token not found")
 
-        refresh_set_name = self.__get_user_refresh_tokens_set_name(
-            token_details.user_id
+        token_details = UserAccessTokenDetails.create_from_redis_value(redis_value)
+        access_token_cache.set(token_hash, token_details)
+        return token_details
+
+    async def invalidate_access_token(self, token: str) -> None:
+        """Remove access token together with its refresh token in a single atomic script call"""
+        token_hash = get_token_hash(token)
+        access_token_cache.invalidate(token_hash)
+
+        result = await self.__invalidate_access_token_script(
+            keys=[token],
+            args=[
+                int(datetime.datetime.now().timestamp()),
+                self.access_token_type,
+                self.user_tokens_set_name,
+                self.user_refresh_tokens_set_name,
+                INVALIDATED_ACCESS_TOKENS_CHANNEL,
+                token_hash,
+            ],
         )
 
-        self.redis.delete(token_details.refresh_token)
-        self.redis.zrem(refresh_set_name, token_details.refresh_token)
-        self.__cleanup_sorted_set(refresh_set_name)
+        if result == 0:
+            raise ValueError("Token not found")
+        if result == -1:
+            raise ValueError("Invalid token type")
 
-    def invalidate_refresh_token(self, token: str) -> None:
-        if (redis_value := self.redis.get(token)) is None:
-            return
+    async def consume_refresh_token(self, token: str) -> int | None:
+        """
+        Remove refresh token and return id of its owner in a single atomic script call.
+        Returns None if token does not exist, so it can be used only once.
+        """
+        result = await self.__consume_refresh_token_script(
+            keys=[token],
+            args=[
+                int(datetime.datetime.now().timestamp()),
+                self.refresh_token_type,
+                self.user_refresh_tokens_set_name,
+            ],
+        )
 
-        token_type, user_id = redis_value.split(":")
-        if token_type != self.refresh_token_type:
+        if result == 0:
+            return None
+        if result == -1:
             raise ValueError("Invalid token type")
 
-        access_set_name = self.__get_user_tokens_set_name(int(user_id))
-        self.redis.zrem(access_set_name, token)
-        self.__cleanup_sorted_set(access_set_name)
+        return int(result)
 
-        self.redis.delete(token)
-
-    def __cleanup_sorted_set(self, set_name: str) -> None:
-        # Remove all expired tokens
-        current_time = int(datetime.datetime.now().timestamp())
-        self.redis.zremrangebyscore(set_name, 0, current_time)
+    async def invalidate_refresh_token(self, token: str) -> None:
+        await self.consume_refresh_token(token)
 
     def __get_user_tokens_set_name(self, user_id: int) -> str:
-        return "user_{user_id}_tokens".format(user_id=user_id)
+        return self.user_tokens_set_name.format(user_id=user_id)
 
     def __get_user_refresh_tokens_set_name(self, user_id: int) -> str:
-        return "user_{user_id}_refresh_tokens".format(user_id=user_id)
+        return self.user_refresh_tokens_set_name.format(user_id=user_id)
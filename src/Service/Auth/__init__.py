@@ -3,3 +3,4 @@ from .dependencies import authorized_user  # noqa: F401
 from .Models import Token  # noqa: F401
 from .username_password import user_login  # noqa: F401
 from .token import user_logout, refresh_token  # noqa: F401
+from .token_cache import access_token_cache, listen_for_invalidated_tokens  # noqa: F401
@@ -2,6 +2,7 @@ from typing import Annotated
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from .Redis import UserAccessTokenDetails, RedisAuth
+from .helpers import token_store_unavailable_as_503
 import src.SQL.Enum.Privilege as Privilege
 
 bearer_auth = HTTPBearer()
@@ -10,12 +11,13 @@ bearer_auth = HTTPBearer()
 def authorized_user(
     expected_privilege: int = Privilege.STANDARD_USER,
 ) -> UserAccessTokenDetails:
-    def dependency(
+    async def dependency(
         authorization: Annotated[HTTPAuthorizationCredentials, Depends(bearer_auth)],
     ) -> UserAccessTokenDetails:
         client = RedisAuth()
         try:
-            owner_details = client.get_owner_details(authorization.credentials)
+            with token_store_unavailable_as_503():
+                owner_details = await client.get_owner_details(authorization.credentials)
         except ValueError:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED, detail="Unauthorized"
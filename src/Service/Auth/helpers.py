@@ -1,8 +1,23 @@
+from contextlib import contextmanager
+from fastapi import HTTPException, status
+from redis.exceptions import RedisError
 import src.SQL as SQL
 
 import src.SQL.Enum.AccountStatus as AccountStatus
 
 
+@contextmanager
+def token_store_unavailable_as_503():
+    """Failures of Redis holding the tokens are answered with 503 instead of surfacing as 500"""
+    try:
+        yield
+    except RedisError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Authorization service unavailable",
+        )
+
+
 async def get_user_account(
     sql_session: SQL.AsyncSession, user_id: int = None, username: str = None
 ) -> SQL.Tables.UserAccount:
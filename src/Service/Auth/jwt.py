@@ -2,11 +2,12 @@ import jwt
 import datetime
 import src.Service.Auth.Models as AuthModels
 from src.Service.Auth.Redis import RedisAuth
+from src.Service.Auth.helpers import token_store_unavailable_as_503
 import src.config as config
 import src.SQL as SQL
 
 
-def generate_access_token(
+async def generate_access_token(
     user: SQL.Tables.UserAccount,
 ) -> AuthModels.Token:
     expires = (
@@ -26,7 +27,9 @@ def generate_access_token(
         refresh_token=refresh_token,
         expires=expires,
     )
-    RedisAuth().register_token(token.access_token, token_data)
+    # Login and refresh both end here
+    with token_store_unavailable_as_503():
+        await RedisAuth().register_token(token.access_token, token_data)
     return token
 
 
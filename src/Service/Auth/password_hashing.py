@@ -0,0 +1,93 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, TypeVar
+import bcrypt
+from fastapi import HTTPException, status
+import src.config as config
+
+T = TypeVar("T")
+
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated thread pool, so hashing does not block the event loop.
+    bcrypt releases the GIL, so the pool hashes in parallel with request handling.
+    At most `workers` operations run at once, the rest wait in a bounded queue.
+    """
+
+    def __init__(self, workers: int, max_queue_depth: int):
+        self.workers = workers
+        self.max_queue_depth = max_queue_depth
+        self.__executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix="password-hasher"
+        )
+        self.__semaphore = asyncio.Semaphore(workers)
+
+        self.in_progress = 0
+        self.queued = 0
+        self.peak_queue_depth = 0
+        self.completed = 0
+        self.rejected = 0
+
+    async def run(self, function: Callable[..., T], *args) -> T:
+        if self.__semaphore.locked():
+            if self.queued >= self.max_queue_depth:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="Too many password operations in progress, try again later",
+                )
+            self.queued += 1
+            self.peak_queue_depth = max(self.peak_queue_depth, self.queued)
+            try:
+                await self.__semaphore.acquire()
+            finally:
+                self.queued -= 1
+        else:
+            await self.__semaphore.acquire()
+
+        self.in_progress += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(
+                self.__executor, function, *args
+            )
+        finally:
+            self.in_progress -= 1
+            self.completed += 1
+            self.__semaphore.release()
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_progress": self.in_progress,
+            "queued": self.queued,
+            "peak_queue_depth": self.peak_queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            "completed": self.completed,
+            "rejected": self.rejected,
+        }
+
+
+password_hasher = PasswordHasher(
+    workers=config.PASSWORD_HASH_WORKERS,
+    max_queue_depth=config.PASSWORD_HASH_MAX_QUEUE,
+)
+
+
+def _hash_password(password: str) -> str:
+    return bcrypt.hashpw(
+        password.encode(),
+        config.PASSWORD_HASH_SALT.encode(),
+    ).decode()
+
+
+def _verify_password(password: str, password_hash: str) -> bool:
+    return bcrypt.checkpw(password.encode(), password_hash.encode())
+
+
+async def hash_password(password: str) -> str:
+    return await password_hasher.run(_hash_password, password)
+
+
+async def verify_password(password: str, password_hash: str) -> bool:
+    return await password_hasher.run(_verify_password, password, password_hash)
@@ -2,13 +2,14 @@ from fastapi import HTTPException, status
 import src.SQL as SQL
 from .Redis import AuthorizedUser, RedisAuth
 from .Models import Token
-from .helpers import get_user_account
+from .helpers import get_user_account, token_store_unavailable_as_503
 from .jwt import generate_access_token
 
 
-def user_logout(user: AuthorizedUser):
+async def user_logout(user: AuthorizedUser):
     redis_client = RedisAuth()
-    redis_client.invalidate_access_token(user.access_token)
+    with token_store_unavailable_as_503():
+        await redis_client.invalidate_access_token(user.access_token)
 
 
 async def refresh_token(
@@ -16,10 +17,15 @@ async def refresh_token(
     sql_session: SQL.AsyncSession,
 ) -> Token:
     redis = RedisAuth()
-    if (owner_id := redis.get_refresh_token_owner(refresh_token)) is None:
+    try:
+        with token_store_unavailable_as_503():
+            owner_id = await redis.consume_refresh_token(refresh_token)
+    except ValueError:
+        owner_id = None
+
+    if owner_id is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid refresh token"
         )
-    redis.invalidate_refresh_token(refresh_token)
     user = await get_user_account(sql_session, user_id=owner_id)
-    return generate_access_token(user)
+    return await generate_access_token(user)
@@ -0,0 +1,43 @@
+import asyncio
+import hashlib
+from fastapi import logger
+from redis.exceptions import RedisError
+import src.config as config
+from src.NoSQL.redis_connection import get_redis
+from src.Service.Cache import TTLCache
+
+INVALIDATED_ACCESS_TOKENS_CHANNEL = "invalidated_access_tokens"
+
+# Keyed by token hash, so raw tokens are not kept in memory longer than needed
+access_token_cache = TTLCache(
+    max_size=config.ACCESS_TOKEN_CACHE_SIZE,
+    ttl=config.ACCESS_TOKEN_CACHE_TTL,
+)
+
+
+def get_token_hash(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+async def listen_for_invalidated_tokens() -> None:
+    """
+    Evict access tokens invalidated by any worker from the local cache.
+    Runs in the background for the whole lifetime of the application.
+    """
+    while True:
+        try:
+            async with get_redis().pubsub() as pubsub:
+                await pubsub.subscribe(INVALIDATED_ACCESS_TOKENS_CHANNEL)
+                # Invalidations published before subscribing were not received
+                access_token_cache.clear()
+
+                while True:
+                    message = await pubsub.get_message(
+                        ignore_subscribe_messages=True, timeout=30.0
+                    )
+                    if message is not None:
+                        access_token_cache.invalidate(message["data"])
+        except RedisError as error:
+            logger.logger.error(f"Access token invalidation listener failed: {error}")
+            access_token_cache.clear()
+            await asyncio.sleep(1)
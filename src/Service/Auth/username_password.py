@@ -3,6 +3,7 @@ import src.Service.Auth.Models as AuthModels
 import src.Model.UserAccount as UserModel
 import src.SQL as SQL
 from .jwt import generate_access_token
+from .password_hashing import verify_password
 from .helpers import get_user_account
 from src.SQL.Enum.AccountStatus import ENABLED
 
@@ -18,7 +19,7 @@ async def user_login(
 
     user = await get_user_account(sql_session, username=login_form.username)
 
-    if user is None or user.password != login_form.password:
+    if user is None or not await verify_password(login_form.password, user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="User is unauthorized"
         )
@@ -28,4 +29,4 @@ async def user_login(
             status_code=status.HTTP_403_FORBIDDEN, detail="User login is locked. Please contact administrator"
         )
 
-    return generate_access_token(user)
+    return await generate_access_token(user)
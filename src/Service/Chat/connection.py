@@ -0,0 +1,54 @@
+import asyncio
+from fastapi import WebSocket, logger
+from starlette.websockets import WebSocketState
+import src.config as config
+
+# Close code for clients which do not keep up with their messages, they may reconnect and fetch the history
+SLOW_CONSUMER_CLOSE_CODE = 1013
+
+
+class ChatConnection:
+    """
+    Websocket of a chat participant with a bounded queue of outgoing messages.
+    Messages are sent by a writer task of the connection, so a slow client never blocks the others.
+    """
+
+    def __init__(self, user_id: int, websocket: WebSocket, max_queued: int = config.CHAT_SEND_QUEUE_SIZE):
+        self.user_id = user_id
+        self.websocket = websocket
+        self.__queue: asyncio.Queue[str] = asyncio.Queue(maxsize=max_queued)
+        self.__writer: asyncio.Task | None = None
+
+    def start(self) -> None:
+        self.__writer = asyncio.create_task(self.__write())
+
+    def stop(self) -> None:
+        if self.__writer is not None:
+            self.__writer.cancel()
+
+    def send(self, message: str) -> bool:
+        """Queue the message without waiting, False if the queue of the connection is full"""
+        try:
+            self.__queue.put_nowait(message)
+            return True
+        except asyncio.QueueFull:
+            return False
+
+    async def close(self, code: int = SLOW_CONSUMER_CLOSE_CODE) -> None:
+        self.stop()
+        if self.websocket.application_state == WebSocketState.DISCONNECTED:
+            return
+        try:
+            await asyncio.wait_for(self.websocket.close(code), config.CHAT_CLOSE_TIMEOUT)
+        except Exception as error:
+            logger.logger.warning(f"Closing chat websocket of user {self.user_id} failed: {error}")
+
+    async def __write(self) -> None:
+        while True:
+            message = await self.__queue.get()
+            try:
+                await self.websocket.send_text(message)
+            except Exception as error:
+                # The receive loop of the endpoint notices the disconnect and cleans up
+                logger.logger.warning(f"Chat message delivery to user {self.user_id} failed: {error}")
+                return
@@ -0,0 +1,50 @@
+import src.config as config
+import src.repository.chat_repository as chat_repository
+from src.Model.Chat import Conversation
+from src.Service.Cache import TTLCache
+
+# Participants by conversation id, checked for every chat message and request.
+# Participants of a conversation are set when it is created and never change, so entries are never stale.
+conversation_participants_cache: TTLCache[str, frozenset[int]] = TTLCache(
+    max_size=config.CHAT_MEMBERSHIP_CACHE_SIZE,
+    ttl=config.CHAT_MEMBERSHIP_CACHE_TTL,
+)
+
+
+def remember_conversation(conversation: Conversation) -> frozenset[int]:
+    participants = frozenset(conversation.participants)
+    conversation_participants_cache.set(conversation.id, participants)
+    return participants
+
+
+async def get_participants(conversation_id: str) -> frozenset[int] | None:
+    """Participants of the conversation, None if it does not exist"""
+    if (participants := conversation_participants_cache.get(conversation_id)) is not None:
+        return participants
+
+    conversation = await chat_repository.get_conversation(conversation_id)
+    if conversation is None:
+        return None
+    return remember_conversation(conversation)
+
+
+async def get_participants_of(conversation_ids: set[str]) -> dict[str, frozenset[int]]:
+    """Participants of the existing conversations, the ones missing in the cache are read in a single query"""
+    participants_of = {}
+    missing_ids = []
+    for conversation_id in conversation_ids:
+        if (participants := conversation_participants_cache.get(conversation_id)) is not None:
+            participants_of[conversation_id] = participants
+        else:
+            missing_ids.append(conversation_id)
+
+    if missing_ids:
+        for conversation in await chat_repository.get_conversations(missing_ids):
+            participants_of[conversation.id] = remember_conversation(conversation)
+    return participants_of
+
+
+async def is_participant(conversation_id: str, user_id: int) -> bool:
+    participants = await get_participants(conversation_id)
+    return participants is not None and user_id in participants
+
@@ -0,0 +1,137 @@
+import asyncio
+import uuid
+from fastapi import WebSocket, logger
+from redis.asyncio.client import PubSub
+from redis.exceptions import RedisError
+from src.NoSQL.redis_connection import get_redis
+from .connection import ChatConnection
+
+CHAT_USER_CHANNEL = "chat:user:{user_id}"
+# Subscribed by a single worker only, so the listener has a subscription before any user connects
+CHAT_WORKER_CHANNEL = "chat:worker:{worker_id}"
+
+
+class ChatMessageBus:
+    """
+    Delivers chat messages to participants connected to any worker.
+    Every worker subscribes to Redis channels of the users connected to it
+    and senders publish messages to the channels of recipients.
+    The listener only queues messages on the connections, they are sent by their own writer tasks.
+    """
+
+    def __init__(self):
+        self.connections: dict[int, ChatConnection] = {}
+        # Strong references, so the tasks dropping connections are not garbage collected while running
+        self.__drop_tasks: set[asyncio.Task] = set()
+        self.__pubsub: PubSub | None = None
+        self.__worker_channel = CHAT_WORKER_CHANNEL.format(worker_id=uuid.uuid4().hex)
+        # Set while the listener is subscribed, users connecting meanwhile are subscribed right away
+        self.ready = asyncio.Event()
+
+        self.published = 0
+        self.delivered = 0
+        self.dropped_connections = 0
+
+    @staticmethod
+    def get_user_channel(user_id: int) -> str:
+        return CHAT_USER_CHANNEL.format(user_id=user_id)
+
+    async def connect(self, user_id: int, websocket: WebSocket) -> ChatConnection:
+        connection = ChatConnection(user_id, websocket)
+        connection.start()
+        # The latest connection of the user replaces the previous one
+        if (previous := self.connections.get(user_id)) is not None:
+            previous.stop()
+        self.connections[user_id] = connection
+        if self.__pubsub is not None:
+            try:
+                await self.__pubsub.subscribe(self.get_user_channel(user_id))
+            except RedisError as error:
+                # The listener subscribes all connected users again after it reconnects
+                logger.logger.error(f"Chat subscription of user {user_id} failed: {error}")
+        return connection
+
+    async def disconnect(self, connection: ChatConnection) -> None:
+        connection.stop()
+        user_id = connection.user_id
+        if self.connections.get(user_id) is not connection:
+            return
+        del self.connections[user_id]
+        await self.__unsubscribe(user_id)
+
+    async def __unsubscribe(self, user_id: int) -> None:
+        if self.__pubsub is not None:
+            try:
+                await self.__pubsub.unsubscribe(self.get_user_channel(user_id))
+            except RedisError as error:
+                logger.logger.error(f"Chat unsubscription of user {user_id} failed: {error}")
+
+    async def publish(self, recipient_ids: list[int], message: str) -> None:
+        """Send the message to the recipients, wherever they are connected"""
+        if not recipient_ids:
+            return
+        async with get_redis().pipeline(transaction=False) as pipeline:
+            for recipient_id in recipient_ids:
+                pipeline.publish(self.get_user_channel(recipient_id), message)
+            await pipeline.execute()
+        self.published += len(recipient_ids)
+
+    def deliver(self, channel: str, message: str) -> None:
+        user_id = int(channel.rsplit(":", 1)[1])
+        if (connection := self.connections.get(user_id)) is None:
+            return
+        if connection.send(message):
+            self.delivered += 1
+            return
+
+        logger.logger.warning(f"Chat messages of user {user_id} are not being read, disconnecting")
+        self.dropped_connections += 1
+        # Removed right away, so the following messages are not queued on the dropped connection
+        del self.connections[user_id]
+        task = asyncio.create_task(self.__drop(connection))
+        self.__drop_tasks.add(task)
+        task.add_done_callback(self.__drop_tasks.discard)
+
+    async def __drop(self, connection: ChatConnection) -> None:
+        await connection.close()
+        if connection.user_id not in self.connections:
+            await self.__unsubscribe(connection.user_id)
+
+    async def listen(self) -> None:
+        """
+        Deliver messages published for users connected to this worker.
+        Runs in the background for the whole lifetime of the application.
+        """
+        while True:
+            try:
+                async with get_redis().pubsub() as pubsub:
+                    await pubsub.subscribe(
+                        self.__worker_channel,
+                        *(self.get_user_channel(user_id) for user_id in self.connections),
+                    )
+                    self.__pubsub = pubsub
+                    self.ready.set()
+
+                    while True:
+                        message = await pubsub.get_message(
+                            ignore_subscribe_messages=True, timeout=30.0
+                        )
+                        if message is not None:
+                            self.deliver(message["channel"], message["data"])
+            except RedisError as error:
+                logger.logger.error(f"Chat message listener failed: {error}")
+                await asyncio.sleep(1)
+            finally:
+                self.__pubsub = None
+                self.ready.clear()
+
+    def stats(self) -> dict:
+        return {
+            "connected_users": len(self.connections),
+            "published": self.published,
+            "delivered": self.delivered,
+            "dropped_connections": self.dropped_connections,
+        }
+
+
+chat_message_bus = ChatMessageBus()
@@ -1,4 +1,3 @@
-import asyncio
 from typing import Optional, Sequence
 
 import src.SQL as SQL
@@ -6,8 +5,6 @@ from src.SQL.Tables import ClassGroup, People, ParentGroupRole
 from src.SQL.Tables.Collection import Collection
 from src.SQL.Enum import CollectionStatus
 
-import src.repository.class_group_repository as class_group_repository
-
 
 class_view_response_model = {
     "class_group": ClassGroup,
@@ -22,107 +19,69 @@ class_view_response_model = {
     "collections": Sequence[Collection],
 }
 
-async def get_children_in_class(session: SQL.AsyncSession, class_id: int) -> Optional[Sequence[People.Child]]:
-    """Get children assigned to a class with given id"""
+def children_in_class_query(class_id: int):
+    """Children assigned to a class with given id"""
 
-    query = SQL.select(
-        People.Child).join(
-        ClassGroup, People.Child.group_id == ClassGroup.id).filter(
-        ClassGroup.id == class_id).order_by(
-        People.Child.surname)
-
-    children_list = await session.exec(query)
-    children_result = children_list.all()
-    await session.close()
-    if children_result is None:
-        return None
-    return children_result
+    return SQL.select(People.Child).filter(People.Child.group_id == class_id)
 
-async def get_parents_in_class(session: SQL.AsyncSession, class_id: int) -> Optional[Sequence[dict]]:
-    """Get parents whose children are assigned to a class with given id"""
+def parents_in_class_query(class_id: int):
+    """Parents who are members of a class with given id"""
 
-    query = SQL.select(
+    return SQL.select(
         People.Parent.id, People.Parent.name, People.Parent.surname, ParentGroupRole.role, People.Parent.account_id).join(
-        ParentGroupRole, People.Parent.id == ParentGroupRole.parent_id).join(
-        ClassGroup, ParentGroupRole.class_group_id == ClassGroup.id).filter(
-        ClassGroup.id == class_id).order_by(People.Parent.surname)
-
-    parents_list = await session.exec(query)
-    parents_result = parents_list.all()
-    formatted_parents = [
-        {
-            "id": parent[0],
-            "name": parent[1],
-            "surname": parent[2],
-            "role": parent[3],
-            "account_id": parent[4]
-        }
-        for parent in parents_result
-    ]
-    await session.close()
-    if not formatted_parents:
-        return []
-
-    return formatted_parents
-
-async def get_collections_in_class(session: SQL.AsyncSession, class_id: int, status: CollectionStatus) -> Optional[Sequence[Collection]]:
-    """Get collection which belongs to a class with given id and has specified status"""
-
-    query = SQL.select(Collection).join(
-        ClassGroup, ClassGroup.id == Collection.class_group_id).filter(
-        ClassGroup.id == class_id, Collection.status == status
-    )
+        ParentGroupRole, People.Parent.id == ParentGroupRole.parent_id).filter(
+        ParentGroupRole.class_group_id == class_id)
 
-    collections_list = await session.exec(query)
-    collections_result = collections_list.all()
-    await session.close()
-    if collections_result is None:
-        return None
+def collections_in_class_query(class_id: int, status: CollectionStatus):
+    """Collections which belong to a class with given id and have specified status"""
 
-    return collections_result
+    return SQL.select(Collection).filter(
+        Collection.class_group_id == class_id, Collection.status == status
+    )
 
-async def get_requester_information(session: SQL.AsyncSession, class_id: int, user_id:int) -> Optional[dict] :
-    """Get information about a requester"""
+def requester_information_query(class_id: int, user_id: int):
+    """Requester's parent profile and role in a class with given id"""
 
-    query = SQL.select(
-        People.Parent.id,
+    return SQL.select(
+        People.Parent.id.label("parent_id"),
         People.Parent.name,
         People.Parent.surname,
-        ParentGroupRole.role
+        ParentGroupRole.role.label("group_role"),
     ).join(
         ParentGroupRole, People.Parent.id == ParentGroupRole.parent_id
-    ).join(
-        People.UserAccount, People.Parent.account_id == People.UserAccount.id
-    ).filter(ParentGroupRole.class_group_id == class_id, People.UserAccount.id == user_id)
+    ).filter(ParentGroupRole.class_group_id == class_id, People.Parent.account_id == user_id)
+
+
+async def get_class_with_requester(session: SQL.AsyncSession, class_id: int, user_id: int) -> Optional[tuple[ClassGroup, Optional[dict]]]:
+    """
+    Get class group with information about a requester in one round trip.
+    Requester is None if the user is not a member of the class.
+    """
+
+    query = SQL.select(
+        ClassGroup,
+        SQL.json_object(requester_information_query(class_id, user_id)).label("requester"),
+    ).filter(ClassGroup.id == class_id)
 
-    requester_data = await session.exec(query)
-    requester_record = requester_data.first()
-    await session.close()
-    if requester_record is None:
+    if (result := (await session.exec(query)).first()) is None:
         return None
-    return {
-        'parent_id': requester_record[0],
-        'name': requester_record[1],
-        'surname': requester_record[2],
-        'group_role': requester_record[3],
-    }
+    return result.ClassGroup, result.requester
 
 
-async def collect_class_view_data(class_id: int, status: CollectionStatus, user_id: int) -> dict:
-    """Collect data for class view by running all queries concurrently"""
+async def collect_class_view_data(session: SQL.AsyncSession, class_group: ClassGroup, status: CollectionStatus, requester: Optional[dict]) -> dict:
+    """Collect lists for class view in one round trip, they are aggregated to JSON by the database"""
 
-    children, parents, collections, class_group, requester = await asyncio.gather(
-        get_children_in_class(await SQL.get_async_session(), class_id),
-        get_parents_in_class(await SQL.get_async_session(), class_id),
-        get_collections_in_class(await SQL.get_async_session(), class_id, status),
-        class_group_repository.get_by_id(await SQL.get_async_session(), class_id),
-        get_requester_information(await SQL.get_async_session(), class_id, user_id)
+    query = SQL.select(
+        SQL.json_list(children_in_class_query(class_group.id), order_by=("surname",)).label("children"),
+        SQL.json_list(parents_in_class_query(class_group.id), order_by=("surname",)).label("parents"),
+        SQL.json_list(collections_in_class_query(class_group.id, status)).label("collections"),
     )
+    view = (await session.exec(query)).one()
 
     return {
-        "class": class_group.model_dump() if class_group else None,
-        "children": [child.model_dump() for child in children],
-        "parents": parents,
-        "collections": [collection.model_dump() for collection in collections],
+        "class": class_group.model_dump(),
+        "children": [People.Child.model_validate(child).model_dump() for child in view.children],
+        "parents": view.parents,
+        "collections": [Collection.model_validate(collection).model_dump() for collection in view.collections],
         'requester': requester
     }
@@ -1,5 +1,6 @@
-from src.Model.CollectionModel import CreateCollection, UpdateCollection
-from src.repository import collection_repository
+from sqlmodel import and_
+from src.Model.CollectionModel import CreateCollection, UpdateCollection, ChildPaymentResult
+from src.repository import collection_repository, bank_account_repository
 import src.SQL as SQL
 from src.Service import Auth
 import src.SQL.Enum.ParentRole as ParentRole
@@ -7,7 +8,7 @@ from src.SQL.Enum.Privilege import ADMIN_USER
 
 from fastapi import HTTPException, status
 from src.SQL.Tables import Collection
-from src.SQL.Enum import CollectionStatus
+from src.SQL.Enum import CollectionStatus, CollectionOperationType
 from src.Service.IBAN_generator import iban_db_service
 from src.repository import (
     class_group_repository,
@@ -104,3 +105,194 @@ async def delete(sql_session: SQL.AsyncSession, collection_id: int):
         )
 
     await collection_repository.delete(sql_session, collection_id)
+
+
+def refused_payment(child_id: int, operation_type: int) -> ChildPaymentResult:
+    """Result of a child who already has an operation in the collection"""
+    return ChildPaymentResult(
+        child_id=child_id,
+        paid=False,
+        detail=(
+            "Already paid"
+            if operation_type == CollectionOperationType.PAY
+            else "Child is excluded from the collection"
+        ),
+    )
+
+
+async def pay_for_children(
+    sql_session: SQL.AsyncSession,
+    user: Auth.AuthorizedUser,
+    collection_id: int,
+    child_ids: list[int],
+) -> list[ChildPaymentResult]:
+    """
+    Pay for participation of the given children in the collection.
+    Funds are checked once for all of them and every payment is committed in one transaction.
+    Children who cannot be paid for are skipped and the reason is given in their result.
+    """
+    payer = (
+        await sql_session.exec(
+            SQL.select(SQL.Tables.Parent, SQL.Tables.BankAccount)
+            .join(
+                SQL.Tables.BankAccount,
+                SQL.Tables.BankAccount.id == SQL.Tables.Parent.bank_account_id,
+            )
+            .where(SQL.Tables.Parent.account_id == user.user_id)
+        )
+    ).first()
+    if not payer:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Bank account not found"
+        )
+    parent, bank_account = payer
+
+    collection = await collection_repository.get_by_id(sql_session, collection_id)
+    if not collection:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND, detail="Collection not found"
+        )
+
+    if collection.status != CollectionStatus.OPEN:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cannot pay for a collection with a status other than OPEN",
+        )
+
+    # Duplicated ids are paid for once
+    child_ids = list(dict.fromkeys(child_ids))
+    children = {
+        child.id: (child, operation_type)
+        for child, operation_type in (
+            await sql_session.exec(
+                SQL.select(
+                    SQL.Tables.Child, SQL.Tables.CollectionOperation.operation_type
+                )
+                .outerjoin(
+                    SQL.Tables.CollectionOperation,
+                    and_(
+                        SQL.Tables.CollectionOperation.child_id == SQL.Tables.Child.id,
+                        SQL.Tables.CollectionOperation.collection_id == collection_id,
+                    ),
+                )
+                .where(SQL.Tables.Child.id.in_(child_ids))
+            )
+        ).all()
+    }
+
+    results: dict[int, ChildPaymentResult] = {}
+    # Primitive values only, ORM instances expire when a retried transaction is rolled back
+    children_to_pay: list[tuple[int, str, str]] = []
+    for child_id in child_ids:
+        if child_id not in children:
+            results[child_id] = ChildPaymentResult(
+                child_id=child_id, paid=False, detail="Child not found"
+            )
+            continue
+
+        child, operation_type = children[child_id]
+        if child.group_id != collection.class_group_id:
+            results[child_id] = ChildPaymentResult(
+                child_id=child_id,
+                paid=False,
+                detail="Child does not belong to the class of the collection",
+            )
+        elif operation_type is not None:
+            results[child_id] = refused_payment(child_id, operation_type)
+        else:
+            children_to_pay.append((child.id, child.name, child.surname))
+
+    payer_account_id = bank_account.id
+    collection_account_id = collection.bank_account_id
+    collection_name = collection.name
+    price = collection.price
+    parent_id = parent.id
+
+    async def pay() -> list[tuple[int, SQL.Tables.BankAccountOperation]]:
+        # Status and payments are checked again under the collection lock,
+        # they might have changed since they were read above
+        if await collection_repository.lock(sql_session, collection_id) != CollectionStatus.OPEN:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot pay for a collection with a status other than OPEN",
+            )
+        operation_types = dict(
+            (
+                await sql_session.exec(
+                    SQL.select(
+                        SQL.Tables.CollectionOperation.child_id,
+                        SQL.Tables.CollectionOperation.operation_type,
+                    ).where(
+                        SQL.Tables.CollectionOperation.collection_id == collection_id,
+                        SQL.Tables.CollectionOperation.child_id.in_(
+                            [child_id for child_id, _, _ in children_to_pay]
+                        ),
+                    )
+                )
+            ).all()
+        )
+        payable_children = []
+        for child_id, name, surname in children_to_pay:
+            if (operation_type := operation_types.get(child_id)) is None:
+                payable_children.append((child_id, name, surname))
+                continue
+            results[child_id] = refused_payment(child_id, operation_type)
+
+        available_balance = (
+            await bank_account_repository.lock_balances(
+                sql_session, [payer_account_id, collection_account_id]
+            )
+        )[payer_account_id]
+
+        if price * len(payable_children) > available_balance:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient funds",
+            )
+
+        payments = [
+            SQL.Tables.BankAccountOperation(
+                amount=price,
+                title=f"Collection Payment - {collection_name}",
+                description=f"Payment for child {name} {surname}",
+                source_account_id=payer_account_id,
+                destination_account_id=collection_account_id,
+            )
+            for _, name, surname in payable_children
+        ]
+        await bank_account_repository.insert_operations(sql_session, payments)
+        await collection_repository.insert_operations(
+            sql_session,
+            [
+                SQL.Tables.CollectionOperation(
+                    child_id=child_id,
+                    collection_id=collection_id,
+                    operation_type=CollectionOperationType.PAY,
+                    requester_id=parent_id,
+                    payment_id=payment.operation_id,
+                )
+                for (child_id, _, _), payment in zip(payable_children, payments)
+            ],
+        )
+        await sql_session.commit()
+        return [
+            (child_id, payment)
+            for (child_id, _, _), payment in zip(payable_children, payments)
+        ]
+
+    try:
+        payments = await SQL.run_with_retry(sql_session, pay)
+    except HTTPException:
+        raise
+    except Exception:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Failed to pay for children",
+        )
+
+    for child_id, payment in payments:
+        results[child_id] = ChildPaymentResult(
+            child_id=child_id, paid=True, payment_id=payment.operation_id
+        )
+
+    return [results[child_id] for child_id in child_ids]
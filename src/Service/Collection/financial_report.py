@@ -0,0 +1,88 @@
+from datetime import date
+import src.config as config
+import src.SQL as SQL
+from src.SQL.Enum.CollectionOperationType import PAY, DISCHARGE, REFUND
+from src.SQL.Tables import Collection
+from src.Service.Cache import TTLCache
+from src.repository import collection_repository
+
+# Keyed by all fields of the collection and its report_version, so any change of the data results in a new key
+financial_report_cache = TTLCache(
+    max_size=config.FINANCIAL_REPORT_CACHE_SIZE,
+    ttl=config.FINANCIAL_REPORT_CACHE_TTL,
+)
+
+
+async def build_collection_financial_report(
+    session: SQL.AsyncSession, collection: Collection
+) -> dict:
+    children_data = await collection_repository.get_children_payment_status(
+        session, collection.id
+    )
+
+    paid_children = []
+    unpaid_children = []
+    for child in children_data:
+        # Skip unsubscribed and refunded children
+        if child.operation_type in (DISCHARGE, REFUND):
+            continue
+
+        child_info = {
+            "child_id": child.child_id,
+            "child_name": child.child_name,
+            "child_surname": child.child_surname,
+        }
+
+        if child.operation_type == PAY:
+            paid_children.append(child_info)
+        else:
+            unpaid_children.append(child_info)
+
+    # Totals are the same in every row
+    if children_data:
+        active_children_count = (
+            children_data[0].children_count - children_data[0].excluded_count
+        )
+    else:
+        active_children_count = 0
+    total_expected = collection.price * active_children_count
+    total_collected = collection.price * len(paid_children)
+
+    return {
+        "collection_info": {
+            "id": collection.id,
+            "name": collection.name,
+            "description": collection.description,
+            "start_date": collection.start_date.isoformat(),
+            "end_date": (
+                collection.end_date.isoformat() if collection.end_date else None
+            ),
+            "price_per_child": collection.price,
+            "status": collection.status,
+        },
+        "financial_summary": {
+            "total_children": active_children_count,
+            "paid_children_count": len(paid_children),
+            "unpaid_children_count": len(unpaid_children),
+            "total_expected": total_expected,
+            "total_collected": total_collected,
+            "outstanding_amount": total_expected - total_collected,
+            "withdrawn_money": collection.withdrawn_money,
+            "available_balance": max(total_collected - collection.withdrawn_money, 0),
+        },
+        "paid_children": paid_children,
+        "unpaid_children": unpaid_children,
+    }
+
+
+async def get_collection_financial_report(
+    session: SQL.AsyncSession, collection: Collection
+) -> dict:
+    """Financial report of the collection, built again only if the collection or its report_version changed"""
+    # report_version is excluded from dumps of the collection
+    cache_key = (collection.id, collection.report_version, tuple(collection.model_dump().values()))
+    if (report := financial_report_cache.get(cache_key)) is None:
+        report = await build_collection_financial_report(session, collection)
+        financial_report_cache.set(cache_key, report)
+
+    return {**report, "generated_date": date.today().isoformat()}
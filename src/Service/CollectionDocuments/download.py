@@ -0,0 +1,148 @@
+import hashlib
+import urllib.parse
+from fastapi import HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
+from src.BlobStore import BlobNotFound, blob_store
+from src.SQL.Tables.Collection import CollectionDocuments
+from .preview import PREVIEW_MEDIA_TYPE
+
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "jpg": "image/jpeg",
+    "jpeg": "image/jpeg",
+    "png": "image/png",
+    "gif": "image/gif",
+    "doc": "application/msword",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
+    "xls": "application/vnd.ms-excel",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+# Content under a document URL changes when the document is updated, so browsers revalidate it with the ETag.
+# Content under a URL with its hash never changes.
+REVALIDATED_CACHE_CONTROL = "private, no-cache"
+IMMUTABLE_CACHE_CONTROL = "private, max-age=31536000, immutable"
+
+
+def etag(content_hash: str) -> str:
+    return f'"{content_hash}"'
+
+
+def download_filename(document: CollectionDocuments) -> str:
+    return f"{document.document_name}.{document.file_type}"
+
+
+def document_etag(document: CollectionDocuments) -> str:
+    """
+    ETag of the content together with the filename sent in Content-Disposition, so a renamed document is fetched again.
+    Names may contain any characters, so the document id and filename are included as a digest.
+    """
+    filename_digest = hashlib.sha256(
+        f"{document.document_id}/{download_filename(document)}".encode()
+    ).hexdigest()[:16]
+    return f'"{document.content_hash}-{filename_digest}"'
+
+
+def matches_etag(header: str | None, expected_etag: str) -> bool:
+    """Whether the If-None-Match header matches the ETag, weak comparison as for GET"""
+    if header is None:
+        return False
+    return any(
+        candidate.strip() in ("*", expected_etag, f"W/{expected_etag}")
+        for candidate in header.split(",")
+    )
+
+
+def parse_range(header: str | None, size: int) -> tuple[int, int] | None:
+    """
+    Byte range (start, end exclusive) requested by the Range header.
+    None means the whole content, also for headers which are not supported, e.g. multiple ranges.
+    """
+    if header is None:
+        return None
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+
+    first, _, last = ranges.strip().partition("-")
+    if not (first or last) or any(value and not value.isdigit() for value in (first, last)):
+        return None
+    if first:
+        start = int(first)
+        end = int(last) + 1 if last else size
+        if end <= start:
+            return None
+    else:
+        # Suffix range, the last N bytes
+        start = max(size - int(last), 0)
+        end = size
+
+    if start >= size or end <= start:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            headers={"Content-Range": f"bytes */{size}"},
+        )
+    return start, min(end, size)
+
+
+async def content_response(
+    request: Request, document: CollectionDocuments, cache_control: str
+) -> Response:
+    """
+    Content of the document streamed from the blob store.
+    Answers If-None-Match with 304 and a single Range with 206, without reading the content.
+    """
+    content_etag = document_etag(document)
+    headers = {
+        "ETag": content_etag,
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if matches_etag(request.headers.get("if-none-match"), content_etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if not await blob_store.exists(document.content_hash):
+        raise BlobNotFound(document.content_hash)
+
+    encoded_filename = urllib.parse.quote(download_filename(document))
+    headers["Content-Disposition"] = f"attachment; filename*=UTF-8''{encoded_filename}"
+    media_type = MIME_TYPES.get(document.file_type.lower(), "application/octet-stream")
+
+    # A range is only valid for the content it was taken from
+    if_range = request.headers.get("if-range")
+    byte_range = (
+        parse_range(request.headers.get("range"), document.file_size)
+        if if_range is None or if_range == content_etag
+        else None
+    )
+    if byte_range is None:
+        headers["Content-Length"] = str(document.file_size)
+        return StreamingResponse(
+            blob_store.stream(document.content_hash),
+            media_type=media_type,
+            headers=headers,
+        )
+
+    start, end = byte_range
+    headers["Content-Range"] = f"bytes {start}-{end - 1}/{document.file_size}"
+    headers["Content-Length"] = str(end - start)
+    return StreamingResponse(
+        blob_store.stream(document.content_hash, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers=headers,
+    )
+
+
+async def preview_response(request: Request, preview_hash: str, cache_control: str) -> Response:
+    """Preview of a document streamed from the blob store, answers If-None-Match with 304"""
+    preview_etag = etag(preview_hash)
+    headers = {"ETag": preview_etag, "Cache-Control": cache_control}
+    if matches_etag(request.headers.get("if-none-match"), preview_etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return Response(
+        content=await blob_store.get(preview_hash),
+        media_type=PREVIEW_MEDIA_TYPE,
+        headers=headers,
+    )
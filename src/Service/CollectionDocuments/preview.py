@@ -0,0 +1,105 @@
+import asyncio
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from fastapi import logger
+from sqlmodel import select, update
+import src.config as config
+from src.BlobStore import blob_store
+from src.SQL import session_scope
+from src.SQL.Tables.Collection import CollectionDocuments
+from .preview_rendering import PREVIEWABLE_FILE_TYPES, render_preview
+
+PREVIEW_MEDIA_TYPE = "image/jpeg"
+
+_executor: ProcessPoolExecutor | None = None
+
+
+def get_executor() -> ProcessPoolExecutor:
+    """
+    Process pool rendering previews, so decoding of large images does not hold the GIL of the request worker.
+    Created on first use. Workers are spawned instead of forked, so they do not inherit connections and threads
+    of the application. Each of them still imports the module of the rendering function and the main module
+    when it starts, which is why the pool is kept for the lifetime of the application.
+    """
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=config.PREVIEW_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(cancel_futures=True)
+        _executor = None
+
+
+async def generate_preview(document_id: int) -> None:
+    """
+    Render the preview of the document and store it in the blob store next to its content.
+    Failures are only logged, documents without a preview are served in full.
+    """
+    async with session_scope() as session:
+        document = (
+            await session.exec(
+                select(CollectionDocuments).where(
+                    CollectionDocuments.document_id == document_id
+                )
+            )
+        ).first()
+
+    if document is None or document.file_type.lower() not in PREVIEWABLE_FILE_TYPES:
+        return
+
+    # Workers open the file themselves, so the content is neither read into the request worker nor pickled
+    if (path := blob_store.local_path(document.content_hash)) is None:
+        return
+
+    try:
+        preview = await asyncio.get_running_loop().run_in_executor(
+            get_executor(),
+            render_preview,
+            str(path),
+            document.file_type.lower(),
+            config.PREVIEW_SIZE,
+        )
+        preview_hash = await blob_store.put(preview)
+    except Exception as error:
+        logger.logger.warning(
+            f"Could not render preview of document {document_id}: {error!r}"
+        )
+        return
+
+    async with session_scope() as session:
+        # Content may have been replaced while the preview was rendered
+        await session.exec(
+            update(CollectionDocuments)
+            .where(
+                CollectionDocuments.document_id == document_id,
+                CollectionDocuments.content_hash == document.content_hash,
+            )
+            .values(preview_hash=preview_hash)
+        )
+
+
+async def generate_missing_previews() -> None:
+    """Render previews of documents uploaded before previews existed or whose rendering failed"""
+    async with session_scope() as session:
+        document_ids = (
+            await session.exec(
+                select(CollectionDocuments.document_id).where(
+                    CollectionDocuments.preview_hash.is_(None)
+                )
+            )
+        ).all()
+
+    for document_id in document_ids:
+        await generate_preview(document_id)
+    shutdown_executor()
+
+
+if __name__ == "__main__":
+    asyncio.run(generate_missing_previews())
@@ -0,0 +1,36 @@
+"""
+Rendering of document previews. It runs in worker processes which import this module when they start,
+so it imports only what rendering needs.
+Requires the `previews` extra: Pillow and PyMuPDF.
+"""
+
+import io
+
+IMAGE_FILE_TYPES = {"jpg", "jpeg", "png", "gif"}
+PREVIEWABLE_FILE_TYPES = IMAGE_FILE_TYPES | {"pdf"}
+
+
+def render_preview(path: str, file_type: str, size: int) -> bytes:
+    """
+    JPEG whose longer side is at most `size` pixels, of an image or the first page of a PDF.
+    The document is opened from its file, only the parts needed for the preview are read.
+    """
+    from PIL import Image
+
+    if file_type == "pdf":
+        import fitz
+
+        with fitz.open(path, filetype="pdf") as pdf:
+            page = pdf[0]
+            zoom = size / max(page.rect.width, page.rect.height)
+            pixmap = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+            image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    else:
+        image = Image.open(path)
+        # JPEGs are decoded directly at a reduced scale
+        image.draft("RGB", (size, size))
+        image.thumbnail((size, size))
+
+    preview = io.BytesIO()
+    image.convert("RGB").save(preview, format="JPEG", quality=80, optimize=True)
+    return preview.getvalue()
@@ -0,0 +1,168 @@
+from pathlib import PurePath
+from typing import AsyncIterator, NamedTuple
+from fastapi import HTTPException, Request, status
+from python_multipart.exceptions import MultipartParseError
+from python_multipart.multipart import MultipartParser, parse_options_header
+import src.config as config
+from src.BlobStore import blob_store
+
+# Leading bytes of the supported file types and the extensions they can have
+FILE_SIGNATURES: list[tuple[bytes, list[str]]] = [
+    (b"%PDF-", ["pdf"]),
+    (b"\x89PNG\r\n\x1a\n", ["png"]),
+    (b"\xff\xd8\xff", ["jpg", "jpeg"]),
+    (b"GIF87a", ["gif"]),
+    (b"GIF89a", ["gif"]),
+    (b"PK\x03\x04", ["docx", "xlsx"]),
+    (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1", ["doc", "xls"]),
+]
+SIGNATURE_SIZE = max(len(signature) for signature, _ in FILE_SIGNATURES)
+
+
+class MultipartPart(NamedTuple):
+    name: str
+    filename: str | None
+
+
+class UploadedDocument(NamedTuple):
+    filename: str
+    file_type: str
+    content_hash: str
+    file_size: int
+
+
+def sniff_file_type(head: bytes, filename: str) -> str | None:
+    """Extension of the file judged by its content, the one from the filename is preferred if it matches"""
+    extension = PurePath(filename).suffix.lstrip(".").lower()
+    for signature, extensions in FILE_SIGNATURES:
+        if head.startswith(signature):
+            return extension if extension in extensions else extensions[0]
+    return None
+
+
+async def read_multipart(request: Request) -> AsyncIterator[tuple[MultipartPart, bytes]]:
+    """
+    Parts of a multipart/form-data body with their data, as the body arrives.
+    Data of a part may be split into many chunks, only the chunks of a single read are held in memory.
+    """
+    _, options = parse_options_header(request.headers.get("content-type", ""))
+    if b"boundary" not in options:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Expected a multipart/form-data body",
+        )
+
+    received: list[tuple[MultipartPart, bytes]] = []
+    headers: dict[bytes, bytes] = {}
+    header_field = bytearray()
+    header_value = bytearray()
+    part: MultipartPart | None = None
+
+    def on_part_begin() -> None:
+        headers.clear()
+
+    def on_header_field(data: bytes, start: int, end: int) -> None:
+        header_field.extend(data[start:end])
+
+    def on_header_value(data: bytes, start: int, end: int) -> None:
+        header_value.extend(data[start:end])
+
+    def on_header_end() -> None:
+        headers[bytes(header_field).lower()] = bytes(header_value)
+        header_field.clear()
+        header_value.clear()
+
+    def on_headers_finished() -> None:
+        nonlocal part
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        filename = disposition.get(b"filename")
+        part = MultipartPart(
+            name=disposition.get(b"name", b"").decode(),
+            filename=filename.decode() if filename is not None else None,
+        )
+        received.append((part, b""))
+
+    def on_part_data(data: bytes, start: int, end: int) -> None:
+        received.append((part, data[start:end]))
+
+    parser = MultipartParser(
+        options[b"boundary"],
+        {
+            "on_part_begin": on_part_begin,
+            "on_header_field": on_header_field,
+            "on_header_value": on_header_value,
+            "on_header_end": on_header_end,
+            "on_headers_finished": on_headers_finished,
+            "on_part_data": on_part_data,
+        },
+    )
+    try:
+        async for chunk in request.stream():
+            parser.write(chunk)
+            for item in received:
+                yield item
+            received.clear()
+        parser.finalize()
+    except MultipartParseError:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Malformed multipart body",
+        )
+
+
+async def receive_document(
+    request: Request, max_size: int = config.DOCUMENT_MAX_SIZE
+) -> UploadedDocument:
+    """
+    Stream the `file` part of the request into the blob store, hashing it on the way.
+    The type of the file is checked on its first bytes, so unsupported files are rejected before they are stored.
+    Raises BlobTooLarge if the file is larger than max_size.
+    """
+    file_part: MultipartPart | None = None
+    head = bytearray()
+    file_type: str | None = None
+
+    async def file_chunks() -> AsyncIterator[bytes]:
+        nonlocal file_part, file_type
+        async for part, data in read_multipart(request):
+            if part.name != "file" or part.filename is None:
+                continue
+            if file_part is None:
+                file_part = part
+            elif part is not file_part:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Only one file can be uploaded at once",
+                )
+
+            if file_type is None and len(head) < SIGNATURE_SIZE:
+                head.extend(data[: SIGNATURE_SIZE - len(head)])
+                if len(head) == SIGNATURE_SIZE:
+                    file_type = check_file_type()
+            if data:
+                yield data
+
+        if file_part is None:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Missing file",
+            )
+        if file_type is None:
+            file_type = check_file_type()
+
+    def check_file_type() -> str:
+        if (sniffed_type := sniff_file_type(bytes(head), file_part.filename)) is None:
+            raise HTTPException(
+                status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+                detail="Unsupported file type",
+            )
+        return sniffed_type
+
+    content_hash, file_size = await blob_store.put_stream(file_chunks(), max_size)
+
+    return UploadedDocument(
+        filename=file_part.filename,
+        file_type=file_type,
+        content_hash=content_hash,
+        file_size=file_size,
+    )
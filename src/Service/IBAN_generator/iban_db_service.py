@@ -36,50 +36,36 @@ async def create_bank_account(session: SQL.AsyncSession) -> SQL.Tables.Financial
 
 
 async def update_bank_account(account_id: id, bank_account: BankAccount) -> SQL.Tables.Financial.BankAccount:
-    session = await SQL.get_async_session()
-
-    if (modified_record := (await session.exec(
-            SQL.select(SQL.Tables.Financial.BankAccount).filter(
-                SQL.Tables.Financial.BankAccount.id == account_id))).first()) is None:
-        raise HTTPException(
-            status=status.HTTP_400_BAD_REQUEST,
-            detail="No account"
-        )
+    async with SQL.session_scope() as session:
+        if (modified_record := (await session.exec(
+                SQL.select(SQL.Tables.Financial.BankAccount).filter(
+                    SQL.Tables.Financial.BankAccount.id == account_id))).first()) is None:
+            raise HTTPException(
+                status=status.HTTP_400_BAD_REQUEST,
+                detail="No account"
+            )
 
-    for field in bank_account.model_dump():
-        setattr(modified_record, field, getattr(bank_account, field))
+        for field in bank_account.model_dump():
+            setattr(modified_record, field, getattr(bank_account, field))
 
-    try:
         await session.commit()
-    except Exception as e:
-        raise e
-
-    await session.refresh(modified_record)
-    await session.close()
-    return modified_record
+        await session.refresh(modified_record)
+        return modified_record
 
 async def get_account_by_id(account_id: id) -> Optional[SQL.Tables.Financial.BankAccount]:
-    session = await SQL.get_async_session()
-    if (parent_record := (await session.exec(SQL.select(SQL.Tables.Financial.BankAccount).filter(SQL.Tables.Financial.BankAccount.id == account_id))).first()) is None:
-        raise HTTPException(
-            status=status.HTTP_204_NO_CONTENT,
-            detail="No account"
-        )
-    await session.close()
-    return parent_record
+    async with SQL.session_scope() as session:
+        if (parent_record := (await session.exec(SQL.select(SQL.Tables.Financial.BankAccount).filter(SQL.Tables.Financial.BankAccount.id == account_id))).first()) is None:
+            raise HTTPException(
+                status=status.HTTP_204_NO_CONTENT,
+                detail="No account"
+            )
+        return parent_record
 
 async def delete_bank_account(account_id: id) -> Optional[SQL.Tables.Financial.BankAccount]:
-    session = await SQL.get_async_session()
-    try:
-        account_data = await get_account_by_id(account_id)
-        if not  account_data:
-            return None
+    account_data = await get_account_by_id(account_id)
+    if not  account_data:
+        return None
 
-        await session.delete(account_data)
-        await session.commit()
-        await session.close()
-        return account_data
-    except Exception as e:
-        await session.rollback()
-        session.close()
-        raise e
+    async with SQL.session_scope() as session:
+        await session.delete(await session.merge(account_data))
+    return account_data
@@ -26,16 +26,63 @@ SECRET_KEY = os.getenv(
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = os.getenv("REDIS_PORT", 6379)
 REDIS_DB = os.getenv("REDIS_DB", 0)
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", 50))
+REDIS_POOL_TIMEOUT = float(os.getenv("REDIS_POOL_TIMEOUT", 1.0))
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", 1.0))
+REDIS_CONNECT_TIMEOUT = float(os.getenv("REDIS_CONNECT_TIMEOUT", 1.0))
 
 JWT_ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRATION_PERIOD = 3600
 REFRESH_TOKEN_EXPIRATION_PERIOD = 3600 * 2
 
+# Validated access tokens are cached in every worker for a short time. Logout is propagated
+# to other workers with Redis pub/sub, the TTL only bounds staleness if a message is lost
+ACCESS_TOKEN_CACHE_SIZE = int(os.getenv("ACCESS_TOKEN_CACHE_SIZE", 10000))
+ACCESS_TOKEN_CACHE_TTL = float(os.getenv("ACCESS_TOKEN_CACHE_TTL", 10))
+
+# Financial reports are reused until the collection, its operations or the class change
+FINANCIAL_REPORT_CACHE_SIZE = int(os.getenv("FINANCIAL_REPORT_CACHE_SIZE", 1000))
+FINANCIAL_REPORT_CACHE_TTL = float(os.getenv("FINANCIAL_REPORT_CACHE_TTL", 300))
+
+# Money movements lock balances of involved accounts. Transactions which hit a deadlock or the lock timeout
+# are run again up to TRANSACTION_MAX_ATTEMPTS times
+BALANCE_LOCK_TIMEOUT = os.getenv("BALANCE_LOCK_TIMEOUT", "2s")
+TRANSACTION_MAX_ATTEMPTS = int(os.getenv("TRANSACTION_MAX_ATTEMPTS", 3))
+TRANSACTION_RETRY_BACKOFF = float(os.getenv("TRANSACTION_RETRY_BACKOFF", 0.05))
+# Locks taken within this many seconds, i.e. about a round trip to the database, did not wait for another transaction
+LOCK_WAIT_THRESHOLD = float(os.getenv("LOCK_WAIT_THRESHOLD", 0.01))
+
+# Account history is returned in pages, exports are streamed in batches fetched from a server side cursor
+OPERATIONS_PAGE_SIZE = int(os.getenv("OPERATIONS_PAGE_SIZE", 50))
+OPERATIONS_MAX_PAGE_SIZE = int(os.getenv("OPERATIONS_MAX_PAGE_SIZE", 500))
+OPERATIONS_STREAM_BATCH_SIZE = int(os.getenv("OPERATIONS_STREAM_BATCH_SIZE", 1000))
+
+# Content of collection documents is kept in a blob store, the database only holds its SHA-256.
+# Unreferenced blobs are removed by src.BlobStore.garbage_collection once older than BLOB_GC_GRACE_PERIOD seconds
+BLOB_STORE_BACKEND = os.getenv("BLOB_STORE_BACKEND", "local")
+BLOB_STORE_PATH = os.getenv("BLOB_STORE_PATH", "data/blobs")
+BLOB_GC_GRACE_PERIOD = float(os.getenv("BLOB_GC_GRACE_PERIOD", 3600))
+# Uploaded documents are streamed to the blob store, larger ones are rejected
+DOCUMENT_MAX_SIZE = int(os.getenv("DOCUMENT_MAX_SIZE", 50 * 1024 * 1024))
+# Previews of images and PDFs are rendered in a process pool, their longer side is at most PREVIEW_SIZE pixels
+PREVIEW_SIZE = int(os.getenv("PREVIEW_SIZE", 320))
+PREVIEW_WORKERS = int(os.getenv("PREVIEW_WORKERS", 2))
+
 PASSWORD_HASH_SALT = os.getenv("PASSWORD_HASH_SALT", "$2b$12$tEwk7HxlN0EMUr4jx1dJtu")
+# bcrypt runs in a thread pool of this size, requests over PASSWORD_HASH_MAX_QUEUE waiting ones get 503
+PASSWORD_HASH_WORKERS = int(os.getenv("PASSWORD_HASH_WORKERS", min(4, os.cpu_count() or 1)))
+PASSWORD_HASH_MAX_QUEUE = int(os.getenv("PASSWORD_HASH_MAX_QUEUE", 64))
 
 DEFAULT_ADMIN_USERNAME = os.getenv("DEFAULT_ADMIN_USERNAME", "admin")
 DEFAULT_ADMIN_PASSWORD = os.getenv("DEFAULT_ADMIN_PASSWORD", "admin")
 
+# Participants of conversations are cached in every worker, they never change once a conversation is created
+CHAT_MEMBERSHIP_CACHE_SIZE = int(os.getenv("CHAT_MEMBERSHIP_CACHE_SIZE", 10000))
+CHAT_MEMBERSHIP_CACHE_TTL = float(os.getenv("CHAT_MEMBERSHIP_CACHE_TTL", 300))
+# Messages waiting to be sent to a chat websocket, a client which falls further behind is disconnected
+CHAT_SEND_QUEUE_SIZE = int(os.getenv("CHAT_SEND_QUEUE_SIZE", 100))
+CHAT_CLOSE_TIMEOUT = float(os.getenv("CHAT_CLOSE_TIMEOUT", 5.0))
+
 MONGODB_HOST = os.getenv("MONGODB_HOST", "localhost")
 MONGODB_PORT = os.getenv("MONGODB_PORT", 27017)
 MONGODB_DB_NAME = os.getenv("MONGODB_DB_NAME", "chat_db")
@@ -1,9 +1,14 @@
+import time
+from datetime import date, datetime, timedelta
 from sqlmodel import or_
-from typing import Optional, Sequence
+from typing import AsyncIterator, Iterable, Optional, Sequence
+from sqlalchemy import insert, tuple_, union
 from sqlmodel import select, func
 
 import src.SQL as SQL
-from src.SQL.Tables import BankAccount, BankAccountOperation
+import src.config as config
+from src.SQL.Tables import BankAccount, BankAccountOperation, BankAccountBalance
+from src.SQL.Tables.Financial import get_balance_deltas, update_balances_query
 from src.Model.BankAccountOperation import (
     BankAccountOperation as ModelBankAccountOperation,
 )
@@ -25,6 +30,71 @@ async def get_all(session: SQL.AsyncSession) -> Sequence[BankAccount]:
     return result.all()
 
 
+async def set_lock_timeout(session: SQL.AsyncSession) -> None:
+    """Waiting for a row lock longer than BALANCE_LOCK_TIMEOUT fails the transaction, so it can be retried"""
+    await session.exec(
+        select(func.set_config("lock_timeout", config.BALANCE_LOCK_TIMEOUT, True))
+    )
+
+
+async def lock_balances(
+    session: SQL.AsyncSession, account_ids: Iterable[int]
+) -> dict[int, float]:
+    """
+    Lock balances of the accounts until the end of the transaction and return them.
+    Rows are locked in the order of account ids, so transactions moving money between the same accounts
+    wait for each other instead of deadlocking. Waiting longer than BALANCE_LOCK_TIMEOUT fails the transaction.
+    """
+    await set_lock_timeout(session)
+
+    account_ids = set(account_ids)
+    started_at = time.monotonic()
+    locked_balances = dict(
+        (
+            await session.exec(
+                select(BankAccountBalance.bank_account_id, BankAccountBalance.balance)
+                .where(BankAccountBalance.bank_account_id.in_(account_ids))
+                .order_by(BankAccountBalance.bank_account_id)
+                .with_for_update()
+            )
+        ).all()
+    )
+    SQL.transaction_metrics.record_lock_acquisition(time.monotonic() - started_at)
+
+    # Accounts without a balance row have never had any operation
+    return {account_id: 0.0 for account_id in account_ids} | locked_balances
+
+
+async def insert_operations(
+    session: SQL.AsyncSession, operations: list[BankAccountOperation]
+) -> list[BankAccountOperation]:
+    """
+    Insert bank account operations with a single statement and update balances of all involved accounts.
+    Ids are assigned to the given operations. Nothing is committed, so it can be a part of a larger transaction.
+    """
+    if not operations:
+        return operations
+
+    # Bulk insert does not run ORM events, so balances are updated here instead of by the after_insert listener
+    operation_ids = (
+        await session.exec(
+            insert(BankAccountOperation).returning(
+                BankAccountOperation.operation_id, sort_by_parameter_order=True
+            ),
+            params=[
+                operation.model_dump(exclude={"operation_id"})
+                for operation in operations
+            ],
+        )
+    ).scalars().all()
+    for operation, operation_id in zip(operations, operation_ids):
+        operation.operation_id = operation_id
+
+    await session.exec(update_balances_query(get_balance_deltas(operations)))
+
+    return operations
+
+
 async def get_bank_account_operations(
     session: SQL.AsyncSession, bank_account_id
 ) -> Optional[Sequence[BankAccountOperation]]:
@@ -41,9 +111,32 @@ async def get_bank_account_operations(
     return result
 
 
-async def get_bank_account_operations_with_iban(
-    session: SQL.AsyncSession, bank_account_id
-) -> list[ModelBankAccountOperation] | None:
+def history_conditions(
+    date_from: date | None = None,
+    date_to: date | None = None,
+    after: tuple[datetime, int] | None = None,
+) -> list:
+    """
+    Filters of the account history, both dates are inclusive.
+    `after` is (operation_date, operation_id) of the last operation of the previous page.
+    """
+    conditions = []
+    if date_from is not None:
+        conditions.append(BankAccountOperation.operation_date >= date_from)
+    if date_to is not None:
+        conditions.append(
+            BankAccountOperation.operation_date < date_to + timedelta(days=1)
+        )
+    if after is not None:
+        conditions.append(
+            tuple_(BankAccountOperation.operation_date, BankAccountOperation.operation_id)
+            < tuple_(*after)
+        )
+    return conditions
+
+
+def operations_with_iban_query(*conditions):
+    """Operations matching the conditions with IBANs of both sides, newest first"""
     SourceAccount = SQL.aliased(BankAccount)
     DestinationAccount = SQL.aliased(BankAccount)
 
@@ -70,20 +163,123 @@ async def get_bank_account_operations_with_iban(
             BankAccountOperation.destination_account_id == DestinationAccount.id,
             isouter=True,
         )
-        .where(
-            or_(
-                BankAccountOperation.source_account_id == bank_account_id,
-                BankAccountOperation.destination_account_id == bank_account_id,
-            )
+        .where(*conditions)
+        .order_by(
+            BankAccountOperation.operation_date.desc(),
+            BankAccountOperation.operation_id.desc(),
         )
     )
 
+    return query
+
+
+def bank_account_operations_with_iban_query(
+    bank_account_id, date_from: date | None = None, date_to: date | None = None
+):
+    return operations_with_iban_query(
+        or_(
+            BankAccountOperation.source_account_id == bank_account_id,
+            BankAccountOperation.destination_account_id == bank_account_id,
+        ),
+        *history_conditions(date_from, date_to),
+    )
+
+
+async def get_bank_account_operations_with_iban(
+    session: SQL.AsyncSession, bank_account_id
+) -> list[ModelBankAccountOperation] | None:
+    query = bank_account_operations_with_iban_query(bank_account_id)
+
     if not (result := (await session.exec(query)).all()):
         return None
 
     return result
 
 
+def bank_account_operations_page_query(
+    bank_account_id: int,
+    limit: int,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    after: tuple[datetime, int] | None = None,
+):
+    """
+    One page of the account history, newest first.
+    Both sides of the history are read in the order of their indexes,
+    so at most `limit` operations per side are visited regardless of the history length.
+    """
+    conditions = history_conditions(date_from, date_to, after)
+    page_ids = union(
+        *(
+            select(BankAccountOperation.operation_id)
+            .where(side == bank_account_id, *conditions)
+            .order_by(
+                BankAccountOperation.operation_date.desc(),
+                BankAccountOperation.operation_id.desc(),
+            )
+            .limit(limit)
+            for side in (
+                BankAccountOperation.source_account_id,
+                BankAccountOperation.destination_account_id,
+            )
+        )
+    ).subquery("page_ids")
+
+    return operations_with_iban_query(
+        BankAccountOperation.operation_id.in_(select(page_ids.c.operation_id))
+    ).limit(limit)
+
+
+async def get_bank_account_operations_page(
+    session: SQL.AsyncSession,
+    bank_account_id: int,
+    limit: int,
+    date_from: date | None = None,
+    date_to: date | None = None,
+    after: tuple[datetime, int] | None = None,
+) -> list[ModelBankAccountOperation]:
+    query = bank_account_operations_page_query(bank_account_id, limit, date_from, date_to, after)
+    return list((await session.exec(query)).all())
+
+
+async def stream_bank_account_operations(
+    bank_account_id: int,
+    date_from: date | None = None,
+    date_to: date | None = None,
+) -> AsyncIterator[ModelBankAccountOperation]:
+    """
+    Whole account history read with a server side cursor, so only one batch is held in memory.
+    Uses its own session, the one of the request is closed before a streamed response is sent.
+    """
+    async with SQL.session_scope() as session:
+        result = await session.stream(
+            bank_account_operations_with_iban_query(
+                bank_account_id, date_from, date_to
+            ).execution_options(yield_per=config.OPERATIONS_STREAM_BATCH_SIZE)
+        )
+        async for row in result:
+            yield row
+
+
+def withdrawn_money_query(bank_account_id, cashier_id):
+    """Money withdrawn from the bank account to the cashier's account or outside of the system"""
+    cashier_bank_account_id = (
+        select(SQL.Tables.Parent.bank_account_id)
+        .where(SQL.Tables.Parent.id == cashier_id)
+        .scalar_subquery()
+    )
+
+    return select(
+        func.coalesce(func.sum(BankAccountOperation.amount), 0.0)
+    ).where(
+        BankAccountOperation.source_account_id == bank_account_id,
+        or_(
+            BankAccountOperation.destination_account_id == cashier_bank_account_id,
+            BankAccountOperation.destination_account_id.is_(None),
+        ),
+    )
+
+
 async def get_bank_account_details(
     session: SQL.AsyncSession,
     bank_account_id: int,
@@ -99,27 +295,10 @@ async def get_bank_account_details(
     detailed_info["balance"] = await result.get_balance(session)
 
     if cashier_id:
-        cashier = (
-            await session.exec(
-                select(SQL.Tables.Parent).where(SQL.Tables.Parent.id == cashier_id)
-            )
-        ).first()
-
-        withdrawn_money = (
-            await session.exec(
-                select(func.sum(BankAccountOperation.amount)).where(
-                    BankAccountOperation.source_account_id == bank_account_id,
-                    or_(
-                        BankAccountOperation.destination_account_id
-                        == cashier.bank_account_id,
-                        BankAccountOperation.destination_account_id is None,
-                    ),
-                )
-            )
+        detailed_info["withdrawn_money"] = (
+            await session.exec(withdrawn_money_query(bank_account_id, cashier_id))
         ).first()
 
-        detailed_info["withdrawn_money"] = withdrawn_money or 0.0
-
     return {
         **result.model_dump(),
         **detailed_info,
@@ -1,7 +1,8 @@
 from bson import ObjectId
-from src.NoSQL.connection import messages_collection, conversations_collection
-from src.Model.Chat import Message, Conversation
-from typing import List, Optional
+from pymongo import ReturnDocument
+from src.NoSQL.connection import messages_collection, conversations_collection, read_cursors_collection
+from src.Model.Chat import Message, Conversation, ReadCursor
+from typing import Dict, List, Optional, Tuple
 
 
 async def create_conversation(conversation: Conversation) -> str:
@@ -19,6 +20,17 @@ async def get_conversation(conversation_id: str) -> Optional[Conversation]:
     return None
 
 
+async def get_conversations(conversation_ids: List[str]) -> List[Conversation]:
+    cursor = conversations_collection.find(
+        {"_id": {"$in": [ObjectId(conversation_id) for conversation_id in conversation_ids]}}
+    )
+    conversations = []
+    async for doc in cursor:
+        doc["id"] = str(doc.pop("_id"))
+        conversations.append(Conversation(**doc))
+    return conversations
+
+
 async def get_user_conversations(user_id: int) -> List[Conversation]:
     cursor = conversations_collection.find({"participants": user_id})
     conversations = []
@@ -29,11 +41,18 @@ async def get_user_conversations(user_id: int) -> List[Conversation]:
 
 
 async def save_message(message: Message) -> str:
-    result = await messages_collection.insert_one(message.model_dump(exclude={"id"}))
-    await conversations_collection.update_one(
+    # Sequence numbers are given out by the conversation document, so they are ordered the same for every worker.
+    # ObjectIds are generated by clients of MongoDB and are not ordered across them.
+    conversation = await conversations_collection.find_one_and_update(
         {"_id": ObjectId(message.conversation_id)},
-        {"$set": {"last_message_at": message.created_at}},
+        {"$inc": {"message_count": 1}, "$set": {"last_message_at": message.created_at}},
+        projection={"message_count": 1},
+        return_document=ReturnDocument.AFTER,
     )
+    if conversation is None:
+        raise ValueError(f"Conversation {message.conversation_id} not found")
+    message.seq = conversation["message_count"]
+    result = await messages_collection.insert_one(message.model_dump(exclude={"id"}))
     return str(result.inserted_id)
 
 
@@ -42,7 +61,7 @@ async def get_conversation_messages(
 ) -> List[Message]:
     cursor = (
         messages_collection.find({"conversation_id": conversation_id})
-        .sort("created_at", -1)
+        .sort("seq", -1)
         .skip(skip)
         .limit(limit)
     )
@@ -53,22 +72,56 @@ async def get_conversation_messages(
     return messages[::-1]  # Reverse to get chronological order
 
 
-async def mark_messages_as_read(conversation_id: str, user_id: int) -> int:
-    result = await messages_collection.update_many(
-        {"conversation_id": conversation_id, "read_by": {"$ne": user_id}},
-        {"$push": {"read_by": user_id}},
+async def get_read_cursor(conversation_id: str, user_id: int) -> Optional[ReadCursor]:
+    result = await read_cursors_collection.find_one(
+        {"conversation_id": conversation_id, "user_id": user_id}
     )
-    return result.modified_count
+    if result:
+        return ReadCursor(
+            conversation_id=conversation_id,
+            user_id=user_id,
+            last_read_seq=result["last_read_seq"],
+        )
+    return None
 
 
-async def mark_specific_messages_as_read(message_ids: List[str], user_id: int) -> int:
-    """Mark specific messages as read by a user"""
-    object_ids = [ObjectId(msg_id) for msg_id in message_ids]
-    result = await messages_collection.update_many(
-        {"_id": {"$in": object_ids}, "read_by": {"$ne": user_id}},
-        {"$push": {"read_by": user_id}}
+async def advance_read_cursor(conversation_id: str, user_id: int, seq: int) -> Optional[int]:
+    """Move the read cursor of the user forward to the message with the sequence number, returns where it was before"""
+    previous = await read_cursors_collection.find_one_and_update(
+        {"conversation_id": conversation_id, "user_id": user_id},
+        # $max never moves the cursor back, e.g. when an older page of messages is marked as read
+        {"$max": {"last_read_seq": seq}},
+        upsert=True,
+        return_document=ReturnDocument.BEFORE,
     )
-    return result.modified_count
+    return previous["last_read_seq"] if previous else None
+
+
+async def mark_messages_as_read(conversation_id: str, user_id: int) -> None:
+    latest = await messages_collection.find_one(
+        {"conversation_id": conversation_id}, {"seq": 1}, sort=[("seq", -1)]
+    )
+    if latest:
+        await advance_read_cursor(conversation_id, user_id, latest["seq"])
+
+
+async def mark_specific_messages_as_read(
+        messages: Dict[str, Tuple[str, int, int]], user_id: int
+) -> int:
+    """
+    Mark specific messages as read by a user, they are given as returned by get_messages_conversations.
+    Returns how many of them were unread.
+    """
+    seqs_of: Dict[str, List[int]] = {}
+    for conversation_id, sender_id, seq in messages.values():
+        if sender_id != user_id:
+            seqs_of.setdefault(conversation_id, []).append(seq)
+
+    marked_count = 0
+    for conversation_id, seqs in seqs_of.items():
+        previous = await advance_read_cursor(conversation_id, user_id, max(seqs))
+        marked_count += sum(1 for seq in seqs if previous is None or seq > previous)
+    return marked_count
 
 
 async def get_message_by_id(message_id: str) -> Optional[Message]:
@@ -80,10 +133,21 @@ async def get_message_by_id(message_id: str) -> Optional[Message]:
     return None
 
 
+async def get_messages_conversations(message_ids: List[str]) -> Dict[str, Tuple[str, int, int]]:
+    """Conversation id, sender and sequence number of each existing message, keyed by message id"""
+    cursor = messages_collection.find(
+        # Messages of deleted conversations are never numbered, they are skipped as unknown
+        {"_id": {"$in": [ObjectId(msg_id) for msg_id in message_ids]}, "seq": {"$exists": True}},
+        {"conversation_id": 1, "sender_id": 1, "seq": 1},
+    )
+    return {
+        str(doc["_id"]): (doc["conversation_id"], doc["sender_id"], doc["seq"]) async for doc in cursor
+    }
+
+
 async def get_unread_message_count(conversation_id: str, user_id: int) -> int:
-    """Count messages in a conversation that haven't been read by the user"""
-    count = await messages_collection.count_documents({
-        "conversation_id": conversation_id,
-        "read_by": {"$ne": user_id}
-    })
-    return count
+    """Count messages of other participants after the read cursor of the user, a range of the index"""
+    query = {"conversation_id": conversation_id, "sender_id": {"$ne": user_id}}
+    if cursor := await get_read_cursor(conversation_id, user_id):
+        query["seq"] = {"$gt": cursor.last_read_seq}
+    return await messages_collection.count_documents(query)
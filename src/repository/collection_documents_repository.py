@@ -7,12 +7,24 @@ from src.Model.CollectionDocument import CreateCollectionDocumentDB, CollectionD
 from src.SQL import AsyncSession, select
 from src.SQL.Enum.Privilege import ADMIN_USER
 from src.SQL.Tables.Collection import CollectionDocuments
+from src.BlobStore import blob_store
 from src.Service.Auth import AuthorizedUser
 from src.Service.Collection.collection_validator import check_if_user_can_view_collection
 
 
 async def create(session: AsyncSession, collection_doc:CreateCollectionDocumentDB) -> CollectionDocument:
-    collection_document = CollectionDocuments(**collection_doc.model_dump())
+    return await insert(
+        session,
+        CollectionDocuments(
+            **collection_doc.model_dump(exclude={"file_data"}),
+            content_hash=await blob_store.put(collection_doc.file_data),
+            file_size=len(collection_doc.file_data),
+        ),
+    )
+
+
+async def insert(session: AsyncSession, collection_document: CollectionDocuments) -> CollectionDocuments:
+    """Insert a document whose content is already in the blob store"""
     try:
         session.add(collection_document)
         await session.commit()
@@ -29,10 +41,15 @@ async def update(session: AsyncSession, collection_document:CollectionDocument)
         if document is None:
             raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
 
-        update_data = collection_document.model_dump(exclude_unset=True)
+        update_data = collection_document.model_dump(exclude_unset=True, exclude={"file_data"})
         for key,value in update_data.items():
             setattr(document, key, getattr(collection_document, key))
 
+        if collection_document.file_data is not None:
+            document.content_hash = await blob_store.put(collection_document.file_data)
+            document.file_size = len(collection_document.file_data)
+            document.preview_hash = None
+
         session.add(document)
         await session.commit()
         await session.refresh(document)
@@ -43,8 +60,20 @@ async def update(session: AsyncSession, collection_document:CollectionDocument)
 
 
 
+def metadata_query(collection_id: int):
+    """Documents of the collection without their content"""
+    return select(
+        CollectionDocuments.document_id,
+        CollectionDocuments.collection_id,
+        CollectionDocuments.document_name,
+        CollectionDocuments.file_type,
+        CollectionDocuments.content_hash,
+        CollectionDocuments.preview_hash,
+    ).filter(CollectionDocuments.collection_id == collection_id)
+
+
 async def get(session: AsyncSession, collection_id: int) -> Sequence[CollectionDocumentMetadata]:
-    query = select(CollectionDocuments).filter(CollectionDocuments.collection_id == collection_id)
+    query = metadata_query(collection_id)
 
     try:
         documents = (await session.exec(query)).all()
@@ -55,7 +84,9 @@ async def get(session: AsyncSession, collection_id: int) -> Sequence[CollectionD
                 document_id=doc.document_id,
                 collection_id=doc.collection_id,
                 document_name=doc.document_name,
-                file_type=doc.file_type
+                file_type=doc.file_type,
+                content_hash=doc.content_hash,
+                preview_hash=doc.preview_hash
             ))
 
         return metadata_list
@@ -71,9 +102,21 @@ async def get_by_id(session: AsyncSession, collection_document_id: int) -> Optio
     except Exception as error:
         logger.logger.error(error)
         raise error
-    await session.close()
     return document if document else None
 
+async def get_content(document: CollectionDocuments) -> bytes:
+    return await blob_store.get(document.content_hash)
+
+
+async def get_content_hashes(session: AsyncSession) -> set[str]:
+    """Hashes of all blobs referenced by documents, their content and previews"""
+    content_hashes = (await session.exec(select(CollectionDocuments.content_hash).distinct())).all()
+    preview_hashes = (await session.exec(
+        select(CollectionDocuments.preview_hash).where(CollectionDocuments.preview_hash.is_not(None)).distinct()
+    )).all()
+    return set(content_hashes) | set(preview_hashes)
+
+
 async def delete(session: AsyncSession, collection_document_id: int, user: AuthorizedUser) -> Optional[CollectionDocument]:
     try:
         document = await get_by_id(session, collection_document_id)
@@ -1,19 +1,24 @@
-import asyncio
+import time
 from datetime import datetime
 from typing import List, Optional, Sequence
 from fastapi import logger
-from sqlmodel import select, and_, func
+from sqlalchemy import insert
+from sqlmodel import select, and_, or_, func
 
 from src.repository import bank_account_repository
 import src.SQL as SQL
 from src.Model.CollectionModel import CollectionChildrenList
+from src.Model.CollectionDocument import CollectionDocumentMetadata
+from src.Model.BankAccountOperation import (
+    BankAccountOperation as ModelBankAccountOperation,
+)
 from src.Model.UserAccountPrivilegeEnum import UserAccountPrivilegeEnum
-from src.SQL.Tables import Collection, ClassGroup, ParentGroupRole
+from src.SQL.Tables import Collection, ClassGroup, ParentGroupRole, BankAccount, BankAccountBalance, BankAccountOperation
 from src.SQL.Tables.People import Parent, UserAccount, Child, Parenthood
 import src.SQL.Tables as CollectionStatusEnum
 from src.SQL.Tables.Collection import CollectionOperation
 from src.SQL.Enum.CollectionStatus import CANCELLED
-from src.Service.Auth import AuthorizedUser
+from src.SQL.Enum.CollectionOperationType import PAY, DISCHARGE, REFUND
 import src.repository.collection_documents_repository as collection_documents_repository
 
 
@@ -101,13 +106,30 @@ async def get_by_id(
 ) -> Optional[Collection]:
     query = select(Collection).where(Collection.id == collection_id)
     result = await session.exec(query)
-    await session.close()
     return result.first()
 
 
-async def get_list_of_children_for_collection(
-    session: SQL.AsyncSession, collection_id: int
-) -> List[CollectionChildrenList]:
+async def lock(session: SQL.AsyncSession, collection_id: int) -> Optional[int]:
+    """
+    Lock the collection until the end of the transaction and return its status, None if it does not exist.
+    Every transaction which moves money of the collection takes this lock before balances,
+    so payments, refunds, withdrawals and cancellation see the status and operations committed by each other.
+    """
+    await bank_account_repository.set_lock_timeout(session)
+    started_at = time.monotonic()
+    collection_status = (
+        await session.exec(
+            select(Collection.status)
+            .where(Collection.id == collection_id)
+            .with_for_update()
+        )
+    ).first()
+    SQL.transaction_metrics.record_lock_acquisition(time.monotonic() - started_at)
+    return collection_status
+
+
+def children_status_query(collection_id):
+    """Children of the collection's class with their latest collection operation"""
     latest_ops = (
         select(
             CollectionOperation.child_id,
@@ -120,13 +142,13 @@ async def get_list_of_children_for_collection(
 
     query = (
         select(
-            Child.id,
-            Child.name,
-            Child.surname,
-            Parent.name.label("parent_name"),
-            Parent.surname.label("parent_surname"),
-            CollectionOperation.operation_type,
-            CollectionOperation.operation_date,
+            Child.id.label("child_id"),
+            Child.name.label("child_name"),
+            Child.surname.label("child_surname"),
+            Parent.name.label("requester_name"),
+            Parent.surname.label("requester_surname"),
+            CollectionOperation.operation_type.label("operation"),
+            CollectionOperation.operation_date.label("operation_date"),
         )
         .join(ClassGroup, Child.group_id == ClassGroup.id)
         .join(Collection, Collection.class_group_id == ClassGroup.id)
@@ -144,13 +166,19 @@ async def get_list_of_children_for_collection(
         .outerjoin(Parent, Parent.id == CollectionOperation.requester_id)
         .where(Collection.id == collection_id)
     )
+
+    return query
+
+
+async def get_list_of_children_for_collection(
+    session: SQL.AsyncSession, collection_id: int
+) -> List[CollectionChildrenList]:
+    query = children_status_query(collection_id)
     try:
         query_result: Sequence = (await session.exec(query)).all()
     except Exception as e:
         logger.logger.error(f"Failed to get children status list: {e}")
         raise e
-    finally:
-        await session.close()
 
     result_list = []
     for operation in query_result:
@@ -168,45 +196,186 @@ async def get_list_of_children_for_collection(
     return result_list
 
 
-async def gather_collection_view_data(collection_id: int, user: AuthorizedUser) -> dict:
-    """Collect data for class view by running all queries concurrently"""
+async def get_with_operation_counts_for_class(
+    session: SQL.AsyncSession, class_group_id: int
+) -> Sequence[tuple[Collection, int, int]]:
+    """
+    Collections of the class with numbers of children who paid
+    and who were excluded from them (discharged or refunded), computed by a single grouped aggregate.
+    A child has at most one operation per collection, so counting rows counts children.
+    """
+    query = (
+        select(
+            Collection,
+            func.count()
+            .filter(CollectionOperation.operation_type == PAY)
+            .label("paid_count"),
+            func.count()
+            .filter(CollectionOperation.operation_type.in_([DISCHARGE, REFUND]))
+            .label("excluded_count"),
+        )
+        .outerjoin(
+            CollectionOperation, CollectionOperation.collection_id == Collection.id
+        )
+        .where(Collection.class_group_id == class_group_id)
+        .group_by(Collection.id)
+    )
+
+    return (await session.exec(query)).all()
+
+
+async def get_children_payment_status(
+    session: SQL.AsyncSession, collection_id: int
+) -> Sequence:
+    """
+    Children of the collection's class with type of their collection operation.
+    Every row also carries totals for the whole collection, computed by window functions in the same pass.
+    """
+    query = (
+        select(
+            Child.id.label("child_id"),
+            Child.name.label("child_name"),
+            Child.surname.label("child_surname"),
+            CollectionOperation.operation_type,
+            func.count().over().label("children_count"),
+            func.count()
+            .filter(CollectionOperation.operation_type == PAY)
+            .over()
+            .label("paid_count"),
+            func.count()
+            .filter(CollectionOperation.operation_type.in_([DISCHARGE, REFUND]))
+            .over()
+            .label("excluded_count"),
+        )
+        .select_from(Collection)
+        .join(Child, Child.group_id == Collection.class_group_id)
+        .outerjoin(
+            CollectionOperation,
+            and_(
+                CollectionOperation.child_id == Child.id,
+                CollectionOperation.collection_id == Collection.id,
+            ),
+        )
+        .where(Collection.id == collection_id)
+    )
+
+    return (await session.exec(query)).all()
+
 
-    collection = await get_by_id(
-        session=await SQL.get_async_session(), collection_id=collection_id
+async def insert_operations(
+    session: SQL.AsyncSession, operations: list[CollectionOperation]
+) -> None:
+    """Insert collection operations with a single statement, nothing is committed"""
+    if operations:
+        await session.exec(
+            insert(CollectionOperation),
+            params=[operation.model_dump() for operation in operations],
+        )
+
+
+def requester_query(collection_id: int, user_id: int):
+    """Role of the user in the class the collection belongs to"""
+    return (
+        select(
+            Parent.id.label("parent_id"),
+            Parent.name.label("name"),
+            Parent.surname.label("surname"),
+            ParentGroupRole.role.label("role"),
+        )
+        .select_from(Collection)
+        .join(
+            ParentGroupRole,
+            ParentGroupRole.class_group_id == Collection.class_group_id,
+        )
+        .join(Parent, Parent.id == ParentGroupRole.parent_id)
+        .filter(
+            Parent.account_id == user_id,
+            Collection.id == collection_id,
+        )
     )
-    children, documents, raw_operations, bank_account_details = await asyncio.gather(
-        get_list_of_children_for_collection(
-            session=await SQL.get_async_session(), collection_id=collection_id
-        ),
-        collection_documents_repository.get(
-            session=await SQL.get_async_session(), collection_id=collection_id
-        ),
-        bank_account_repository.get_bank_account_operations_with_iban(
-            session=await SQL.get_async_session(),
-            bank_account_id=collection.bank_account_id,
-        ),
-        bank_account_repository.get_bank_account_details(
-            session=await SQL.get_async_session(),
-            bank_account_id=collection.bank_account_id,
-            cashier_id=collection.owner_id,
-        ),
+
+
+async def get_collection_view(
+    session: SQL.AsyncSession, collection_id: int, user_id: int
+) -> Optional[dict]:
+    """
+    Collect data for collection view in a single round trip.
+    Lists are aggregated to JSON by the database and validated back into the models they were read with before,
+    so the response stays the same as when they were fetched by separate queries.
+    """
+    # Passed to subqueries which are aggregated in FROM clause, where they cannot be correlated with the outer row
+    bank_account_id, owner_id = (
+        select(column)
+        .where(Collection.id == collection_id)
+        .correlate(None)
+        .scalar_subquery()
+        for column in (Collection.bank_account_id, Collection.owner_id)
     )
 
-    # Here we map the raw operations (returned as SQLAlchemy Row objects) to dictionaries.
-    # This relies on SQLAlchemy's built-in _mapping attribute.
-    # It does not require us to write a custom dumping function inside the repository.
-    if raw_operations and hasattr(raw_operations[0], "_mapping"):
-        operations = [dict(op._mapping) for op in raw_operations]
-    else:
-        operations = raw_operations
-
-    return {
-        "bank_account_details": bank_account_details,
-        "collection": collection.model_dump(),
-        "operations": operations,
-        "children": [child.model_dump() for child in children],
-        "documents": [document.model_dump() for document in documents],
+    query = (
+        select(
+            Collection,
+            BankAccount,
+            func.coalesce(BankAccountBalance.balance, 0.0).label("balance"),
+            bank_account_repository.withdrawn_money_query(bank_account_id, owner_id)
+            .scalar_subquery()
+            .label("withdrawn_money"),
+            SQL.json_list(
+                bank_account_repository.bank_account_operations_with_iban_query(
+                    bank_account_id
+                ),
+                null_if_empty=True,
+                order_by=("-operation_date", "-operation_id"),
+            ).label("operations"),
+            SQL.json_list(children_status_query(collection_id)).label("children"),
+            SQL.json_list(
+                collection_documents_repository.metadata_query(collection_id)
+            ).label("documents"),
+            SQL.json_object(requester_query(collection_id, user_id)).label("requester"),
+        )
+        .join(BankAccount, BankAccount.id == Collection.bank_account_id)
+        .outerjoin(
+            BankAccountBalance,
+            BankAccountBalance.bank_account_id == Collection.bank_account_id,
+        )
+        .where(Collection.id == collection_id)
+    )
+
+    if (view := (await session.exec(query)).first()) is None:
+        return None
+
+    collection_data = {
+        "bank_account_details": {
+            **view.BankAccount.model_dump(),
+            "balance": view.balance,
+            **(
+                {"withdrawn_money": view.withdrawn_money}
+                if view.Collection.owner_id
+                else {}
+            ),
+        },
+        "collection": view.Collection.model_dump(),
+        "operations": (
+            [
+                ModelBankAccountOperation.model_validate(operation).model_dump()
+                for operation in view.operations
+            ]
+            if view.operations is not None
+            else None
+        ),
+        "children": [
+            CollectionChildrenList.model_validate(child).model_dump()
+            for child in view.children
+        ],
+        "documents": [
+            CollectionDocumentMetadata.model_validate(document).model_dump()
+            for document in view.documents
+        ],
     }
+    if view.requester is not None:
+        collection_data["requester"] = view.requester
+
+    return collection_data
 
 
 async def create(session: SQL.AsyncSession, collection: Collection) -> Collection:
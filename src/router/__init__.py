@@ -9,3 +9,4 @@ from .bank_account import bank_account_router
 from .collection_documents import collection_documents_router
 from .report import report_router
 from .chat import chat_router
+from .metrics import metrics_router
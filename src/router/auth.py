@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, status, HTTPException
 import src.SQL as SQL
 import src.Service.Auth as Auth
 import src.Model.UserAccount as UserModel
+from src.Service.Auth.password_hashing import hash_password, verify_password
 
 auth_router = APIRouter()
 
@@ -10,7 +11,7 @@ auth_router = APIRouter()
 @auth_router.post("/login", response_model=Auth.Token)
 async def login(
     form_data: UserModel.Login,
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ) -> Auth.Token:
     return await Auth.user_login(form_data, sql_session)
 
@@ -18,7 +19,7 @@ async def login(
 @auth_router.post("/refresh", response_model=Auth.Token)
 async def refresh_token(
     refresh_token: str,
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ) -> Auth.Token:
     return await Auth.refresh_token(refresh_token, sql_session)
 
@@ -27,16 +28,16 @@ async def refresh_token(
 async def logout(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
 ):
-    Auth.user_logout(user)
+    await Auth.user_logout(user)
 
 
 @auth_router.put("/password", status_code=status.HTTP_204_NO_CONTENT)
 async def update_password(
     request: UserModel.ChangePassword,
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ):
-    if request.new_password == request.old_password:
+    if request.is_password_same():
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="New password cannot be the same as old password",
@@ -50,12 +51,12 @@ async def update_password(
         )
     ).first()
 
-    if DB_user.password != request.old_password:
+    if not await verify_password(request.old_password, DB_user.password):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="User is unauthorized"
         )
 
-    DB_user.password = request.new_password
+    DB_user.password = await hash_password(request.new_password)
     await sql_session.commit()
 
 
@@ -63,7 +64,7 @@ async def update_password(
 async def update_identity(
     request: UserModel.UpdateIdentity,
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ):
     DB_user: SQL.Tables.UserAccount = (
         await sql_session.exec(
@@ -1,19 +1,25 @@
-from typing import Annotated
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+import io
+from typing import Annotated, AsyncIterator, Literal
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
+from fastapi.responses import StreamingResponse
+from sqlmodel import update
 import datetime
+import src.config as config
 import src.SQL as SQL
 from src.SQL.Enum.Privilege import ADMIN_USER
 from src.SQL.Tables import BankAccountOperation
 from src.Service import Auth
 from src.repository import bank_account_repository
+from src.repository import collection_repository
 from src.repository import parent_repository
 from src.Model.BankAccount import BankAccount, ExternalBankAccountOperation
 from src.Model.BankAccountOperation import BankAccountBalance
-from src.repository.bank_account_repository import get_bank_account_operations_with_iban
 from src.repository.parent_repository import get_by_user_account
 import src.SQL.Enum.CollectionStatus as CollectionStatus
 from src.Model.BankAccountOperation import (
     BankAccountOperation as ModelBankAccountOperation,
+    OperationsCursor,
 )
 
 bank_account_router = APIRouter()
@@ -123,37 +129,43 @@ async def withdraw(
             detail="Bank account not found",
         )
 
-    available_balance = await sql_bank_account.get_balance(sql_session)
+    account_id = sql_bank_account.id
 
-    if available_balance < requestData.amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Not enough money",
-        )
+    async def withdraw_money() -> float:
+        available_balance = (
+            await bank_account_repository.lock_balances(sql_session, [account_id])
+        )[account_id]
+
+        if available_balance < requestData.amount:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Not enough money",
+            )
 
-    try:
         sql_session.add(
             SQL.Tables.BankAccountOperation(
                 amount=requestData.amount,
                 title="Money Withdrawal",
                 description=f"Money Withdrawal to {requestData.account_number}",
-                source_account_id=sql_bank_account.id,
+                source_account_id=account_id,
                 destination_account_id=None,
             )
         )
         await sql_session.commit()
-    except Exception:
-        await sql_session.rollback()
+        return available_balance - requestData.amount
 
+    try:
+        balance = await SQL.run_with_retry(sql_session, withdraw_money)
+    except HTTPException:
+        raise
+    except Exception:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not withdraw money",
         )
 
-    balance = await sql_bank_account.get_balance(sql_session)
-
     return BankAccountBalance(
-        account_id=sql_bank_account.id,
+        account_id=account_id,
         balance=balance,
     )
 
@@ -179,16 +191,9 @@ async def get(
         )
 
 
-@bank_account_router.get(
-    "/operations/{bank_account_id}",
-    status_code=status.HTTP_200_OK,
-    response_model=list[ModelBankAccountOperation],
-)
-async def get_bank_account_operations_by_id(
-    bank_account_id: int,
-    user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
-):
+async def check_can_view_operations(
+    sql_session: SQL.AsyncSession, user: Auth.AuthorizedUser, bank_account_id: int
+) -> None:
     requester_parent_account = await get_by_user_account(sql_session, user.user_id)
 
     if (
@@ -200,17 +205,113 @@ async def get_bank_account_operations_by_id(
             detail="Bank account cannot be viewed by this person",
         )
 
-    operations = await get_bank_account_operations_with_iban(
+
+@bank_account_router.get(
+    "/operations/{bank_account_id}",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ModelBankAccountOperation],
+)
+async def get_bank_account_operations_by_id(
+    bank_account_id: int,
+    user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
+    response: Response,
+    limit: Annotated[
+        int, Query(ge=1, le=config.OPERATIONS_MAX_PAGE_SIZE)
+    ] = config.OPERATIONS_PAGE_SIZE,
+    cursor: str | None = None,
+    date_from: datetime.date | None = None,
+    date_to: datetime.date | None = None,
+):
+    """
+    Operations of the bank account, newest first, `limit` at a time.
+    If there can be more operations, the X-Next-Cursor header holds the cursor of the next page.
+    """
+    await check_can_view_operations(sql_session, user, bank_account_id)
+
+    after = None
+    if cursor is not None:
+        try:
+            after = OperationsCursor.decode(cursor)
+        except ValueError:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid cursor",
+            )
+
+    operations = await bank_account_repository.get_bank_account_operations_page(
         sql_session,
         bank_account_id,
+        limit,
+        date_from,
+        date_to,
+        (after.operation_date, after.operation_id) if after else None,
     )
     if not operations:
         raise HTTPException(
             status_code=status.HTTP_204_NO_CONTENT,
         )
+
+    if len(operations) == limit:
+        response.headers["X-Next-Cursor"] = OperationsCursor(
+            operation_date=operations[-1].operation_date,
+            operation_id=operations[-1].operation_id,
+        ).encode()
+
     return operations
 
 
+async def operations_as_ndjson(operations) -> AsyncIterator[str]:
+    async for operation in operations:
+        yield ModelBankAccountOperation(**operation._mapping).model_dump_json() + "\n"
+
+
+async def operations_as_csv(operations) -> AsyncIterator[str]:
+    fields = list(ModelBankAccountOperation.model_fields)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+
+    writer.writerow(fields)
+    async for operation in operations:
+        writer.writerow(operation._mapping[field] for field in fields)
+        yield buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+    yield buffer.getvalue()
+
+
+@bank_account_router.get(
+    "/operations/{bank_account_id}/export",
+    status_code=status.HTTP_200_OK,
+)
+async def export_bank_account_operations(
+    bank_account_id: int,
+    user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
+    export_format: Annotated[Literal["ndjson", "csv"], Query(alias="format")] = "ndjson",
+    date_from: datetime.date | None = None,
+    date_to: datetime.date | None = None,
+) -> StreamingResponse:
+    """Whole history of the bank account, newest first, streamed as it is read from the database"""
+    await check_can_view_operations(sql_session, user, bank_account_id)
+
+    operations = bank_account_repository.stream_bank_account_operations(
+        bank_account_id, date_from, date_to
+    )
+    if export_format == "csv":
+        return StreamingResponse(
+            operations_as_csv(operations),
+            media_type="text/csv",
+            headers={
+                "Content-Disposition": f'attachment; filename="operations_{bank_account_id}.csv"'
+            },
+        )
+
+    return StreamingResponse(
+        operations_as_ndjson(operations), media_type="application/x-ndjson"
+    )
+
+
 @bank_account_router.post(
     "/{bank_account_id}/collection/withdraw",
     status_code=status.HTTP_200_OK,
@@ -249,20 +350,12 @@ async def withdraw_from_collection(
             detail="You are not the owner of this collection",
         )
 
-    available_balance = await sql_bank_account.get_balance(sql_session)
-
     if collection.status == CollectionStatus.BLOCKED:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Cannot withdraw money from blocked collection",
         )
 
-    if available_balance < requestData.amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient funds",
-        )
-
     destination_bank_account_id = None
     payment_description = f"Cashier withdraw to {requestData.account_number}"
     if use_personal_account:
@@ -282,30 +375,60 @@ async def withdraw_from_collection(
         destination_bank_account_id = parent_bank_account.id
         payment_description = "Cashier withdraw to personal account"
 
-    try:
+    account_id = sql_bank_account.id
+    collection_id = collection.id
+
+    async def withdraw_money() -> float:
+        # Collection is locked before balances like in every transaction moving its money
+        if await collection_repository.lock(sql_session, collection_id) == CollectionStatus.BLOCKED:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot withdraw money from blocked collection",
+            )
+        available_balance = (
+            await bank_account_repository.lock_balances(
+                sql_session,
+                [account_id]
+                + ([destination_bank_account_id] if destination_bank_account_id else []),
+            )
+        )[account_id]
+
+        if available_balance < requestData.amount:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient funds",
+            )
+
         sql_session.add(
             SQL.Tables.BankAccountOperation(
                 amount=requestData.amount,
                 title="Money Withdrawal",
                 description=payment_description,
-                source_account_id=sql_bank_account.id,
+                source_account_id=account_id,
                 destination_account_id=destination_bank_account_id,
             )
         )
-        collection.withdrawn_money += requestData.amount
+        # Incremented in the database, so concurrent withdrawals are not lost
+        await sql_session.exec(
+            update(SQL.Tables.Collection)
+            .where(SQL.Tables.Collection.id == collection_id)
+            .values(withdrawn_money=SQL.Tables.Collection.withdrawn_money + requestData.amount)
+        )
         await sql_session.commit()
-    except Exception:
-        await sql_session.rollback()
+        return available_balance - requestData.amount
 
+    try:
+        balance = await SQL.run_with_retry(sql_session, withdraw_money)
+    except HTTPException:
+        raise
+    except Exception:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not withdraw money",
         )
 
-    balance = await sql_bank_account.get_balance(sql_session)
-
     return BankAccountBalance(
-        account_id=sql_bank_account.id,
+        account_id=account_id,
         balance=balance,
     )
 
@@ -364,28 +487,44 @@ async def deposit_to_collection(
             detail="Cannot deposit money to blocked collection",
         )
 
-    available_balance = await parent_bank_account.get_balance(sql_session)
+    source_account_id = parent_bank_account.id
+    destination_account_id = collection.bank_account_id
+    collection_id = collection.id
 
-    if available_balance < requestData.amount:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient funds",
-        )
+    async def deposit_money() -> None:
+        if await collection_repository.lock(sql_session, collection_id) == CollectionStatus.BLOCKED:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot deposit money to blocked collection",
+            )
+        available_balance = (
+            await bank_account_repository.lock_balances(
+                sql_session, [source_account_id, destination_account_id]
+            )
+        )[source_account_id]
+
+        if available_balance < requestData.amount:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient funds",
+            )
 
-    try:
         sql_session.add(
             SQL.Tables.BankAccountOperation(
                 amount=requestData.amount,
                 title="Money Deposit",
                 description="Cashier deposit money to collection account",
-                source_account_id=parent_bank_account.id,
-                destination_account_id=collection.bank_account_id,
+                source_account_id=source_account_id,
+                destination_account_id=destination_account_id,
             )
         )
         await sql_session.commit()
-    except Exception:
-        await sql_session.rollback()
 
+    try:
+        await SQL.run_with_retry(sql_session, deposit_money)
+    except HTTPException:
+        raise
+    except Exception:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Could not deposit money",
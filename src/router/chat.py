@@ -7,8 +7,11 @@ from fastapi import (
     status,
 )
 from typing import Annotated, List
+from bson import ObjectId
 import src.Service.Auth as Auth
 import src.repository.chat_repository as chat_repository
+from src.Service.Chat import membership
+from src.Service.Chat.message_bus import chat_message_bus
 from src.Model.Chat import Message, Conversation, CreateConversation, SendMessage, MarkMessagesReadRequest
 import json
 from datetime import datetime
@@ -16,20 +19,23 @@ from fastapi import logger
 
 chat_router = APIRouter()
 
-active_connections = {}
-
 
 @chat_router.websocket("/ws/{user_id}")
 async def websocket_endpoint(websocket: WebSocket, user_id: int):
     await websocket.accept()
-    active_connections[user_id] = websocket
+    connection = await chat_message_bus.connect(user_id, websocket)
     try:
         while True:
             data = await websocket.receive_text()
             message_data = json.loads(data)
 
-            # Validate user is authorized to send to this conversation
-            # (You would add authentication logic here)
+            # Participants come from the membership cache, so an active conversation is not read from MongoDB
+            participants = await membership.get_participants(message_data["conversation_id"])
+            if participants is None or user_id not in participants:
+                logger.logger.warning(
+                    f"User {user_id} is not a participant of conversation {message_data['conversation_id']}"
+                )
+                continue
 
             # Save message to MongoDB
             message = Message(
@@ -39,32 +45,22 @@ async def websocket_endpoint(websocket: WebSocket, user_id: int):
                 message_type=message_data.get("message_type", "text"),
                 file_url=message_data.get("file_url"),
                 created_at=datetime.utcnow(),
-                read_by=[user_id],
             )
             message_id = await chat_repository.save_message(message)
             message.id = message_id
 
-            # Get conversation to find recipients
-            conversation = await chat_repository.get_conversation(
-                message.conversation_id
+            # Serialized once and sent to all participants, whichever worker they are connected to.
+            # Publishing does not wait for any of the websockets.
+            await chat_message_bus.publish(
+                [participant_id for participant_id in participants if participant_id != user_id],
+                message.model_dump_json(),
             )
-            if conversation:
-                # Send to all active participants
-                for participant_id in conversation.participants:
-                    if (
-                            participant_id != user_id
-                            and participant_id in active_connections
-                    ):
-                        await active_connections[participant_id].send_text(
-                            message.model_dump_json()
-                        )
     except WebSocketDisconnect:
-        if user_id in active_connections:
-            del active_connections[user_id]
+        pass
     except Exception as e:
         logger.logger.error(f"WebSocket error: {str(e)}")
-        if user_id in active_connections:
-            del active_connections[user_id]
+    finally:
+        await chat_message_bus.disconnect(connection)
 
 
 @chat_router.post("/conversations", response_model=Conversation)
@@ -85,6 +81,7 @@ async def create_conversation(
 
         conversation_id = await chat_repository.create_conversation(conversation)
         conversation.id = conversation_id
+        membership.remember_conversation(conversation)
         return conversation
     except Exception as e:
         logger.logger.error(e)
@@ -119,8 +116,7 @@ async def get_conversation_messages(
 ):
     try:
         # Validate user is part of conversation
-        conversation = await chat_repository.get_conversation(conversation_id)
-        if not conversation or user.user_id not in conversation.participants:
+        if not await membership.is_participant(conversation_id, user.user_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="User not authorized to access this conversation",
@@ -150,23 +146,26 @@ async def mark_messages_read(
         request: MarkMessagesReadRequest,
 ):
     try:
-        # Verify user has access to all the messages
-        authorized_message_ids = []
-
-        for message_id in request.message_ids:
-            message = await chat_repository.get_message_by_id(message_id)
-            if not message:
-                continue
-
-            conversation = await chat_repository.get_conversation(message.conversation_id)
-            if conversation and user.user_id in conversation.participants:
-                authorized_message_ids.append(message_id)
+        # Verify user has access to all the messages, unknown ones are skipped.
+        # Conversations of all messages are checked together instead of one message at a time.
+        message_ids = [message_id for message_id in request.message_ids if ObjectId.is_valid(message_id)]
+        messages = (
+            await chat_repository.get_messages_conversations(message_ids) if message_ids else {}
+        )
+        participants_of = await membership.get_participants_of(
+            {conversation_id for conversation_id, _, _ in messages.values()}
+        )
+        authorized_messages = {
+            message_id: (conversation_id, sender_id, seq)
+            for message_id, (conversation_id, sender_id, seq) in messages.items()
+            if user.user_id in participants_of.get(conversation_id, ())
+        }
 
         # Mark only authorized messages as read
         modified_count = 0
-        if authorized_message_ids:
+        if authorized_messages:
             modified_count = await chat_repository.mark_specific_messages_as_read(
-                authorized_message_ids, user.user_id
+                authorized_messages, user.user_id
             )
 
         return {"marked_count": modified_count}
@@ -185,8 +184,7 @@ async def get_unread_message_count(
 ):
     try:
         # Validate user is part of conversation
-        conversation = await chat_repository.get_conversation(conversation_id)
-        if not conversation or user.user_id not in conversation.participants:
+        if not await membership.is_participant(conversation_id, user.user_id):
             raise HTTPException(
                 status_code=status.HTTP_403_FORBIDDEN,
                 detail="User not authorized to access this conversation",
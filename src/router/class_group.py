@@ -223,25 +223,30 @@ async def delete_class_group(
 async def get_class_view(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
     class_group_id: int,
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
     collection_status: CollectionStatusEnum = Query(
         default=CollectionStatusEnum.OPEN,
         description="Status kolekcji: 0=OPEN, 1=FINISHED, 2=NOT_PAID_BEFORE_DEADLINE, 3=CANCELLED",
     ),
 ):
     """Get a specific class view by ID"""
-    class_view_data = await class_view_operations.collect_class_view_data(
-        class_group_id, int(collection_status), user.user_id
-    )
-
-    if not class_view_data["class"]:
+    if (
+        class_with_requester := await class_view_operations.get_class_with_requester(
+            sql_session, class_group_id, user.user_id
+        )
+    ) is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail=f"Class view not found"
         )
 
-    parent_account_ids = [parent["account_id"] for parent in class_view_data["parents"]]
-    if user.user_id not in parent_account_ids and user.user_privilege != ADMIN_USER:
+    class_group, requester = class_with_requester
+    if requester is None and user.user_privilege != ADMIN_USER:
         raise HTTPException(
             status_code=status.HTTP_403_FORBIDDEN,
             detail=f"User not allowed to view this class",
         )
+
+    class_view_data = await class_view_operations.collect_class_view_data(
+        sql_session, class_group, int(collection_status), requester
+    )
     return class_view_data
@@ -1,7 +1,13 @@
 from datetime import date, datetime
 from typing import Annotated, List, Optional, Sequence
 from fastapi import APIRouter, Depends, HTTPException, Query, status, logger
-from src.Model.CollectionModel import CreateCollection, UpdateCollection
+from sqlmodel import case
+from src.Model.CollectionModel import (
+    CreateCollection,
+    UpdateCollection,
+    PayForChildren,
+    ChildPaymentResult,
+)
 import src.SQL as SQL
 import src.SQL.Enum.CollectionStatus as CollectionStatus
 from src.SQL.Enum import CollectionOperationType
@@ -13,11 +19,10 @@ from src.Service import Auth
 from src.Service.Collection import collection_service
 from src.repository import (
     collection_repository,
-    child_repository,
     bank_account_repository,
     parent_repository,
 )
-from src.repository.collection_repository import gather_collection_view_data
+from src.repository.collection_repository import get_collection_view
 from src.Service.Collection.collection_validator import (
     check_if_user_can_view_collection,
 )
@@ -144,31 +149,9 @@ async def collection_view(
     ):
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
     try:
-        collection_data = await gather_collection_view_data(collection_id, user)
-
-        requester = (
-            await sql_session.exec(
-                SQL.select(Parent.id, Parent.name, Parent.surname, ParentGroupRole.role)
-                .select_from(Collection)
-                .join(
-                    ParentGroupRole,
-                    ParentGroupRole.class_group_id == Collection.class_group_id,
-                )
-                .join(Parent, Parent.id == ParentGroupRole.parent_id)
-                .filter(
-                    Parent.account_id == user.user_id,
-                    Collection.id == collection_id,
-                )
-            )
-        ).first()
-
-        if requester:
-            collection_data["requester"] = {
-                "parent_id": requester[0],
-                "name": requester[1],
-                "surname": requester[2],
-                "role": requester[3],
-            }
+        collection_data = await get_collection_view(
+            sql_session, collection_id, user.user_id
+        )
     except Exception as e:
         logger.logger.error(f"Error retrieving collection view: {e}")
         raise HTTPException(
@@ -176,9 +159,31 @@ async def collection_view(
             detail="Failed to retrieve collection view",
         )
 
+    if collection_data is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Collection not found",
+        )
+
     return collection_data
 
 
+@collection_router.put(
+    "/{collection_id}/pay",
+    status_code=status.HTTP_200_OK,
+    response_model=list[ChildPaymentResult],
+)
+async def pay_for_children(
+    user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
+    collection_id: int,
+    request: PayForChildren,
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
+) -> list[ChildPaymentResult]:
+    return await collection_service.pay_for_children(
+        sql_session, user, collection_id, request.child_ids
+    )
+
+
 @collection_router.put(
     "/{collection_id}/pay/{child_id}",
     status_code=status.HTTP_204_NO_CONTENT,
@@ -189,61 +194,14 @@ async def pay(
     child_id: int,
     sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ) -> None:
-    bank_account: SQL.Tables.BankAccount = (
-        await sql_session.exec(
-            SQL.select(SQL.Tables.BankAccount)
-            .join(SQL.Tables.Parent)
-            .where(SQL.Tables.Parent.account_id == user.user_id)
-        )
-    ).first()
-
-    collection: SQL.Tables.Collection = (
-        await sql_session.exec(
-            SQL.select(SQL.Tables.Collection).where(
-                SQL.Tables.Collection.id == collection_id
-            )
-        )
-    ).first()
-
-    if collection.status != CollectionStatus.OPEN:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Cannot pay for a collection with a status other than OPEN",
-        )
-
-    child: SQL.Tables.Child = await child_repository.get_by_id(sql_session, child_id)
-
-    if collection.price > (await bank_account.get_balance(sql_session)):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient funds",
-        )
-    payment = SQL.Tables.BankAccountOperation(
-        amount=collection.price,
-        title=f"Collection Payment - {collection.name}",
-        description=f"Payment for child {child.name} {child.surname}",
-        source_account_id=bank_account.id,
-        destination_account_id=collection.bank_account_id,
+    (result,) = await collection_service.pay_for_children(
+        sql_session, user, collection_id, [child_id]
     )
-    try:
-        sql_session.add(payment)
-        await sql_session.commit()
-        await sql_session.refresh(payment)
-        sql_session.add(
-            SQL.Tables.CollectionOperation(
-                child_id=child_id,
-                collection_id=collection_id,
-                operation_type=CollectionOperationType.PAY,
-                requester_id=user.user_id,
-                payment_id=payment.operation_id,
-            )
-        )
-        await sql_session.commit()
-    except Exception:
-        await sql_session.rollback()
+
+    if not result.paid:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to pay for child",
+            detail=result.detail,
         )
 
 
@@ -286,6 +244,8 @@ async def unsubscribe(
         )
 
     try:
+        # Operations bump report_version of the collection, its row is locked first like in payments
+        await collection_repository.lock(sql_session, collection_id)
         sql_session.add(
             SQL.Tables.CollectionOperation(
                 child_id=child_id,
@@ -359,6 +319,7 @@ async def restore(
         )
 
     try:
+        await collection_repository.lock(sql_session, collection_id)
         await sql_session.delete(entry_to_delete)
         await sql_session.commit()
     except Exception:
@@ -424,22 +385,6 @@ async def refund(
             detail="No operation to restore found",
         )
 
-    collection_bank_account: SQL.Tables.BankAccount = (
-        await sql_session.exec(
-            SQL.select(SQL.Tables.BankAccount).where(
-                SQL.Tables.BankAccount.id == collection.bank_account_id
-            )
-        )
-    ).first()
-
-    available_collection_funds = await collection_bank_account.get_balance(sql_session)
-
-    if available_collection_funds < collection.price:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient funds in the collection account",
-        )
-
     # Parent who is responsible for the child, might be different from the one who paid
     # Find the parent who paid for the child to refund to them
     parent: SQL.Tables.Parent = (
@@ -462,25 +407,82 @@ async def refund(
         )
     ).first()
 
-    payment = SQL.Tables.BankAccountOperation(
-        amount=collection.price,
-        title=f"Collection refund - {collection.name}",
-        description=f"Refund collection payment for child {child.name} {child.surname}",
-        source_account_id=collection.bank_account_id,
-        destination_account_id=parent.account_id,
+    collection_account_id = collection.bank_account_id
+    destination_account_id = parent.bank_account_id
+    price = collection.price
+    payment_title = f"Collection refund - {collection.name}"
+    payment_description = (
+        f"Refund collection payment for child {child.name} {child.surname}"
     )
 
-    try:
-        sql_session.add(payment)
-        await sql_session.commit()
-        await sql_session.refresh(payment)
-        operation.operation_type = CollectionOperationType.REFUND
-        operation.operation_date = datetime.now()
-        operation.requester_id = user.user_id
-        operation.payment_id = payment.operation_id
+    async def refund_payment() -> None:
+        # Checked again under the collection lock, so the payment can be refunded only once
+        # and not after the collection was cancelled in the meantime
+        if await collection_repository.lock(sql_session, collection_id) != CollectionStatus.OPEN:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot withdraw from a collection with a status other than OPEN",
+            )
+        if not (
+            await sql_session.exec(
+                SQL.select(SQL.Tables.CollectionOperation.child_id)
+                .where(
+                    SQL.Tables.CollectionOperation.child_id == child_id,
+                    SQL.Tables.CollectionOperation.collection_id == collection_id,
+                    SQL.Tables.CollectionOperation.operation_type
+                    == CollectionOperationType.PAY,
+                )
+                .with_for_update()
+            )
+        ).first():
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="Payment has already been refunded",
+            )
+
+        available_collection_funds = (
+            await bank_account_repository.lock_balances(
+                sql_session, [collection_account_id, destination_account_id]
+            )
+        )[collection_account_id]
+
+        if available_collection_funds < price:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient funds in the collection account",
+            )
+
+        payment = SQL.Tables.BankAccountOperation(
+            amount=price,
+            title=payment_title,
+            description=payment_description,
+            source_account_id=collection_account_id,
+            destination_account_id=destination_account_id,
+        )
+        await bank_account_repository.insert_operations(sql_session, [payment])
+        # update is also the name of an endpoint of this router, so the statement is used as SQL.update
+        await sql_session.exec(
+            SQL.update(SQL.Tables.CollectionOperation)
+            .where(
+                SQL.Tables.CollectionOperation.child_id == child_id,
+                SQL.Tables.CollectionOperation.collection_id == collection_id,
+                SQL.Tables.CollectionOperation.operation_type
+                == CollectionOperationType.PAY,
+            )
+            .values(
+                operation_type=CollectionOperationType.REFUND,
+                operation_date=datetime.now(),
+                requester_id=user.user_id,
+                payment_id=payment.operation_id,
+            )
+        )
         await sql_session.commit()
+
+    try:
+        await SQL.run_with_retry(sql_session, refund_payment)
+    except HTTPException:
+        raise
     except Exception:
-        await sql_session.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Failed to restore child",
@@ -541,120 +543,128 @@ async def cancel_collection(
             detail="Cannot cancel collection with a status other than OPEN",
         )
 
-    payments_to_returns: list[SQL.Tables.CollectionOperation] = (
-        await sql_session.exec(
-            SQL.select(
-                SQL.Tables.Child.id.label("child_id"),
-                SQL.Tables.Child.name.label("child_name"),
-                SQL.Tables.Child.surname.label("child_surname"),
-                SQL.Tables.BankAccountOperation.source_account_id.label(
-                    "source_account_id"
-                ),
-                SQL.Tables.BankAccountOperation.operation_date.label("operation_date"),
+    collection_account_id = collection.bank_account_id
+    cashier_account_id = parent_profile.bank_account_id
+    price = collection.price
+    refund_title = f"Cancelled collection refund - {collection.name}"
+
+    async def cancel() -> None:
+        # Payments are read under the collection lock, so none can be committed after they were read
+        if await collection_repository.lock(sql_session, collection_id) != CollectionStatus.OPEN:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cannot cancel collection with a status other than OPEN",
             )
-            .select_from(SQL.Tables.CollectionOperation)
-            .join(SQL.Tables.Child)
-            .join(SQL.Tables.BankAccountOperation)
-            .where(
-                SQL.Tables.CollectionOperation.collection_id == collection_id,
-                SQL.Tables.CollectionOperation.operation_type
-                == CollectionOperationType.PAY,
+        payments_to_returns = (
+            await sql_session.exec(
+                SQL.select(
+                    SQL.Tables.Child.id.label("child_id"),
+                    SQL.Tables.Child.name.label("child_name"),
+                    SQL.Tables.Child.surname.label("child_surname"),
+                    SQL.Tables.BankAccountOperation.source_account_id.label(
+                        "source_account_id"
+                    ),
+                    SQL.Tables.BankAccountOperation.operation_date.label("operation_date"),
+                )
+                .select_from(SQL.Tables.CollectionOperation)
+                .join(SQL.Tables.Child)
+                .join(SQL.Tables.BankAccountOperation)
+                .where(
+                    SQL.Tables.CollectionOperation.collection_id == collection_id,
+                    SQL.Tables.CollectionOperation.operation_type
+                    == CollectionOperationType.PAY,
+                )
             )
-        )
-    ).all()
-
-    collection_bank_account: SQL.Tables.BankAccount = (
-        await sql_session.exec(
-            SQL.select(SQL.Tables.BankAccount).where(
-                SQL.Tables.BankAccount.id == collection.bank_account_id
+        ).all()
+        refunded_money = price * len(payments_to_returns)
+
+        available_collection_funds = (
+            await bank_account_repository.lock_balances(
+                sql_session,
+                [collection_account_id, cashier_account_id]
+                + [payment.source_account_id for payment in payments_to_returns],
             )
-        )
-    ).first()
-
-    available_collection_funds = await collection_bank_account.get_balance(sql_session)
+        )[collection_account_id]
 
-    if available_collection_funds < collection.price * len(payments_to_returns):
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Insufficient funds in the collection account to proceed cancellation",
-        )
-
-    child_status: list[SQL.Tables.CollectionOperation] = (
-        await sql_session.exec(
-            SQL.select(SQL.Tables.CollectionOperation).where(
-                SQL.Tables.CollectionOperation.collection_id == collection_id
+        if available_collection_funds < refunded_money:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Insufficient funds in the collection account to proceed cancellation",
             )
-        )
-    ).all()
-
-    # key is child_id, value is payment_id
-    payment_id_helper: dict[int, int] = {}
 
-    try:
-        for payment in payments_to_returns:
-            refund_payment = SQL.Tables.BankAccountOperation(
-                amount=collection.price,
-                title=f"Cancelled collection refund - {collection.name}",
+        refund_payments = [
+            BankAccountOperation(
+                amount=price,
+                title=refund_title,
                 description=f"Cancelled collection refund for child {payment.child_name} {payment.child_surname}",
-                source_account_id=collection.bank_account_id,
+                source_account_id=collection_account_id,
                 destination_account_id=payment.source_account_id,
             )
+            for payment in payments_to_returns
+        ]
+
+        # Money which is left after refunds comes from cashier deposits, so it goes back to the cashier
+        collection_money_after_refunds = available_collection_funds - refunded_money
+        cashier_refund = []
+        if collection_money_after_refunds > 0:
+            cashier_refund.append(
+                BankAccountOperation(
+                    amount=collection_money_after_refunds,
+                    title=refund_title,
+                    description="Refund cashier deposits",
+                    source_account_id=collection_account_id,
+                    destination_account_id=cashier_account_id,
+                )
+            )
 
-            sql_session.add(refund_payment)
-            await sql_session.commit()
-            await sql_session.refresh(refund_payment)
-            payment_id_helper[payment.child_id] = refund_payment.operation_id
-
-        for i in range(len(child_status)):
-            if refund_payment_id_to_set := payment_id_helper.get(
-                child_status[i].child_id, None
-            ):
-                child_status[i].payment_id = refund_payment_id_to_set
-
-            child_status[i].operation_type = CollectionOperationType.REFUND
-
-        await sql_session.commit()
-    except Exception:
-        await sql_session.rollback()
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Failed to process refund payment",
+        # Refunds, status change and the cashier refund are committed together or not at all
+        await bank_account_repository.insert_operations(
+            sql_session, refund_payments + cashier_refund
         )
 
-    collection.status = CollectionStatus.CANCELLED
+        refund_payment_ids = {
+            payment.child_id: refund_payment.operation_id
+            for payment, refund_payment in zip(payments_to_returns, refund_payments)
+        }
+        await sql_session.exec(
+            SQL.update(SQL.Tables.CollectionOperation)
+            .where(
+                SQL.Tables.CollectionOperation.collection_id == collection_id,
+                SQL.Tables.CollectionOperation.operation_type
+                == CollectionOperationType.PAY,
+            )
+            .values(
+                operation_type=CollectionOperationType.REFUND,
+                payment_id=(
+                    case(
+                        refund_payment_ids,
+                        value=SQL.Tables.CollectionOperation.child_id,
+                        else_=SQL.Tables.CollectionOperation.payment_id,
+                    )
+                    if refund_payment_ids
+                    else SQL.Tables.CollectionOperation.payment_id
+                ),
+            )
+            # Operations of the collection are not loaded into the session
+            .execution_options(synchronize_session=False)
+        )
+        await sql_session.exec(
+            SQL.update(SQL.Tables.Collection)
+            .where(SQL.Tables.Collection.id == collection_id)
+            .values(status=CollectionStatus.CANCELLED)
+        )
+        await sql_session.commit()
 
     try:
-        await sql_session.commit()
+        await SQL.run_with_retry(sql_session, cancel)
+    except HTTPException:
+        raise
     except Exception:
-        await sql_session.rollback()
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Could not cancel collection",
-        )
-
-    collection_money_after_refunds = await collection_bank_account.get_balance(
-        sql_session
-    )
-
-    if collection_money_after_refunds > 0:
-        collection_bank_account_operation = BankAccountOperation(
-            amount=collection_money_after_refunds,
-            title=f"Cancelled collection refund - {collection.name}",
-            description="Refund cashier deposits",
-            source_account_id=collection.bank_account_id,
-            destination_account_id=parent_profile.bank_account_id,
+            detail="Failed to process refund payment",
         )
 
-        try:
-            sql_session.add(collection_bank_account_operation)
-            await sql_session.commit()
-        except Exception:
-            await sql_session.rollback()
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST,
-                detail="Failed to process refund payment",
-            )
-
 
 @collection_router.put("/{collection_id}/block", status_code=status.HTTP_204_NO_CONTENT)
 async def block_collection(
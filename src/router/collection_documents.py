@@ -1,30 +1,89 @@
 import base64
 import binascii
-import urllib
-from typing import Annotated, List
+from pathlib import PurePath
+from typing import Annotated, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status, logger
-from fastapi.responses import Response
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Request, status, logger
+from pydantic import ValidationError
+from sqlalchemy.exc import IntegrityError
 
 from src.Model.CollectionDocument import CollectionDocument, CreateCollectionDocument, CreateCollectionDocumentDB, \
     CollectionDocumentMetadata
 
+import src.config as config
 import src.SQL as SQL
+from src.BlobStore import BlobTooLarge
 from src.SQL.Enum.Privilege import ADMIN_USER
 
 from src.Service import Auth
 from src.repository import collection_documents_repository
 from src.Service.Collection.collection_validator import check_if_user_can_view_collection
+from src.Service.CollectionDocuments import download, preview, upload
 
 collection_documents_router = APIRouter()
 
 
-@collection_documents_router.post(path="/", status_code=status.HTTP_201_CREATED,
+@collection_documents_router.post(path="/upload", status_code=status.HTTP_201_CREATED,
                                   response_model=CollectionDocumentMetadata)
+async def upload_collection_document(
+        user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
+        sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
+        request: Request,
+        background_tasks: BackgroundTasks,
+        collection_id: int,
+        document_name: Optional[str] = None,
+):
+    """
+        Uploads the document sent as the `file` field of a multipart/form-data body.
+
+        The file is streamed to storage as it arrives, so its size is limited only by DOCUMENT_MAX_SIZE.
+        If document_name is not given, the name of the uploaded file is used.
+    """
+    if not await check_if_user_can_view_collection(sql_session, collection_id,
+                                                   user.user_id) and user.user_privilege != ADMIN_USER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+    # The check began a transaction, it must not stay open while the file is received
+    await sql_session.rollback()
+
+    try:
+        uploaded_document = await upload.receive_document(request)
+    except BlobTooLarge:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                            detail=f"File is larger than {config.DOCUMENT_MAX_SIZE} bytes")
+
+    try:
+        result = await collection_documents_repository.insert(sql_session, SQL.Tables.CollectionDocuments(
+            collection_id=collection_id,
+            document_name=document_name or PurePath(uploaded_document.filename).stem,
+            file_type=uploaded_document.file_type,
+            content_hash=uploaded_document.content_hash,
+            file_size=uploaded_document.file_size,
+        ))
+        background_tasks.add_task(preview.generate_preview, result.document_id)
+
+        return CollectionDocumentMetadata(
+            document_id=result.document_id,
+            collection_id=result.collection_id,
+            document_name=result.document_name,
+            file_type=result.file_type,
+            content_hash=result.content_hash,
+            preview_hash=result.preview_hash
+        )
+    except (ValidationError, IntegrityError) as error:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
+    except Exception as error:
+        logger.logger.error(error)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+# Files sent as base64 in JSON take a third more bandwidth and are held in memory, /upload streams them instead
+@collection_documents_router.post(path="/", status_code=status.HTTP_201_CREATED,
+                                  response_model=CollectionDocumentMetadata, deprecated=True)
 async def create_collection_document(
         user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
         sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
         collection_document: CreateCollectionDocument,
+        background_tasks: BackgroundTasks,
 ):
     if not await check_if_user_can_view_collection(sql_session, collection_document.collection_id,
                                                    user.user_id) and user.user_privilege != ADMIN_USER:
@@ -44,12 +103,15 @@ async def create_collection_document(
         )
 
         result = await collection_documents_repository.create(sql_session, document_data)
+        background_tasks.add_task(preview.generate_preview, result.document_id)
 
         return CollectionDocumentMetadata(
             document_id=result.document_id,
             collection_id=result.collection_id,
             document_name=result.document_name,
-            file_type=result.file_type
+            file_type=result.file_type,
+            content_hash=result.content_hash,
+            preview_hash=result.preview_hash
         )
     except Exception as error:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(error))
@@ -60,6 +122,7 @@ async def update_collection_document(
         user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
         sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
         collection_document: CollectionDocument,
+        background_tasks: BackgroundTasks,
 ):
     if not await check_if_user_can_view_collection(sql_session, collection_document.collection_id,
                                                    user.user_id) and user.user_privilege != ADMIN_USER:
@@ -67,12 +130,16 @@ async def update_collection_document(
 
     try:
         document = await collection_documents_repository.update(sql_session, collection_document)
+        if collection_document.file_data is not None:
+            background_tasks.add_task(preview.generate_preview, document.document_id)
 
         return CollectionDocumentMetadata(
             document_id=document.document_id,
             collection_id=document.collection_id,
             document_name=document.document_name,
-            file_type=document.file_type
+            file_type=document.file_type,
+            content_hash=document.content_hash,
+            preview_hash=document.preview_hash
         )
     except HTTPException as error:
         raise error
@@ -94,7 +161,9 @@ async def delete_collection_document(
             document_id=deleted_document.document_id,
             collection_id=deleted_document.collection_id,
             document_name=deleted_document.document_name,
-            file_type=deleted_document.file_type
+            file_type=deleted_document.file_type,
+            content_hash=deleted_document.content_hash,
+            preview_hash=deleted_document.preview_hash
         )
     except HTTPException as error:
         raise error
@@ -123,7 +192,9 @@ async def get_document_by_id(
             document_id=document.document_id,
             collection_id=document.collection_id,
             document_name=document.document_name,
-            file_type=document.file_type
+            file_type=document.file_type,
+            content_hash=document.content_hash,
+            preview_hash=document.preview_hash
         )
     except Exception as e:
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
@@ -151,11 +222,26 @@ async def get_collection_documents(
         raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+async def get_viewable_document(sql_session: SQL.AsyncSession, user: Auth.AuthorizedUser,
+                                document_id: int) -> SQL.Tables.CollectionDocuments:
+    document = await collection_documents_repository.get_by_id(sql_session, document_id)
+
+    if not document:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
+
+    if not await check_if_user_can_view_collection(sql_session, document.collection_id,
+                                                   user.user_id) and user.user_privilege != ADMIN_USER:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+
+    return document
+
+
 # Nowy endpoint do pobierania zawartości pliku
 @collection_documents_router.get(path="/{document_id}/content", status_code=status.HTTP_200_OK)
 async def get_document_content(
         user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
         sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
+        request: Request,
         document_id: int,
 ):
     """
@@ -163,40 +249,93 @@ async def get_document_content(
 
         It returns the file in naive format such as PDF, JPEG, PNG, etc.
         Content-type is automatically assigned depending on the file type.
+        Supports If-None-Match with the returned ETag and a single byte Range.
     """
     try:
-        document = await collection_documents_repository.get_by_id(sql_session, document_id)
+        document = await get_viewable_document(sql_session, user, document_id)
+        return await download.content_response(request, document, download.REVALIDATED_CACHE_CONTROL)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.logger.error(e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
 
-        if not document:
-            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document not found")
 
-        if not await check_if_user_can_view_collection(sql_session, document.collection_id,
-                                                       user.user_id) and user.user_privilege != ADMIN_USER:
-            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN)
+@collection_documents_router.get(path="/{document_id}/content/{content_hash}", status_code=status.HTTP_200_OK)
+async def get_document_content_by_hash(
+        user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
+        sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
+        request: Request,
+        document_id: int,
+        content_hash: str,
+):
+    """
+        Same as /{document_id}/content, for the content_hash from the document metadata.
 
-        mime_types = {
-            "pdf": "application/pdf",
-            "jpg": "image/jpeg",
-            "jpeg": "image/jpeg",
-            "png": "image/png",
-            "gif": "image/gif",
-            "doc": "application/msword",
-            "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document",
-            "xls": "application/vnd.ms-excel",
-            "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
-        }
-
-        media_type = mime_types.get(document.file_type.lower(), "application/octet-stream")
-        encoded_filename = urllib.parse.quote(f"{document.document_name}.{document.file_type}")
-
-        return Response(
-            content=document.file_data,
-            media_type=media_type,
-            headers={
-                "Content-Disposition": f'attachment; filename="{encoded_filename}"',
-                "Content-Disposition": f"attachment; filename*=UTF-8''{encoded_filename}"
-            }
-        )
+        Content under this URL never changes, so browsers keep it in cache without asking again.
+    """
+    try:
+        document = await get_viewable_document(sql_session, user, document_id)
+
+        if document.content_hash != content_hash:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document content has changed")
+
+        return await download.content_response(request, document, download.IMMUTABLE_CACHE_CONTROL)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.logger.error(e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@collection_documents_router.get(path="/{document_id}/preview", status_code=status.HTTP_200_OK)
+async def get_document_preview(
+        user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
+        sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
+        request: Request,
+        document_id: int,
+):
+    """
+        Returns a small JPEG preview of an image or the first page of a PDF.
+
+        Previews are rendered after upload, until then or for other file types 404 is returned.
+    """
+    try:
+        document = await get_viewable_document(sql_session, user, document_id)
+
+        if document.preview_hash is None:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Preview not available")
+
+        return await download.preview_response(request, document.preview_hash, download.REVALIDATED_CACHE_CONTROL)
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.logger.error(e)
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
+
+
+@collection_documents_router.get(path="/{document_id}/preview/{preview_hash}", status_code=status.HTTP_200_OK)
+async def get_document_preview_by_hash(
+        user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
+        sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
+        request: Request,
+        document_id: int,
+        preview_hash: str,
+):
+    """
+        Same as /{document_id}/preview, for the preview_hash from the document metadata.
+
+        Previews under this URL never change, so browsers keep them in cache without asking again.
+    """
+    try:
+        document = await get_viewable_document(sql_session, user, document_id)
+
+        if document.preview_hash != preview_hash:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Document preview has changed")
+
+        return await download.preview_response(request, preview_hash, download.IMMUTABLE_CACHE_CONTROL)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.logger.error(e)
-        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=status.HTTP_500_INTERNAL_SERVER_ERROR, detail=str(e))
@@ -0,0 +1,29 @@
+from typing import Annotated
+from fastapi import APIRouter, Depends, status
+import src.SQL as SQL
+from src.SQL.Enum.Privilege import ADMIN_USER
+from src.Service import Auth
+from src.Service.Auth.password_hashing import password_hasher
+from src.Service.Collection.financial_report import financial_report_cache
+from src.Service.Chat.membership import conversation_participants_cache
+from src.Service.Chat.message_bus import chat_message_bus
+
+metrics_router = APIRouter()
+
+
+@metrics_router.get("", status_code=status.HTTP_200_OK)
+async def get_metrics(
+    user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user(ADMIN_USER))],
+) -> dict:
+    """
+    Returns runtime metrics of the worker which handled the request.
+    """
+    return {
+        "access_token_cache": Auth.access_token_cache.stats(),
+        "password_hasher": password_hasher.stats(),
+        "sql_pool": SQL.pool_metrics.stats(),
+        "transactions": SQL.transaction_metrics.stats(),
+        "financial_report_cache": financial_report_cache.stats(),
+        "chat": chat_message_bus.stats(),
+        "chat_membership_cache": conversation_participants_cache.stats(),
+    }
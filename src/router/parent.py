@@ -18,7 +18,7 @@ parent_router = APIRouter()
 @parent_router.post("/", response_model=SQL.Tables.People.Parent)
 async def create(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
     parent_entry: ParentModel,
 ) -> SQL.Tables.People.Parent:
     parent_entry.is_valid_number()
@@ -50,7 +50,7 @@ async def create(
 @parent_router.put("/", response_model=SQL.Tables.People.Parent)
 async def update(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
     parent_entry: ParentModel,
 ) -> SQL.Tables.People.Parent:
     parent_entry.is_valid_number()
@@ -77,7 +77,7 @@ async def update(
 @parent_router.get("/", response_model=List[Parent])
 async def get(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user(ADMIN_USER))],
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ) -> Sequence[Parent]:
     try:
         return await parent_repository.get_all(sql_session)
@@ -91,7 +91,7 @@ async def get(
 @parent_router.get("/all_basic_info", response_model=List[ParentBasicInfo])
 async def get_all_basic_info(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ) -> List[ParentBasicInfo]:
     try:
         return await parent_repository.get_all_basic_info(sql_session)
@@ -105,7 +105,7 @@ async def get_all_basic_info(
 @parent_router.get("/user", response_model=SQL.Tables.People.Parent)
 async def get_by_logged_user(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ) -> SQL.Tables.People.Parent:
     try:
         return await parent_repository.get_by_user_account(sql_session, user.user_id)
@@ -121,7 +121,7 @@ async def get_by_logged_user(
 async def update_logged_user_profile(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
     parent_profile: UserModel.UpdateParentProfile,
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ):
     try:
         updated_profile = SQL.Tables.Parent(**parent_profile.model_dump())
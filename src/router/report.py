@@ -1,9 +1,10 @@
 from fastapi import APIRouter, logger
+from sqlmodel import func
 import src.SQL as SQL
-from src.SQL.Enum import CollectionOperationType
 from src.Model.UserAccountPrivilegeEnum import UserAccountPrivilegeEnum
 from src.Service import Auth
 from src.repository import collection_repository
+from src.Service.Collection import financial_report
 from datetime import date
 from typing import Annotated
 from fastapi import Depends, HTTPException, status
@@ -21,8 +22,9 @@ async def generate_financial_report(
         sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ):
     try:
-        collection = await collection_repository.get_by_id(sql_session, collection_id)
-        if not collection:
+        if (
+            collection := await collection_repository.get_by_id(sql_session, collection_id)
+        ) is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Collection with ID {collection_id} not found",
@@ -43,93 +45,9 @@ async def generate_financial_report(
                 detail="Not authorized to access this collection's data",
             )
 
-        children_data = await collection_repository.get_list_of_children_for_collection(
-            session=sql_session, collection_id=collection_id
+        return await financial_report.get_collection_financial_report(
+            sql_session, collection
         )
-
-        # Get payment operations
-        payment_query = SQL.select(SQL.Tables.CollectionOperation).where(
-            SQL.Tables.CollectionOperation.collection_id == collection_id,
-            SQL.Tables.CollectionOperation.operation_type == CollectionOperationType.PAY,
-        )
-        payment_result = await sql_session.exec(payment_query)
-        payment_operations = payment_result.all()
-
-        # Get unsubscribe operations
-        unsubscribe_query = SQL.select(SQL.Tables.CollectionOperation).where(
-            SQL.Tables.CollectionOperation.collection_id == collection_id,
-            SQL.Tables.CollectionOperation.operation_type == CollectionOperationType.DISCHARGE,
-        )
-        unsubscribe_result = await sql_session.exec(unsubscribe_query)
-        unsubscribe_operations = unsubscribe_result.all()
-
-        # Get refund operations
-        refund_query = SQL.select(SQL.Tables.CollectionOperation).where(
-            SQL.Tables.CollectionOperation.collection_id == collection_id,
-            SQL.Tables.CollectionOperation.operation_type == CollectionOperationType.REFUND,
-        )
-        refund_result = await sql_session.exec(refund_query)
-        refund_operations = refund_result.all()
-
-        paid_child_ids = {op.child_id for op in payment_operations}
-        unsubscribed_child_ids = {op.child_id for op in unsubscribe_operations}
-        refunded_child_ids = {op.child_id for op in refund_operations}
-
-        # Create a set of all excluded children (unsubscribed or refunded)
-        excluded_child_ids = unsubscribed_child_ids.union(refunded_child_ids)
-
-        paid_children = []
-        unpaid_children = []
-
-        for child in children_data:
-            # Skip unsubscribed and refunded children
-            if child.child_id in excluded_child_ids:
-                continue
-
-            child_info = {
-                "child_id": child.child_id,
-                "child_name": child.child_name,
-                "child_surname": child.child_surname,
-            }
-
-            if child.child_id in paid_child_ids:
-                paid_children.append(child_info)
-            else:
-                unpaid_children.append(child_info)
-
-        # Count only children who are not excluded (unsubscribed or refunded)
-        active_children_count = len(children_data) - len(excluded_child_ids)
-        total_expected = collection.price * active_children_count
-        total_collected = collection.price * len(paid_children)
-
-        financial_report = {
-            "collection_info": {
-                "id": collection.id,
-                "name": collection.name,
-                "description": collection.description,
-                "start_date": collection.start_date.isoformat(),
-                "end_date": (
-                    collection.end_date.isoformat() if collection.end_date else None
-                ),
-                "price_per_child": collection.price,
-                "status": collection.status,
-            },
-            "financial_summary": {
-                "total_children": active_children_count,
-                "paid_children_count": len(paid_children),
-                "unpaid_children_count": len(unpaid_children),
-                "total_expected": total_expected,
-                "total_collected": total_collected,
-                "outstanding_amount": total_expected - total_collected,
-                "withdrawn_money": collection.withdrawn_money,
-                "available_balance": total_collected - collection.withdrawn_money if total_collected - collection.withdrawn_money >= 0 else 0,
-            },
-            "paid_children": paid_children,
-            "unpaid_children": unpaid_children,
-            "generated_date": date.today().isoformat(),
-        }
-
-        return financial_report
     except HTTPException:
         raise
     except Exception as e:
@@ -147,30 +65,26 @@ async def generate_class_financial_report(
         sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ):
     try:
-        query = SQL.select(SQL.Tables.Collection).where(
-            SQL.Tables.Collection.class_group_id == class_id
-        )
-        result = await sql_session.exec(query)
-        collections = result.all()
-
-        class_query = SQL.select(SQL.Tables.ClassGroup).where(
-            SQL.Tables.ClassGroup.id == class_id
-        )
-        class_result = await sql_session.exec(class_query)
-        class_data = class_result.first()
-
-        if not class_data:
+        class_query = SQL.select(
+            SQL.Tables.ClassGroup,
+            SQL.select(func.count())
+            .select_from(SQL.Tables.Child)
+            .where(SQL.Tables.Child.group_id == class_id)
+            .scalar_subquery()
+            .label("children_count"),
+        ).where(SQL.Tables.ClassGroup.id == class_id)
+        class_result = (await sql_session.exec(class_query)).first()
+
+        if not class_result:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail=f"Class with ID {class_id} not found"
             )
+        class_data, children_count = class_result
 
-        # Get all children in the class
-        children_query = SQL.select(SQL.Tables.Child).where(
-            SQL.Tables.Child.group_id == class_id
+        collections = await collection_repository.get_with_operation_counts_for_class(
+            sql_session, class_id
         )
-        children_result = await sql_session.exec(children_query)
-        children = children_result.all()
 
         # Initialize report data
         collections_summary = []
@@ -179,46 +93,13 @@ async def generate_class_financial_report(
         total_withdrawn = 0
 
         # Process each collection
-        for collection in collections:
-            # Get payment operations for this collection
-            payment_query = SQL.select(SQL.Tables.CollectionOperation).where(
-                SQL.Tables.CollectionOperation.collection_id == collection.id,
-                SQL.Tables.CollectionOperation.operation_type == CollectionOperationType.PAY,
-            )
-            payment_result = await sql_session.exec(payment_query)
-            payments = payment_result.all()
-
-            # Get unsubscribe operations
-            unsubscribe_query = SQL.select(SQL.Tables.CollectionOperation).where(
-                SQL.Tables.CollectionOperation.collection_id == collection.id,
-                SQL.Tables.CollectionOperation.operation_type == CollectionOperationType.DISCHARGE,
-            )
-            unsubscribe_result = await sql_session.exec(unsubscribe_query)
-            unsubscribe_operations = unsubscribe_result.all()
-
-            # Get refund operations
-            refund_query = SQL.select(SQL.Tables.CollectionOperation).where(
-                SQL.Tables.CollectionOperation.collection_id == collection.id,
-                SQL.Tables.CollectionOperation.operation_type == CollectionOperationType.REFUND,
-            )
-            refund_result = await sql_session.exec(refund_query)
-            refund_operations = refund_result.all()
-
-            # Create sets of child IDs
-            paid_child_ids = {op.child_id for op in payments}
-            unsubscribed_child_ids = {op.child_id for op in unsubscribe_operations}
-            refunded_child_ids = {op.child_id for op in refund_operations}
-
-            # Calculate excluded children (unsubscribed or refunded)
-            excluded_child_ids = unsubscribed_child_ids.union(refunded_child_ids)
-            active_children_count = len(children) - len(excluded_child_ids)
-
-            # Count actual paid children (excluding those with refunds)
-            valid_paid_count = len([child_id for child_id in paid_child_ids if child_id not in excluded_child_ids])
+        for collection, paid_count, excluded_count in collections:
+            # Unsubscribed and refunded children are excluded, they cannot have a payment at the same time
+            active_children_count = children_count - excluded_count
 
             # Calculate collection-specific totals
             expected_amount = collection.price * active_children_count
-            collected_amount = collection.price * valid_paid_count
+            collected_amount = collection.price * paid_count
 
             # Add to overall totals
             total_expected += expected_amount
@@ -234,8 +115,8 @@ async def generate_class_financial_report(
                 "price_per_child": collection.price,
                 "status": collection.status,
                 "total_children": active_children_count,
-                "paid_children": valid_paid_count,
-                "unpaid_children": active_children_count - valid_paid_count,
+                "paid_children": paid_count,
+                "unpaid_children": active_children_count - paid_count,
                 "expected_amount": expected_amount,
                 "collected_amount": collected_amount,
                 "outstanding_amount": expected_amount - collected_amount,
@@ -252,7 +133,7 @@ async def generate_class_financial_report(
             },
             "financial_summary": {
                 "total_collections": len(collections),
-                "total_children": len(children),
+                "total_children": children_count,
                 "total_expected": total_expected,
                 "total_collected": total_collected,
                 "total_outstanding": total_expected - total_collected,
@@ -3,6 +3,7 @@ from fastapi import APIRouter, Depends, status, HTTPException
 from src.Model.UserAccount import RegisterUser, UpdateUserAccountStatus, User, UpdateUserAccountPrivilege
 import src.SQL as SQL
 import src.Service.Auth as Auth
+from src.Service.Auth.password_hashing import hash_password
 from src.SQL.Enum.Privilege import ADMIN_USER
 from src.repository import parent_repository, account_repository
 
@@ -11,10 +12,12 @@ user_router = APIRouter()
 
 @user_router.post("/register", status_code=status.HTTP_201_CREATED)
 async def register_user(
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
     user: RegisterUser,
 ) -> None:
-    user_account = SQL.Tables.UserAccount(**user.model_dump())
+    user_account = SQL.Tables.UserAccount(
+        **{**user.model_dump(), "password": await hash_password(user.password)}
+    )
     sql_session.add(user_account)
     try:
         await sql_session.commit()
@@ -29,7 +32,7 @@ async def register_user(
 @user_router.get("/me", response_model=User)
 async def me(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user())],
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ) -> SQL.Tables.UserAccount:
     """
     Returns information about logged in user.
@@ -47,7 +50,7 @@ async def me(
 async def get_user_by_parent(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user(ADMIN_USER))],
     parent_id: int,
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ) -> SQL.Tables.UserAccount:
     """
     Returns information about user by parent ID.
@@ -61,7 +64,7 @@ async def update_user_parent_status(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user(ADMIN_USER))],
     parent_id: int,
     request: UpdateUserAccountStatus,
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ):
     user_parent_profile = await parent_repository.get_by_id(sql_session, parent_id)
     user = await account_repository.get_by_user(sql_session, user_parent_profile.account_id)
@@ -73,7 +76,7 @@ async def update_user_parent_privilege(
     user: Annotated[Auth.AuthorizedUser, Depends(Auth.authorized_user(ADMIN_USER))],
     parent_id: int,
     request: UpdateUserAccountPrivilege,
-    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.async_session_generator)],
+    sql_session: Annotated[SQL.AsyncSession, Depends(SQL.get_async_session)],
 ):
     user_parent_profile = await parent_repository.get_by_id(sql_session, parent_id)
     if user_parent_profile.account_id == user.user_id:
@@ -0,0 +1,127 @@
+"""
+Latency of access token validation under concurrent requests,
+the asyncio token store compared with the blocking client validation used before.
+Uses Redis configured by REDIS_* variables, or an in-memory fake with --fake.
+A fake has no network, --latency adds a round trip to every Redis call of both clients.
+
+    python -m tests.benchmark_auth_tokens --fake --latency 1 --requests 200 --rounds 20
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+import redis
+import src.config as config
+from src.Service.Auth import Redis as auth_redis
+from src.Service.Auth.Models import AccessTokenData
+from src.Service.Auth.Redis import RedisAuth, UserAccessTokenDetails
+from src.Service.Auth.token_cache import access_token_cache
+
+
+class DelayedRedis:
+    """Client whose every GET takes an extra round trip, waited for without blocking the event loop"""
+
+    def __init__(self, client, latency: float):
+        self.client = client
+        self.latency = latency
+
+    async def get(self, key: str):
+        await asyncio.sleep(self.latency)
+        return await self.client.get(key)
+
+
+def blocking_validation(client: redis.Redis, latency: float):
+    """Validation as it was done before, by a synchronous client called from the event loop"""
+
+    async def validate(token: str) -> UserAccessTokenDetails:
+        time.sleep(latency)
+        if (value := client.get(token)) is None:
+            raise ValueError("Token not found")
+        return UserAccessTokenDetails.create_from_redis_value(value)
+
+    return validate
+
+
+async def register_tokens(count: int) -> list[str]:
+    tokens = [f"benchmark-access-token-{number}" for number in range(count)]
+    for user_id, token in enumerate(tokens):
+        await RedisAuth().register_token(
+            token,
+            AccessTokenData(
+                user_id=user_id,
+                username=f"user{user_id}",
+                privilege=0,
+                expires=0,
+                refresh_token=f"benchmark-refresh-token-{user_id}",
+            ),
+        )
+    return tokens
+
+
+async def measure(validate, tokens: list[str], rounds: int) -> list[float]:
+    """
+    Requests with all tokens arrive at once `rounds` times, latency of a request is counted from its arrival,
+    so time spent waiting for the event loop blocked by other requests is included.
+    """
+    latencies: list[float] = []
+
+    async def request(token: str, arrived_at: float) -> None:
+        await validate(token)
+        latencies.append(time.perf_counter() - arrived_at)
+
+    for _ in range(rounds):
+        arrived_at = time.perf_counter()
+        await asyncio.gather(*(request(token, arrived_at) for token in tokens))
+    return sorted(latencies)
+
+
+def report(name: str, latencies: list[float]) -> None:
+    print(
+        f"{name:<24} p50 {statistics.median(latencies) * 1000:8.2f}ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:8.2f}ms  "
+        f"max {latencies[-1] * 1000:8.2f}ms"
+    )
+
+
+async def benchmark(blocking_client: redis.Redis, requests: int, rounds: int, latency: float) -> None:
+    tokens = await register_tokens(requests)
+    print(f"{requests} concurrent requests, {rounds} validations each, {latency * 1000:.1f}ms added per Redis call")
+
+    report("blocking client", await measure(blocking_validation(blocking_client, latency), tokens, rounds))
+
+    auth = RedisAuth()
+    auth.redis = DelayedRedis(auth.redis, latency)
+    cache_size = access_token_cache.max_size
+    access_token_cache.max_size = 0
+    report("asyncio client", await measure(auth.get_owner_details, tokens, rounds))
+    access_token_cache.max_size = cache_size
+    access_token_cache.clear()
+    report("asyncio client + cache", await measure(auth.get_owner_details, tokens, rounds))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--rounds", type=int, default=20)
+    parser.add_argument("--latency", type=float, default=0.0, help="milliseconds added to every Redis call")
+    parser.add_argument("--fake", action="store_true", help="use in-memory fake Redis instead of REDIS_HOST")
+    arguments = parser.parse_args()
+
+    if arguments.fake:
+        from fakeredis import FakeRedis, FakeServer
+        from fakeredis.aioredis import FakeRedis as FakeAsyncRedis
+
+        server = FakeServer()
+        auth_redis.get_redis = lambda: FakeAsyncRedis(server=server, decode_responses=True)
+        blocking_client = FakeRedis(server=server, decode_responses=True)
+    else:
+        blocking_client = redis.Redis(
+            host=config.REDIS_HOST, port=config.REDIS_PORT, db=config.REDIS_DB, decode_responses=True
+        )
+
+    asyncio.run(benchmark(blocking_client, arguments.requests, arguments.rounds, arguments.latency / 1000))
+
+
+if __name__ == "__main__":
+    main()
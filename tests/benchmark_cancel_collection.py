@@ -0,0 +1,62 @@
+"""
+Time of cancelling a collection by the number of payments it refunds.
+Uses PostgreSQL configured by DB_* variables.
+
+    python -m tests.benchmark_cancel_collection --payments 30 300 3000
+"""
+
+import argparse
+import time
+import src.SQL as SQL
+from src.router.collection import cancel_collection
+from src.Service.Collection import collection_service
+from src.SQL.Tables import Parent
+from tests.test_money_concurrency import (
+    PRICE, assert_only_rejections, concurrently, create_collection, prepare_database, run, user_of,
+)
+
+# Payments are made this many at a time, so they fit in the connection pool
+PAYMENT_BATCH = 50
+
+
+async def paid_collection(payments: int):
+    collection, families = await create_collection(payments, PRICE)
+
+    def pay(parent, child):
+        return lambda session: collection_service.pay_for_children(
+            session, user_of(parent), collection.id, [child.id]
+        )
+
+    for start in range(0, payments, PAYMENT_BATCH):
+        results = await concurrently(
+            *(pay(parent, child) for parent, child in families[start:start + PAYMENT_BATCH])
+        )
+        assert_only_rejections(results)
+    return collection
+
+
+async def benchmark(sizes: list[int]) -> None:
+    await prepare_database()
+    for payments in sizes:
+        collection = await paid_collection(payments)
+        owner = Parent(id=collection.owner_id, account_id=collection.owner_id, bank_account_id=0,
+                       name="", surname="", phone="", city="", street="", house_number="")
+
+        started_at = time.perf_counter()
+        async with SQL.session_scope() as session:
+            await cancel_collection(collection.id, user_of(owner), session)
+        cancelled_in = time.perf_counter() - started_at
+        print(f"{payments:>6} payments cancelled in {cancelled_in * 1000:9.2f}ms "
+              f"({cancelled_in * 1000 / payments:.3f}ms per payment)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--payments", type=int, nargs="+", default=[30, 300, 3000])
+    arguments = parser.parse_args()
+
+    run(benchmark(arguments.payments))
+
+
+if __name__ == "__main__":
+    main()
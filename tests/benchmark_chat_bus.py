@@ -0,0 +1,80 @@
+"""
+Throughput and latency of chat delivery across workers, each worker being a bus instance of this process.
+Uses Redis configured by REDIS_* variables, or an in-memory fake with --fake.
+
+    python -m tests.benchmark_chat_bus --workers 4 --users 1000 --messages 20000
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+from src.Service.Chat import message_bus
+from src.Service.Chat.message_bus import ChatMessageBus
+from tests.test_chat_message_bus import RecordingWebSocket, start_workers, stop_workers
+
+
+class TimedWebSocket(RecordingWebSocket):
+    """Messages carry the time they were published at, the latency of each is recorded when it arrives"""
+
+    def __init__(self, latencies: list[float], delivered: asyncio.Event, expected: int):
+        super().__init__()
+        self.latencies = latencies
+        self.delivered = delivered
+        self.expected = expected
+
+    async def send_text(self, message: str) -> None:
+        self.latencies.append(time.perf_counter() - float(message))
+        if len(self.latencies) == self.expected:
+            self.delivered.set()
+
+
+async def benchmark(workers: int, users: int, messages: int) -> None:
+    buses, listeners = await start_workers(workers)
+    latencies: list[float] = []
+    delivered = asyncio.Event()
+    try:
+        # Users are spread over workers round robin, senders are on the worker after the recipient's one
+        for user_id in range(users):
+            await buses[user_id % workers].connect(user_id, TimedWebSocket(latencies, delivered, messages))
+
+        started_at = time.perf_counter()
+        for number in range(messages):
+            recipient_id = number % users
+            sender_bus: ChatMessageBus = buses[(recipient_id + 1) % workers]
+            await sender_bus.publish([recipient_id], str(time.perf_counter()))
+        published_in = time.perf_counter() - started_at
+        await asyncio.wait_for(delivered.wait(), timeout=60)
+        delivered_in = time.perf_counter() - started_at
+    finally:
+        await stop_workers(listeners)
+
+    latencies.sort()
+    print(f"{messages} messages to {users} users on {workers} workers")
+    print(f"published in {published_in:.2f}s, delivered in {delivered_in:.2f}s "
+          f"({messages / delivered_in:.0f} messages/s)")
+    print(f"latency median {statistics.median(latencies) * 1000:.2f}ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms")
+    print(f"dropped connections {sum(bus.dropped_connections for bus in buses)}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--fake", action="store_true", help="use in-memory fake Redis instead of REDIS_HOST")
+    arguments = parser.parse_args()
+
+    if arguments.fake:
+        from fakeredis import FakeServer
+        from fakeredis.aioredis import FakeRedis
+
+        server = FakeServer()
+        message_bus.get_redis = lambda: FakeRedis(server=server, decode_responses=True)
+
+    asyncio.run(benchmark(arguments.workers, arguments.users, arguments.messages))
+
+
+if __name__ == "__main__":
+    main()
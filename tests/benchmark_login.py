@@ -0,0 +1,91 @@
+"""
+Latency and rejections of concurrent logins at the configured password hashing limits,
+PASSWORD_HASH_WORKERS hashing threads and PASSWORD_HASH_MAX_QUEUE waiting logins.
+Uses PostgreSQL configured by DB_* variables and Redis configured by REDIS_* variables, or an in-memory fake with --fake.
+
+    PASSWORD_HASH_WORKERS=4 PASSWORD_HASH_MAX_QUEUE=64 python -m tests.benchmark_login --logins 100 --rounds 5
+"""
+
+import argparse
+import itertools
+import statistics
+import time
+from fastapi import HTTPException
+import src.SQL as SQL
+from src.Model.UserAccount import Login
+from src.Service.Auth import Redis as auth_redis
+from src.Service.Auth.password_hashing import hash_password, password_hasher
+from src.Service.Auth.username_password import user_login
+from src.SQL.Tables import UserAccount
+from tests.test_money_concurrency import concurrently, next_id, prepare_database, run
+
+PASSWORD = "benchmark-password"
+
+
+async def create_user() -> str:
+    user_id = next_id()
+    async with SQL.session_scope() as session:
+        session.add(
+            UserAccount(
+                id=user_id, username=f"login{user_id}", password=await hash_password(PASSWORD), email=None
+            )
+        )
+    return f"login{user_id}"
+
+
+async def benchmark(logins: int, rounds: int) -> None:
+    await prepare_database()
+    username = await create_user()
+    latencies: list[float] = []
+    rejected = 0
+
+    def login(arrived_at: float):
+        async def timed_login(session: SQL.AsyncSession):
+            try:
+                return await user_login(Login(username=username, password=PASSWORD), session)
+            finally:
+                latencies.append(time.perf_counter() - arrived_at)
+
+        return timed_login
+
+    # Logins of a round arrive at once, latency is counted from the arrival, rejected ones included
+    started_at = time.perf_counter()
+    for _ in range(rounds):
+        arrived_at = time.perf_counter()
+        for result in await concurrently(*itertools.repeat(login(arrived_at), logins)):
+            if isinstance(result, HTTPException) and result.status_code == 503:
+                rejected += 1
+            elif isinstance(result, BaseException):
+                raise result
+    elapsed = time.perf_counter() - started_at
+
+    latencies.sort()
+    print(f"{logins} concurrent logins, {rounds} rounds, "
+          f"{password_hasher.workers} hashing threads, {password_hasher.max_queue_depth} waiting at most")
+    print(f"logged in {logins * rounds - rejected} in {elapsed:.2f}s "
+          f"({(logins * rounds - rejected) / elapsed:.1f} logins/s)")
+    print(f"latency median {statistics.median(latencies) * 1000:.2f}ms, "
+          f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:.2f}ms")
+    print(f"rejected with 503 {rejected} ({rejected / (logins * rounds):.1%}), "
+          f"peak queue depth {password_hasher.peak_queue_depth}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--logins", type=int, default=100)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--fake", action="store_true", help="use in-memory fake Redis instead of REDIS_HOST")
+    arguments = parser.parse_args()
+
+    if arguments.fake:
+        from fakeredis import FakeServer
+        from fakeredis.aioredis import FakeRedis
+
+        server = FakeServer()
+        auth_redis.get_redis = lambda: FakeRedis(server=server, decode_responses=True)
+
+    run(benchmark(arguments.logins, arguments.rounds))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,43 @@
+"""
+Token endpoints answer 503 when Redis holding the tokens is unreachable, like the token validation does.
+"""
+
+import asyncio
+import pytest
+from fakeredis.aioredis import FakeRedis
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+from src.Service import Auth
+from src.Service.Auth import Redis as auth_redis
+from src.Service.Auth.jwt import generate_access_token
+from src.SQL.Tables import UserAccount
+
+
+@pytest.fixture
+def unreachable_redis(monkeypatch):
+    monkeypatch.setattr(auth_redis, "get_redis", lambda: FakeRedis(connected=False, decode_responses=True))
+    # RedisAuth is a singleton, a new instance is created with the unreachable client
+    monkeypatch.setattr(auth_redis.RedisSingleton, "_instances", {})
+    Auth.access_token_cache.clear()
+
+
+def assert_unavailable(coroutine) -> None:
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(coroutine)
+    assert error.value.status_code == 503
+
+
+def test_token_validation_is_unavailable(unreachable_redis):
+    validate = Auth.authorized_user()
+    assert_unavailable(validate(HTTPAuthorizationCredentials(scheme="Bearer", credentials="token")))
+
+
+def test_login_and_refresh_are_unavailable(unreachable_redis):
+    user = UserAccount(id=1, username="user", password="", email=None, privilege=0, status=0)
+    assert_unavailable(generate_access_token(user))
+    assert_unavailable(Auth.refresh_token("refresh-token", None))
+
+
+def test_logout_is_unavailable(unreachable_redis):
+    user = Auth.AuthorizedUser(user_id=1, user_privilege=0, access_token="token")
+    assert_unavailable(Auth.user_logout(user))
@@ -0,0 +1,101 @@
+"""
+Chat messages published on one worker reach users connected to another one.
+Workers are two bus instances sharing a fake Redis server, each with its own connections.
+"""
+
+import asyncio
+import pytest
+from fakeredis import FakeServer
+from fakeredis.aioredis import FakeRedis
+from starlette.websockets import WebSocketState
+from src.Service.Chat import message_bus
+from src.Service.Chat.message_bus import ChatMessageBus
+
+
+class RecordingWebSocket:
+    """Stands in for the websocket of a connected user, keeps the messages it was sent"""
+
+    def __init__(self):
+        self.application_state = WebSocketState.CONNECTED
+        self.messages: list[str] = []
+        self.received = asyncio.Event()
+
+    async def send_text(self, message: str) -> None:
+        self.messages.append(message)
+        self.received.set()
+
+    async def close(self, code: int) -> None:
+        self.application_state = WebSocketState.DISCONNECTED
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    server = FakeServer()
+    monkeypatch.setattr(message_bus, "get_redis", lambda: FakeRedis(server=server, decode_responses=True))
+
+
+async def start_workers(count: int) -> tuple[list[ChatMessageBus], list[asyncio.Task]]:
+    buses = [ChatMessageBus() for _ in range(count)]
+    listeners = [asyncio.create_task(bus.listen()) for bus in buses]
+    # Users connected before the listener subscribed would be subscribed by it, wait to test the live path
+    await asyncio.wait_for(asyncio.gather(*(bus.ready.wait() for bus in buses)), timeout=5)
+    return buses, listeners
+
+
+async def stop_workers(listeners: list[asyncio.Task]) -> None:
+    for listener in listeners:
+        listener.cancel()
+    await asyncio.gather(*listeners, return_exceptions=True)
+
+
+async def wait_for_messages(websocket: RecordingWebSocket, count: int) -> None:
+    async def received_all():
+        while len(websocket.messages) < count:
+            websocket.received.clear()
+            await websocket.received.wait()
+
+    await asyncio.wait_for(received_all(), timeout=5)
+
+
+def test_message_published_on_one_worker_is_delivered_by_the_other(fake_redis):
+    async def scenario():
+        (sender_worker, recipient_worker), listeners = await start_workers(2)
+        try:
+            sender, recipient = RecordingWebSocket(), RecordingWebSocket()
+            await sender_worker.connect(1, sender)
+            await recipient_worker.connect(2, recipient)
+
+            await sender_worker.publish([2], "hello")
+            await wait_for_messages(recipient, 1)
+
+            assert recipient.messages == ["hello"]
+            assert sender.messages == []
+            assert sender_worker.stats()["published"] == 1
+            assert recipient_worker.stats()["delivered"] == 1
+            assert sender_worker.stats()["delivered"] == 0
+        finally:
+            await stop_workers(listeners)
+
+    asyncio.run(scenario())
+
+
+def test_disconnected_user_is_no_longer_delivered_to(fake_redis):
+    async def scenario():
+        (sender_worker, recipient_worker), listeners = await start_workers(2)
+        try:
+            recipient = RecordingWebSocket()
+            connection = await recipient_worker.connect(2, recipient)
+            await recipient_worker.disconnect(connection)
+
+            # The user reconnects to the sending worker, only that connection gets the message
+            reconnected = RecordingWebSocket()
+            await sender_worker.connect(2, reconnected)
+            await sender_worker.publish([2], "hello")
+            await wait_for_messages(reconnected, 1)
+
+            assert recipient.messages == []
+            assert recipient_worker.stats()["delivered"] == 0
+        finally:
+            await stop_workers(listeners)
+
+    asyncio.run(scenario())
@@ -0,0 +1,40 @@
+"""
+A class view request holds a single pooled connection, the one of its request session.
+"""
+
+import src.SQL as SQL
+from src.Model.CollectionStatusEnum import CollectionStatusEnum
+from src.router.class_group import get_class_view
+from src.SQL.Enum import ParentRole
+from src.SQL.Tables import ParentGroupRole
+from tests.test_money_concurrency import create_collection, concurrently, database, run, user_of  # noqa: F401
+
+REQUESTS = 20
+
+
+def test_class_view_holds_one_connection_per_request():
+    async def scenario():
+        collection, families = await create_collection(10, 0.0)
+        requester, _ = families[0]
+        async with SQL.session_scope() as session:
+            session.add(
+                ParentGroupRole(
+                    class_group_id=collection.class_group_id, parent_id=requester.id, role=ParentRole.MEMBER
+                )
+            )
+
+        def class_view(session: SQL.AsyncSession):
+            return get_class_view(user_of(requester), collection.class_group_id, session, CollectionStatusEnum.OPEN)
+
+        # No connection is held between requests, the peak is counted from here
+        SQL.pool_metrics.peak_checked_out = 0
+        [view] = await concurrently(class_view)
+        assert len(view["children"]) == 10 and view["requester"]["parent_id"] == requester.id
+        assert SQL.pool_metrics.peak_checked_out == 1
+
+        SQL.pool_metrics.peak_checked_out = 0
+        views = await concurrently(*[class_view] * REQUESTS)
+        assert all(isinstance(view, dict) for view in views), views
+        assert SQL.pool_metrics.peak_checked_out <= REQUESTS
+
+    run(scenario())
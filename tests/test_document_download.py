@@ -0,0 +1,54 @@
+"""
+Cached document content is revalidated by its ETag, which covers everything sent with it, the filename included.
+"""
+
+import asyncio
+from starlette.requests import Request
+from src.BlobStore import LocalBlobStore
+from src.Service.CollectionDocuments import download
+from src.SQL.Tables.Collection import CollectionDocuments
+
+CONTENT_HASH = "ab" * 32
+CONTENT = b"%PDF-1.4 document content"
+
+
+def document(**changes) -> CollectionDocuments:
+    fields = dict(
+        document_id=1, collection_id=1, document_name="invoice", file_type="pdf",
+        content_hash=CONTENT_HASH, file_size=100,
+    )
+    return CollectionDocuments(**(fields | changes))
+
+
+def conditional_request(etag: str) -> Request:
+    return Request({"type": "http", "method": "GET", "headers": [(b"if-none-match", etag.encode())]})
+
+
+def test_etag_changes_with_the_filename_and_document():
+    etag = download.document_etag(document())
+    assert etag == download.document_etag(document())
+    assert etag != download.document_etag(document(document_name="renamed invoice"))
+    assert etag != download.document_etag(document(file_type="jpg"))
+    assert etag != download.document_etag(document(document_id=2))
+    assert etag != download.document_etag(document(content_hash="cd" * 32))
+
+
+def test_renamed_document_is_not_answered_as_not_modified(monkeypatch, tmp_path):
+    blob_store = LocalBlobStore(str(tmp_path))
+    monkeypatch.setattr(download, "blob_store", blob_store)
+
+    async def chunks():
+        yield CONTENT
+
+    content_hash, file_size = asyncio.run(blob_store.put_stream(chunks()))
+    stored = document(content_hash=content_hash, file_size=file_size)
+    etag = download.document_etag(stored)
+
+    def status_of(cached_document: CollectionDocuments) -> int:
+        response = asyncio.run(download.content_response(
+            conditional_request(etag), cached_document, download.REVALIDATED_CACHE_CONTROL
+        ))
+        return response.status_code
+
+    assert status_of(stored) == 304
+    assert status_of(document(content_hash=content_hash, file_size=file_size, document_name="renamed")) == 200
@@ -0,0 +1,69 @@
+"""
+Uploads of documents of the largest allowed size are streamed to the blob store without being held in memory.
+"""
+
+import asyncio
+import hashlib
+import tracemalloc
+from starlette.requests import Request
+import src.config as config
+from src.BlobStore import LocalBlobStore
+from src.Service.CollectionDocuments import upload
+
+BOUNDARY = b"upload-memory-test-boundary"
+CHUNK_SIZE = 64 * 1024
+# Python allocations while receiving a file of DOCUMENT_MAX_SIZE stay below this
+MAX_PEAK_MEMORY = 4 * 1024 * 1024
+
+
+def file_chunks(size: int):
+    """PDF signature followed by filler, generated chunk by chunk"""
+    filler = bytes(range(256)) * (CHUNK_SIZE // 256)
+    yield b"%PDF-" + filler[: CHUNK_SIZE - 5]
+    for sent in range(CHUNK_SIZE, size, CHUNK_SIZE):
+        yield filler[: min(CHUNK_SIZE, size - sent)]
+
+
+def multipart_request(size: int) -> Request:
+    body = [
+        b"--" + BOUNDARY + b"\r\n"
+        b'Content-Disposition: form-data; name="file"; filename="large.pdf"\r\n'
+        b"Content-Type: application/pdf\r\n\r\n",
+        *file_chunks(size),
+        b"\r\n--" + BOUNDARY + b"--\r\n",
+    ]
+    messages = iter(body)
+
+    async def receive() -> dict:
+        chunk = next(messages, b"")
+        return {"type": "http.request", "body": chunk, "more_body": bool(chunk)}
+
+    scope = {
+        "type": "http",
+        "method": "POST",
+        "path": "/collection_documents/upload",
+        "headers": [(b"content-type", b"multipart/form-data; boundary=" + BOUNDARY)],
+    }
+    return Request(scope, receive)
+
+
+def test_upload_of_largest_document_is_streamed(monkeypatch, tmp_path):
+    monkeypatch.setattr(upload, "blob_store", LocalBlobStore(str(tmp_path)))
+    size = config.DOCUMENT_MAX_SIZE
+    content_hash = hashlib.sha256()
+    for chunk in file_chunks(size):
+        content_hash.update(chunk)
+
+    tracemalloc.start()
+    try:
+        uploaded_document = asyncio.run(upload.receive_document(multipart_request(size)))
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert uploaded_document == (
+        upload.UploadedDocument(
+            filename="large.pdf", file_type="pdf", content_hash=content_hash.hexdigest(), file_size=size
+        )
+    )
+    assert peak_memory < MAX_PEAK_MEMORY, f"{peak_memory / 2**20:.1f} MiB"
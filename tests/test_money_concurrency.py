@@ -0,0 +1,289 @@
+"""
+Concurrent money movements against a real PostgreSQL, configured like the application by DB_* variables.
+The number of payers is CONCURRENCY_TEST_PAYERS, run it with 50, 200 and 1000.
+"""
+
+import asyncio
+import itertools
+import os
+from datetime import date
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from sqlmodel import select
+import src.SQL as SQL
+from src.SQL.connection import async_engine
+import src.SQL.Enum.CollectionStatus as CollectionStatus
+from src.Model.BankAccount import ExternalBankAccountOperation
+from src.repository import bank_account_repository
+from src.router.bank_account import withdraw
+from src.router.collection import cancel_collection, refund
+from src.Service.Auth.Redis import AuthorizedUser
+from src.Service.Collection import collection_service
+from src.SQL.Enum import CollectionOperationType
+from src.SQL.migrations import migrate
+from src.SQL.Tables import (
+    BankAccount,
+    BankAccountOperation,
+    Child,
+    ClassGroup,
+    Collection,
+    CollectionOperation,
+    Parent,
+    Parenthood,
+    UserAccount,
+)
+
+PAYERS = int(os.getenv("CONCURRENCY_TEST_PAYERS", 50))
+PRICE = 10.0
+
+# Explicit ids far above the ones given by sequences, refund compares user ids with parent ids
+FIRST_ID = 10**8
+_ids = itertools.count(FIRST_ID)
+
+
+def run(coroutine):
+    async def run_and_dispose():
+        try:
+            return await coroutine
+        finally:
+            # Pooled connections belong to the event loop of a single test
+            await async_engine.dispose()
+
+    return asyncio.run(run_and_dispose())
+
+
+def next_id() -> int:
+    return next(_ids)
+
+
+async def prepare_database() -> None:
+    """Migrate the database, explicit ids continue after the largest one left by earlier runs"""
+    global _ids
+    await migrate()
+    async with async_engine.connect() as connection:
+        # Ids are used as user and parent ids and in account numbers, all of them are unique
+        largest_id = (
+            await connection.execute(
+                text(
+                    "SELECT greatest("
+                    "(SELECT max(id) FROM user_account), "
+                    "(SELECT max(substr(account_number, 3)::numeric) FROM bank_account WHERE account_number ~ '^PL[0-9]+$'))"
+                )
+            )
+        ).scalar_one()
+    _ids = itertools.count(max(int(largest_id or 0), FIRST_ID) + 1)
+
+
+@pytest.fixture(scope="module", autouse=True)
+def database():
+    try:
+        run(prepare_database())
+    except (OSError, OperationalError) as error:
+        pytest.skip(f"PostgreSQL is not available: {error}")
+
+
+def user_of(parent: Parent) -> AuthorizedUser:
+    return AuthorizedUser(user_id=parent.account_id, user_privilege=0, access_token="")
+
+
+async def create_parent(session: SQL.AsyncSession, balance: float) -> Parent:
+    parent_id = next_id()
+    account = BankAccount(account_number=f"PL{parent_id:024d}")
+    session.add(account)
+    session.add(UserAccount(id=parent_id, username=f"payer{parent_id}", password="", email=None))
+    await session.flush()
+    parent = Parent(
+        id=parent_id,
+        account_id=parent_id,
+        bank_account_id=account.id,
+        name="Parent",
+        surname=str(parent_id),
+        phone="123456789",
+        city="City",
+        street="Street",
+        house_number="1",
+    )
+    session.add(parent)
+    await session.flush()
+    if balance:
+        await bank_account_repository.insert_operations(
+            session,
+            [
+                BankAccountOperation(
+                    amount=balance,
+                    title="Deposit",
+                    description="Test deposit",
+                    source_account_id=None,
+                    destination_account_id=account.id,
+                )
+            ],
+        )
+    return parent
+
+
+async def create_collection(payers: int, balance: float) -> tuple[Collection, list[tuple[Parent, Child]]]:
+    """Collection of a new class with one child of every payer, each payer has the given balance"""
+    async with SQL.session_scope() as session:
+        class_group = ClassGroup(name=f"class{next_id()}", description="")
+        session.add(class_group)
+        owner = await create_parent(session, 0.0)
+        collection_account = BankAccount(account_number=f"PL{next_id():024d}")
+        session.add(collection_account)
+        await session.flush()
+
+        collection = Collection(
+            name=f"collection{next_id()}",
+            description="",
+            end_date=None,
+            price=PRICE,
+            class_group_id=class_group.id,
+            bank_account_id=collection_account.id,
+            owner_id=owner.id,
+        )
+        session.add(collection)
+
+        families = []
+        for _ in range(payers):
+            parent = await create_parent(session, balance)
+            child = Child(name="Child", surname=str(parent.id), birth_date=date(2015, 1, 1), group_id=class_group.id)
+            session.add(child)
+            await session.flush()
+            session.add(Parenthood(parent_id=parent.id, child_id=child.id))
+            families.append((parent, child))
+        await session.flush()
+    return collection, families
+
+
+async def get_balances(account_ids: list[int]) -> dict[int, float]:
+    async with SQL.session_scope() as session:
+        return await bank_account_repository.lock_balances(session, account_ids)
+
+
+async def concurrently(*calls) -> list[BaseException | object]:
+    """Run every call in its own session at the same time, exceptions are returned"""
+
+    async def call_in_session(call):
+        async with SQL.session_scope() as session:
+            return await call(session)
+
+    return await asyncio.gather(*(call_in_session(call) for call in calls), return_exceptions=True)
+
+
+def assert_only_rejections(results) -> None:
+    for result in results:
+        if isinstance(result, BaseException):
+            assert isinstance(result, HTTPException) and result.status_code < 500, repr(result)
+
+
+def test_payers_never_overdraw_and_children_are_paid_once():
+    async def scenario():
+        # Every payer can afford a single payment and sends the same payment twice at once
+        collection, families = await create_collection(PAYERS, PRICE)
+
+        def pay(parent, child):
+            return lambda session: collection_service.pay_for_children(
+                session, user_of(parent), collection.id, [child.id]
+            )
+
+        results = await concurrently(
+            *(pay(parent, child) for parent, child in families for _ in range(2))
+        )
+        assert_only_rejections(results)
+
+        balances = await get_balances(
+            [collection.bank_account_id] + [parent.bank_account_id for parent, _ in families]
+        )
+        assert balances.pop(collection.bank_account_id) == PAYERS * PRICE
+        assert all(balance == 0.0 for balance in balances.values())
+
+        async with SQL.session_scope() as session:
+            paid = (
+                await session.exec(
+                    select(CollectionOperation.child_id).where(
+                        CollectionOperation.collection_id == collection.id,
+                        CollectionOperation.operation_type == CollectionOperationType.PAY,
+                    )
+                )
+            ).all()
+        assert sorted(paid) == sorted(child.id for _, child in families)
+
+    run(scenario())
+
+
+def test_concurrent_withdrawals_never_overdraw():
+    async def scenario():
+        async with SQL.session_scope() as session:
+            parent = await create_parent(session, PAYERS * PRICE)
+        request = ExternalBankAccountOperation(account_number="PL" + "0" * 24, amount=PRICE)
+
+        results = await concurrently(
+            *(
+                lambda session: withdraw(user_of(parent), session, request)
+                for _ in range(2 * PAYERS)
+            )
+        )
+        assert_only_rejections(results)
+
+        assert sum(not isinstance(result, BaseException) for result in results) == PAYERS
+        assert (await get_balances([parent.bank_account_id]))[parent.bank_account_id] == 0.0
+
+    run(scenario())
+
+
+def test_payment_is_refunded_once():
+    async def scenario():
+        collection, [(parent, child)] = await create_collection(1, PRICE)
+        async with SQL.session_scope() as session:
+            await collection_service.pay_for_children(session, user_of(parent), collection.id, [child.id])
+
+        results = await concurrently(
+            *(
+                lambda session: refund(user_of(parent), collection.id, child.id, session)
+                for _ in range(10)
+            )
+        )
+        assert_only_rejections(results)
+
+        assert sum(not isinstance(result, BaseException) for result in results) == 1
+        balances = await get_balances([collection.bank_account_id, parent.bank_account_id])
+        assert balances == {collection.bank_account_id: 0.0, parent.bank_account_id: PRICE}
+
+    run(scenario())
+
+
+def test_cancel_refunds_every_payment_committed_before_it():
+    async def scenario():
+        collection, families = await create_collection(PAYERS, PRICE)
+        owner = Parent(id=collection.owner_id, account_id=collection.owner_id, bank_account_id=0,
+                       name="", surname="", phone="", city="", street="", house_number="")
+
+        def pay(parent, child):
+            return lambda session: collection_service.pay_for_children(
+                session, user_of(parent), collection.id, [child.id]
+            )
+
+        calls = [pay(parent, child) for parent, child in families]
+        calls.insert(
+            len(calls) // 2,
+            lambda session: cancel_collection(collection.id, user_of(owner), session),
+        )
+        results = await concurrently(*calls)
+        assert_only_rejections(results)
+
+        async with SQL.session_scope() as session:
+            db_collection = await session.get(Collection, collection.id)
+            owner_account_id = (await session.get(Parent, collection.owner_id)).bank_account_id
+        assert db_collection.status == CollectionStatus.CANCELLED
+
+        # Every payer got their money back, nothing was swept to the cashier or left behind
+        balances = await get_balances(
+            [collection.bank_account_id, owner_account_id]
+            + [parent.bank_account_id for parent, _ in families]
+        )
+        assert balances.pop(collection.bank_account_id) == 0.0
+        assert balances.pop(owner_account_id) == 0.0
+        assert all(balance == PRICE for balance in balances.values())
+
+    run(scenario())
@@ -0,0 +1,166 @@
+"""
+Ledger and collection operation queries are planned on their indexes, not as sequential scans.
+Data is seeded in a transaction which is rolled back, the number of ledger operations is QUERY_PLAN_TEST_OPERATIONS.
+"""
+
+import os
+from sqlalchemy import text
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.ext.asyncio import AsyncConnection
+from src.SQL.connection import async_engine
+from src.repository import bank_account_repository, collection_repository
+from tests.test_money_concurrency import database, run  # noqa: F401
+
+OPERATIONS = int(os.getenv("QUERY_PLAN_TEST_OPERATIONS", 1_000_000))
+ACCOUNTS = 10_000
+CLASSES = 20
+CHILDREN_PER_CLASS = 25
+COLLECTIONS_PER_CLASS = 100
+
+SOURCE_HISTORY_INDEX = "ix_bank_account_operation_source_history"
+DESTINATION_HISTORY_INDEX = "ix_bank_account_operation_destination_history"
+COLLECTION_OPERATION_INDEX = "ix_collection_operation_collection_type"
+
+
+async def seed(connection: AsyncConnection) -> tuple[int, int, int]:
+    """Accounts with OPERATIONS operations between them and collections with operations of all their children"""
+    first_account_id = (
+        await connection.execute(
+            text(
+                "INSERT INTO bank_account (account_number, is_locked) "
+                "SELECT 'PQ' || lpad(g::text, 24, '0'), false FROM generate_series(1, :accounts) g "
+                "RETURNING id"
+            ),
+            {"accounts": ACCOUNTS},
+        )
+    ).scalars().all()[0]
+    # Every tenth operation is a deposit, the others move money between accounts spread over the whole range
+    await connection.execute(
+        text(
+            "INSERT INTO bank_account_operation "
+            "(operation_date, amount, title, description, source_account_id, destination_account_id) "
+            "SELECT now() - g * interval '1 minute', 1.0, 'Seed', '', "
+            "CASE WHEN g % 10 = 0 THEN NULL ELSE :first + (g::bigint * 7919) % :accounts END, "
+            ":first + g % :accounts "
+            "FROM generate_series(1, :operations) g"
+        ),
+        {"first": first_account_id, "accounts": ACCOUNTS, "operations": OPERATIONS},
+    )
+
+    user_id = (
+        await connection.execute(
+            text(
+                "INSERT INTO user_account (username, email, privilege, status, password) "
+                "VALUES ('query_plan_owner', NULL, 0, 0, '') RETURNING id"
+            )
+        )
+    ).scalar_one()
+    owner_id = (
+        await connection.execute(
+            text(
+                "INSERT INTO parent (name, surname, phone, city, street, house_number, account_id, bank_account_id) "
+                "VALUES ('Owner', 'Owner', '', '', '', '', :user_id, :account_id) RETURNING id"
+            ),
+            {"user_id": user_id, "account_id": first_account_id},
+        )
+    ).scalar_one()
+    await connection.execute(
+        text(
+            "INSERT INTO class_group (name, description) "
+            "SELECT 'query_plan_class' || g, '' FROM generate_series(1, :classes) g"
+        ),
+        {"classes": CLASSES},
+    )
+    await connection.execute(
+        text(
+            "INSERT INTO child (name, surname, birth_date, group_id) "
+            "SELECT 'Child', g::text, date '2015-01-01', class_group.id "
+            "FROM class_group, generate_series(1, :children) g WHERE class_group.name LIKE 'query_plan_class%'"
+        ),
+        {"children": CHILDREN_PER_CLASS},
+    )
+    await connection.execute(
+        text(
+            "INSERT INTO collection "
+            "(name, description, start_date, status, price, class_group_id, bank_account_id, owner_id, withdrawn_money) "
+            "SELECT 'Collection', '', current_date, 0, 10.0, class_group.id, :account_id, :owner_id, 0 "
+            "FROM class_group, generate_series(1, :collections) g WHERE class_group.name LIKE 'query_plan_class%'"
+        ),
+        {"account_id": first_account_id, "owner_id": owner_id, "collections": COLLECTIONS_PER_CLASS},
+    )
+    await connection.execute(
+        text(
+            "INSERT INTO collection_operation (child_id, collection_id, operation_date, requester_id, operation_type) "
+            "SELECT child.id, collection.id, current_date, :owner_id, 0 "
+            "FROM collection JOIN child ON child.group_id = collection.class_group_id "
+            "WHERE collection.owner_id = :owner_id"
+        ),
+        {"owner_id": owner_id},
+    )
+    collection_id = (
+        await connection.execute(
+            text("SELECT max(id) FROM collection WHERE owner_id = :owner_id"), {"owner_id": owner_id}
+        )
+    ).scalar_one()
+
+    await connection.execute(text("ANALYZE"))
+    return first_account_id + ACCOUNTS // 2, owner_id, collection_id
+
+
+def plan_nodes(plan: dict):
+    yield plan
+    for child_plan in plan.get("Plans", ()):
+        yield from plan_nodes(child_plan)
+
+
+async def explain(connection: AsyncConnection, query) -> list[dict]:
+    sql = query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True})
+    [[result]] = (await connection.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).all()
+    return list(plan_nodes(result[0]["Plan"]))
+
+
+def scanned_indexes(scan: dict) -> set[str]:
+    """Indexes read by a scan of a table, bitmap heap scans read the ones of their bitmap index scans"""
+    if "Index Name" in scan:
+        return {scan["Index Name"]}
+    return {node["Index Name"] for node in plan_nodes(scan) if "Index Name" in node}
+
+
+def assert_planned_on_indexes(nodes: list[dict], table: str, indexes: set[str]) -> None:
+    """The table is read only by index scans, the given indexes among them"""
+    scans = [node for node in nodes if node.get("Relation Name") == table]
+    assert scans, f"{table} is not read"
+    assert not [scan["Node Type"] for scan in scans if not scanned_indexes(scan)], scans
+    assert indexes <= set().union(*map(scanned_indexes, scans)), scans
+
+
+def test_ledger_and_collection_queries_use_their_indexes():
+    async def scenario():
+        async with async_engine.connect() as connection:
+            transaction = await connection.begin()
+            try:
+                account_id, owner_id, collection_id = await seed(connection)
+                history_indexes = {SOURCE_HISTORY_INDEX, DESTINATION_HISTORY_INDEX}
+
+                history = await explain(
+                    connection, bank_account_repository.bank_account_operations_with_iban_query(account_id)
+                )
+                assert_planned_on_indexes(history, "bank_account_operation", history_indexes)
+
+                # Both sides of a page are read from their own index
+                page = await explain(
+                    connection, bank_account_repository.bank_account_operations_page_query(account_id, 50)
+                )
+                assert_planned_on_indexes(page, "bank_account_operation", history_indexes)
+
+                withdrawn = await explain(
+                    connection, bank_account_repository.withdrawn_money_query(account_id, owner_id)
+                )
+                assert_planned_on_indexes(withdrawn, "bank_account_operation", {SOURCE_HISTORY_INDEX})
+
+                children = await explain(connection, collection_repository.children_status_query(collection_id))
+                assert_planned_on_indexes(children, "collection_operation", {COLLECTION_OPERATION_INDEX})
+            finally:
+                await transaction.rollback()
+
+    run(scenario())